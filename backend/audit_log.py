@@ -0,0 +1,217 @@
+"""Append-only audit log of pairing and trust events, written behind the request.
+
+Handlers call ``AuditLog.record`` which only appends a tuple to a bounded
+in-memory queue; a daemon writer thread drains the queue in batches and
+group-commits each batch with one write + fsync (JSON Lines file) or one
+transaction (SQLite, chosen by a ``.db``/``.sqlite`` suffix). When the queue
+is full new events are dropped and counted instead of blocking the request,
+and ``close`` (registered with ``atexit``) drains whatever is still queued.
+
+Records never contain PINs or bearer tokens; sessions are identified by a
+short SHA-256 reference of the token (see ``token_ref``).
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from backend.metrics import AUDIT_EVENTS, AUDIT_QUEUE_DEPTH, AUDIT_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Plik .jsonl albo baza .db/.sqlite; puste = dziennik wyłączony
+DEFAULT_AUDIT_LOG_PATH = os.getenv("MVERIFY_AUDIT_LOG_PATH") or None
+DEFAULT_AUDIT_QUEUE_SIZE = int(os.getenv("MVERIFY_AUDIT_QUEUE_SIZE", "100000") or "100000")
+DEFAULT_AUDIT_BATCH_SIZE = int(os.getenv("MVERIFY_AUDIT_BATCH_SIZE", "1000") or "1000")
+DEFAULT_AUDIT_FLUSH_SECONDS = float(os.getenv("MVERIFY_AUDIT_FLUSH_SECONDS", "0.5") or "0.5")
+DEFAULT_AUDIT_FSYNC = os.getenv("MVERIFY_AUDIT_FSYNC", "1") != "0"
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+Event = Tuple[float, str, Dict[str, Any]]
+
+
+def token_ref(token: Optional[str]) -> Optional[str]:
+    """Stable, non-reversible reference to a session token for correlating events."""
+    if not token:
+        return None
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class _JSONLinesSink:
+    def __init__(self, path: Path, fsync: bool) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = path.open("a", encoding="utf-8")
+        self._fsync = fsync
+
+    def write(self, events: List[Event]) -> None:
+        self._handle.write("".join(
+            json.dumps({"ts": _iso(ts), "event": name, **fields}, ensure_ascii=False, default=str) + "\n"
+            for ts, name, fields in events
+        ))
+        self._handle.flush()
+        if self._fsync:
+            os.fsync(self._handle.fileno())
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+class _SQLiteSink:
+    def __init__(self, path: Path, fsync: bool) -> None:
+        import sqlite3
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Used only from the writer thread.
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS audit_events ("
+            "id INTEGER PRIMARY KEY, ts REAL NOT NULL, event TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS audit_events_ts ON audit_events (ts)")
+        self._db.commit()
+
+    def write(self, events: List[Event]) -> None:
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO audit_events (ts, event, data) VALUES (?, ?, ?)",
+                [(ts, name, json.dumps(fields, ensure_ascii=False, default=str)) for ts, name, fields in events],
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class AuditLog:
+    """Bounded queue of audit events drained by one background writer."""
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        queue_size: int = DEFAULT_AUDIT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_AUDIT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_AUDIT_FLUSH_SECONDS,
+        fsync: bool = DEFAULT_AUDIT_FSYNC,
+    ) -> None:
+        self.path = Path(path)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.dropped = 0
+        self.written = 0
+
+        self._queue: Deque[Event] = deque()
+        self._wakeup = threading.Event()
+        self._drained = threading.Condition()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        AUDIT_QUEUE_DEPTH.track((), lambda: len(self._queue))
+
+    def start(self) -> "AuditLog":
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def record(self, event: str, **fields: Any) -> bool:
+        """Queue an event without touching the disk; returns False if it was dropped."""
+        queue = self._queue
+        if len(queue) >= self.queue_size:
+            # The writer cannot keep up: losing audit events beats stalling confirmations.
+            self.dropped += 1
+            AUDIT_EVENTS.inc(("dropped",))
+            return False
+        queue.append((time.time(), event, fields))
+        if len(queue) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far has been written; False on timeout."""
+        if self._thread is None:
+            return not self._queue
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._drained:
+            while self._queue:
+                self._wakeup.set()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._drained.wait(remaining if remaining is not None else 1.0)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        if self._thread is None or self._stop:
+            return
+        self._stop = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+        if self._queue:
+            logger.warning("Dziennik audytu zamknięty z %d niezapisanymi zdarzeniami", len(self._queue))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": len(self._queue), "written": self.written, "dropped": self.dropped, "path": str(self.path)}
+
+    def _open_sink(self):
+        if self.path.suffix.lower() in SQLITE_SUFFIXES:
+            return _SQLiteSink(self.path, self.fsync)
+        return _JSONLinesSink(self.path, self.fsync)
+
+    def _run(self) -> None:
+        sink = None
+        try:
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                stopping = self._stop
+                if self._queue and sink is None:
+                    try:
+                        sink = self._open_sink()
+                    except Exception as exc:
+                        # Events stay queued (up to queue_size) until the destination becomes writable.
+                        logger.warning("Nie można otworzyć dziennika audytu %s: %s", self.path, exc)
+                while sink is not None and self._queue:
+                    if not self._write_batch(sink):
+                        break
+                with self._drained:
+                    self._drained.notify_all()
+                if stopping:
+                    return
+        finally:
+            if sink is not None:
+                sink.close()
+
+    def _write_batch(self, sink) -> bool:
+        queue = self._queue
+        batch = [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+        started = time.perf_counter()
+        try:
+            sink.write(batch)
+        except Exception as exc:
+            # Put the batch back in order and retry on the next flush interval.
+            queue.extendleft(reversed(batch))
+            AUDIT_EVENTS.inc(("error",), len(batch))
+            logger.warning("Zapis %d zdarzeń audytu do %s nie powiódł się: %s", len(batch), self.path, exc)
+            return False
+        self.written += len(batch)
+        AUDIT_EVENTS.inc(("written",), len(batch))
+        AUDIT_WRITE_SECONDS.observe(time.perf_counter() - started)
+        return True
@@ -0,0 +1,124 @@
+"""Prefix autocomplete over the domain compendium.
+
+A search box that runs a substring query over the whole registry on every
+keystroke costs O(n) per key. ``PrefixIndex`` is built once per snapshot and
+answers a prefix with two binary searches per array:
+
+* ``domains`` - the sorted domain list itself (depth 0: the prefix starts the
+  domain name);
+* ``labels`` - packed ``array('Q')`` entries, one per inner label start and
+  one array per depth, so ``krak`` also finds ``um.krakow.gov.pl`` (depth 1)
+  before ``bip.gmina.krakow.gov.pl`` (depth 2). The registry zone (the last
+  two labels) is not indexed, otherwise every prefix of ``gov`` would match
+  the whole registry.
+
+Each entry packs ``domain index << 16 | depth << 8 | label offset`` (8 bytes
+instead of a suffix string). Only the first ``scan_limit`` entries of a
+matching range are ranked, plus the currently popular hosts, so a one-letter
+prefix costs about the same as a full name.
+
+The index does not copy the domains: it takes the compendium's sorted view,
+and with a shared registry snapshot the label arrays are stored in the
+snapshot file as well (``label_arrays``), so workers only map them.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Mapping, Optional, Sequence
+
+# Entries of a matching range ranked per query; keeps one-letter prefixes as cheap as long ones.
+DEFAULT_SCAN_LIMIT = 64
+ZONE_LABELS = 2
+# Label entries are kept in one array per depth; deeper labels share the last one.
+MAX_LABEL_DEPTH = 3
+_PREFIX_END = "\U0010ffff"
+
+
+class PrefixIndex:
+    """Sorted domains plus packed inner-label entries of one registry snapshot."""
+
+    def __init__(
+        self,
+        domains: Sequence[str],
+        *,
+        scan_limit: int = DEFAULT_SCAN_LIMIT,
+        labels: Optional[Sequence[Sequence[int]]] = None,
+    ) -> None:
+        # Sorted and de-duplicated (the compendium views are); kept by reference, not copied.
+        self.domains = domains
+        self.scan_limit = scan_limit
+        self.labels = list(labels) if labels is not None else label_arrays(domains)
+
+    def __len__(self) -> int:
+        return len(self.domains)
+
+    def _label_key(self, entry: int) -> str:
+        return self.domains[entry >> 16][entry & 0xFF:]
+
+    def complete(self, prefix: str, limit: int, popularity: Optional[Mapping[str, int]] = None) -> List[str]:
+        """Up to ``limit`` domains matching ``prefix``, by (depth, popularity desc, length, name)."""
+        if not prefix:
+            return []
+        popularity = popularity or {}
+        domains = self.domains
+        end = prefix + _PREFIX_END
+        # domain -> best (lowest) depth at which it matched
+        matches: Dict[str, int] = {}
+
+        low = bisect_left(domains, prefix)
+        high = min(bisect_left(domains, end, low), low + self.scan_limit)
+        for position in range(low, high):
+            matches[domains[position]] = 0
+
+        # Depth ranks first, so once shallower levels fill the top-k deeper ones cannot enter it.
+        for labels in self.labels:
+            if len(matches) >= limit:
+                break
+            low = bisect_left(labels, prefix, key=self._label_key)
+            high = min(bisect_left(labels, end, low, key=self._label_key), low + self.scan_limit)
+            for position in range(low, high):
+                entry = labels[position]
+                matches.setdefault(domains[entry >> 16], (entry >> 8) & 0xFF)
+
+        # Popular hosts outside the scanned windows still rank where they belong.
+        for host in popularity:
+            if host not in matches:
+                depth = self._match_depth(host, prefix)
+                if depth is not None:
+                    matches[host] = depth
+
+        ranked = sorted(matches.items(), key=lambda item: (item[1], -popularity.get(item[0], 0), len(item[0]), item[0]))
+        return [domain for domain, _depth in ranked[:limit]]
+
+    def _match_depth(self, host: str, prefix: str) -> Optional[int]:
+        labels = host.split(".")
+        for depth in range(len(labels) - ZONE_LABELS):
+            if ".".join(labels[depth:]).startswith(prefix):
+                return depth if self.contains(host) else None
+        return None
+
+    def contains(self, domain: str) -> bool:
+        position = bisect_left(self.domains, domain)
+        return position < len(self.domains) and self.domains[position] == domain
+
+
+def label_arrays(domains: Sequence[str]) -> List[array]:
+    """Packed inner-label entries of sorted, de-duplicated ``domains``, one array per depth."""
+    domains = list(domains)
+    by_depth: List[List[int]] = [[] for _ in range(MAX_LABEL_DEPTH)]
+    for index, domain in enumerate(domains):
+        labels = domain.split(".")
+        offset = 0
+        for depth in range(1, len(labels) - ZONE_LABELS):
+            offset += len(labels[depth - 1]) + 1
+            by_depth[min(depth, MAX_LABEL_DEPTH) - 1].append(index << 16 | depth << 8 | offset)
+    for entries in by_depth:
+        entries.sort(key=lambda entry: domains[entry >> 16][entry & 0xFF:])
+    return [array("Q", entries) for entries in by_depth]
+
+
+def popularity_from_report(report: Dict[str, object]) -> Dict[str, int]:
+    """``{host: count}`` from a ``HostStream.top`` report."""
+    return {row["host"]: row["count"] for row in report["top"]}  # type: ignore[index]
@@ -0,0 +1,299 @@
+"""Phishing/malicious domain blocklist with a compact, hot-swappable index.
+
+Lists such as CERT Polska's (https://hole.cert.pl/domains/v2/domains.txt)
+hold hundreds of thousands of domains. Instead of a ``set`` of strings the
+index keeps a sorted ``array('q')`` of 64-bit string hashes (8 bytes per
+domain) plus a 64K-entry directory on the top 16 hash bits, so each
+membership test is a binary search over a handful of neighbours. A host matches when it
+or any parent suffix with at least two labels is listed, so subdomains of a
+listed phishing domain are caught too.
+
+Each load builds a new ``BlocklistIndex`` and publishes it with a single
+reference assignment; readers never see a partially built index. Local files
+are reloaded by ``FileWatcher`` when their content changes, URLs are polled
+with conditional requests every ``MVERIFY_BLOCKLIST_REFRESH_SECONDS``. A
+failed reload keeps the previous index.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from backend.domain_registry import normalize_hostname
+from backend.file_watch import DEFAULT_WATCH_ENABLED, FileWatcher, file_digest
+from backend.metrics import BLOCKLIST_MATCHES, REGISTRY_ENTRIES, REGISTRY_LOAD_SECONDS, REGISTRY_LOADS
+
+logger = logging.getLogger(__name__)
+
+# Ścieżka do pliku albo URL listy (jedna domena w wierszu, dopuszczalny też format hosts); puste = wyłączone
+DEFAULT_BLOCKLIST_SOURCE = os.getenv("MVERIFY_BLOCKLIST_SOURCE") or None
+DEFAULT_BLOCKLIST_NAME = os.getenv("MVERIFY_BLOCKLIST_NAME", "CERT Polska") or "CERT Polska"
+DEFAULT_BLOCKLIST_REFRESH_SECONDS = int(os.getenv("MVERIFY_BLOCKLIST_REFRESH_SECONDS", "3600") or "3600")
+DEFAULT_BLOCKLIST_TIMEOUT_SECONDS = int(os.getenv("MVERIFY_BLOCKLIST_TIMEOUT_SECONDS", "30") or "30")
+
+LOADER_NAME = "blocklist"
+
+# Wyniki dla ostatnio sprawdzanych hostów (ruch verify skupia się na niewielu domenach)
+MATCH_CACHE_MAX = 4096
+
+_BUCKET_SHIFT = 48
+_BUCKET_BIAS = 1 << 15
+
+
+def domain_hash(domain: str) -> int:
+    """64-bit hash of a normalized domain.
+
+    Python's SipHash is salted per process, which is fine because every
+    process builds its own index; it is cached on the string and several
+    times cheaper than hashlib on the verify path.
+    """
+    return hash(domain)
+
+
+def normalize_entry(line: str) -> Optional[str]:
+    """Domain from one list line: ``evil.pl``, ``*.evil.pl`` or ``0.0.0.0 evil.pl``; None for comments."""
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    domain = line.split()[-1].rstrip(".")
+    if domain.startswith("*."):
+        domain = domain[2:]
+    if "." not in domain or domain.replace(".", "").isdigit():
+        return None
+    # The same normalization (lowercase, IDNA) that verify applies to the host it matches.
+    domain = normalize_hostname(domain)
+    if not domain or not domain.isascii():
+        return None
+    return domain
+
+
+def build_hashes(lines: Iterable[str]) -> array:
+    """Sorted, de-duplicated hashes of the domains in ``lines``."""
+    hashes = set()
+    for line in lines:
+        domain = normalize_entry(line)
+        if domain is not None:
+            hashes.add(domain_hash(domain))
+    # Python ints only live for the duration of the load; the packed array is what stays in memory.
+    return array("q", sorted(hashes))
+
+
+def build_buckets(hashes: array) -> array:
+    """``buckets[b]`` is the first position whose hash falls in bucket ``b`` or later."""
+    buckets = array("I", bytes(4 * (2 * _BUCKET_BIAS + 1)))
+    position = 0
+    for bucket in range(2 * _BUCKET_BIAS + 1):
+        while position < len(hashes) and (hashes[position] >> _BUCKET_SHIFT) + _BUCKET_BIAS < bucket:
+            position += 1
+        buckets[bucket] = position
+    return buckets
+
+
+class BlocklistIndex(NamedTuple):
+    """One immutable generation of the blocklist."""
+
+    hashes: array
+    buckets: array
+    version: Optional[int]
+    loaded_at: Optional[float]
+    origin: Optional[str]
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def contains(self, domain: str) -> bool:
+        key = domain_hash(domain)
+        bucket = (key >> _BUCKET_SHIFT) + _BUCKET_BIAS
+        low, high = self.buckets[bucket], self.buckets[bucket + 1]
+        position = bisect_left(self.hashes, key, low, high)
+        return position < high and self.hashes[position] == key
+
+    def match(self, hostname: str) -> Optional[str]:
+        """The listed domain covering ``hostname`` (itself or a parent), or None."""
+        hashes, buckets = self.hashes, self.buckets
+        if not hashes:
+            return None
+        # contains() inlined: this runs on every verify request, once per suffix.
+        start = 0
+        while True:
+            dot = hostname.find(".", start)
+            if dot < 0:
+                return None
+            candidate = hostname[start:]
+            key = domain_hash(candidate)
+            bucket = (key >> _BUCKET_SHIFT) + _BUCKET_BIAS
+            high = buckets[bucket + 1]
+            position = bisect_left(hashes, key, buckets[bucket], high)
+            if position < high and hashes[position] == key:
+                return candidate
+            start = dot + 1
+
+
+EMPTY_INDEX = BlocklistIndex(array("q"), array("I"), None, None, None)
+
+
+class Blocklist:
+    """Loads the blocklist in the background and keeps its index current."""
+
+    def __init__(
+        self,
+        source: str,
+        *,
+        name: str = DEFAULT_BLOCKLIST_NAME,
+        refresh_interval: int = DEFAULT_BLOCKLIST_REFRESH_SECONDS,
+        timeout: int = DEFAULT_BLOCKLIST_TIMEOUT_SECONDS,
+        watch: bool = DEFAULT_WATCH_ENABLED,
+    ) -> None:
+        self.source = source
+        self.name = name
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.watch = watch
+        self.remote = source.startswith(("http://", "https://"))
+        self.path = None if self.remote else Path(source)
+
+        # (index, hostname -> match memo) published together, so a memo never outlives its index
+        self._state: Tuple[BlocklistIndex, Dict[str, Optional[str]]] = (EMPTY_INDEX, {})
+        self._lock = threading.Lock()
+        self._validators: Dict[str, str] = {}
+        self._digest: Optional[str] = None
+        self._watcher: Optional[FileWatcher] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        REGISTRY_ENTRIES.track((LOADER_NAME,), lambda: len(self._state[0]))
+
+    @property
+    def index(self) -> BlocklistIndex:
+        return self._state[0]
+
+    def match(self, hostname: str) -> Optional[str]:
+        """Listed domain covering ``hostname``; pass it through ``normalize_hostname`` first (IDNA)."""
+        index, matches = self._state
+        try:
+            matched = matches[hostname]
+        except KeyError:
+            matched = index.match(hostname)
+            if len(matches) >= MATCH_CACHE_MAX:
+                matches.clear()
+            matches[hostname] = matched
+        if matched is not None:
+            BLOCKLIST_MATCHES.inc()
+        return matched
+
+    def info(self) -> Dict[str, object]:
+        index = self._state[0]
+        return {
+            "name": self.name,
+            "entries": len(index),
+            "version": index.version,
+            "loaded_at": index.loaded_at,
+            "origin": index.origin,
+            "watch_mode": self._watcher.mode if self._watcher is not None else None,
+        }
+
+    def start(self) -> "Blocklist":
+        """Load in a background thread, then keep the index current; requests never wait for a load."""
+        self._thread = threading.Thread(target=self._run, name=f"{LOADER_NAME}-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def refresh(self) -> bool:
+        """Reload if the source changed; returns True when a new index was published."""
+        with self._lock:
+            if self.remote:
+                return self._refresh_remote()
+            digest = file_digest(self.path)
+            if digest is not None and digest == self._digest:
+                REGISTRY_LOADS.inc((LOADER_NAME, "unchanged"))
+                return False
+            return self._reload_file(digest)
+
+    def _run(self) -> None:
+        try:
+            self.refresh()
+        except Exception as exc:
+            logger.warning("Nie udało się załadować listy %s z %s: %s", self.name, self.source, exc)
+
+        if not self.remote and self.watch:
+            self._watcher = FileWatcher(self.path, self._on_file_changed, name=LOADER_NAME).start(self._digest)
+            return
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as exc:
+                logger.warning("Odświeżenie listy %s z %s nie powiodło się: %s", self.name, self.source, exc)
+
+    def _on_file_changed(self, digest: Optional[str]) -> None:
+        with self._lock:
+            self._reload_file(digest)
+
+    def _reload_file(self, digest: Optional[str]) -> bool:
+        if digest is None:
+            # Removed list: matches stop rather than serving a list that can no longer be updated.
+            REGISTRY_LOADS.inc((LOADER_NAME, "missing"))
+            self._digest = None
+            self._swap(EMPTY_INDEX)
+            return True
+        with self.path.open("r", encoding="utf-8", errors="replace") as handle:
+            self._publish(handle, f"file://{self.path}")
+        self._digest = digest
+        return True
+
+    def _swap(self, index: BlocklistIndex) -> None:
+        self._state = (index, {})
+
+    def _refresh_remote(self) -> bool:
+        headers = {"User-Agent": "m-verify-blocklist/1.0"}
+        if "etag" in self._validators:
+            headers["If-None-Match"] = self._validators["etag"]
+        if "last_modified" in self._validators:
+            headers["If-Modified-Since"] = self._validators["last_modified"]
+
+        try:
+            response = urlopen(Request(self.source, headers=headers, method="GET"), timeout=self.timeout)
+        except HTTPError as exc:
+            if exc.code == 304:
+                REGISTRY_LOADS.inc((LOADER_NAME, "unchanged"))
+                return False
+            REGISTRY_LOADS.inc((LOADER_NAME, "error"))
+            raise RuntimeError(f"Nie udało się pobrać listy z {self.source}: {exc}") from exc
+        except URLError as exc:
+            REGISTRY_LOADS.inc((LOADER_NAME, "error"))
+            raise RuntimeError(f"Nie udało się pobrać listy z {self.source}: {exc}") from exc
+
+        with response:
+            encoding = response.headers.get_content_charset() or "utf-8"
+            self._publish(io.TextIOWrapper(response, encoding=encoding, errors="replace"), self.source)
+            self._validators = {
+                key: value
+                for key, value in (("etag", response.headers.get("ETag")), ("last_modified", response.headers.get("Last-Modified")))
+                if value
+            }
+        return True
+
+    def _publish(self, lines: Iterator[str], origin: str) -> None:
+        started = time.perf_counter()
+        try:
+            hashes = build_hashes(lines)
+        except Exception:
+            REGISTRY_LOADS.inc((LOADER_NAME, "error"))
+            raise
+        self._swap(BlocklistIndex(hashes, build_buckets(hashes), time.time_ns(), time.time(), origin))
+        REGISTRY_LOADS.inc((LOADER_NAME, "ok"))
+        REGISTRY_LOAD_SECONDS.observe(time.perf_counter() - started, (LOADER_NAME,))
+        logger.info("Załadowano listę %s: %d domen (%d KiB indeksu)", self.name, len(hashes), len(hashes) * 8 // 1024)
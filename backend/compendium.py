@@ -0,0 +1,135 @@
+"""Compendium views of a registry snapshot: listed domains sorted by name, overall and per category.
+
+A view is an ``array('I')`` of record numbers into the snapshot's entries
+rather than a list of domain strings. With a shared snapshot
+(``GOV_DOMAIN_SNAPSHOT_PATH``) the arrays, and the autocomplete label
+arrays, are written into the snapshot file, so every worker maps the same
+pages instead of decoding the registry into its own lists and dicts.
+``DomainView`` decodes a domain only when a page, search or export reads it.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence
+
+from backend.autocomplete import label_arrays
+from backend.domain_registry import ROOT_DOMAIN
+
+COMPENDIUM_CATEGORIES = ("ministerstwa", "urzedy", "serwisy", "inne")
+# View with every listed domain; the category views split it
+ALL_DOMAINS = "all"
+# Index into COMPENDIUM_CATEGORIES of each domain in ALL_DOMAINS (one byte per domain)
+DOMAIN_CATEGORIES = "category"
+# Autocomplete label arrays are stored as "labels.<depth>"
+LABELS_PREFIX = "labels."
+
+
+def compendium_category(domain: str) -> str:
+    """Compendium category derived from the domain name."""
+    if any(keyword in domain for keyword in ["ministerstwo", "msp", "mk", "mz", "msw", "mkidn"]):
+        return "ministerstwa"
+    if any(keyword in domain for keyword in [".sr.", ".uw.", ".um.", ".gmina"]):
+        return "urzedy"
+    if any(keyword in domain for keyword in ["epuap", "obywatel", "pacjent", "edukacja"]):
+        return "serwisy"
+    return "inne"
+
+
+def is_listed_entry(entry: Optional[Dict]) -> bool:
+    """Registry entry lying inside its own zone (gov.pl or a zone from GOV_DOMAIN_EXTRA_ZONES)."""
+    if entry is None:
+        return False
+    domain, zone = entry["domain"], entry.get("zone") or ROOT_DOMAIN
+    return domain == zone or domain.endswith(f".{zone}")
+
+
+def compendium_views(entries: Sequence[Dict], *, shared: bool = False) -> Dict[str, array]:
+    """Record numbers of the listed entries sorted by domain, overall and per category.
+
+    A domain listed more than once keeps its first record. ``shared`` adds
+    the autocomplete label arrays, so a snapshot file carries them too; a
+    per-process registry builds them on the first autocomplete instead.
+    """
+    listed = [index for index, entry in enumerate(entries) if is_listed_entry(entry)]
+    listed.sort(key=lambda index: entries[index]["domain"])
+
+    views = {ALL_DOMAINS: array("I"), DOMAIN_CATEGORIES: array("B")}
+    views.update((name, array("I")) for name in COMPENDIUM_CATEGORIES)
+    codes = {name: code for code, name in enumerate(COMPENDIUM_CATEGORIES)}
+    domains: List[str] = []
+    for index in listed:
+        domain = entries[index]["domain"]
+        if domains and domains[-1] == domain:
+            continue
+        domains.append(domain)
+        category = compendium_category(domain)
+        views[ALL_DOMAINS].append(index)
+        views[DOMAIN_CATEGORIES].append(codes[category])
+        views[category].append(index)
+
+    if shared:
+        for depth, labels in enumerate(label_arrays(domains), start=1):
+            views[f"{LABELS_PREFIX}{depth}"] = labels
+    return views
+
+
+def stored_labels(views: Mapping[str, Sequence[int]]) -> Optional[List[Sequence[int]]]:
+    """Autocomplete label arrays carried by a snapshot's views, or None."""
+    labels = [view for name, view in views.items() if name.startswith(LABELS_PREFIX)]
+    return labels or None
+
+
+class DomainView(Sequence):
+    """Sorted domains of one view, decoded from the snapshot on access."""
+
+    __slots__ = ("_domain_at", "_records")
+
+    def __init__(self, domain_at: Callable[[int], str], records: Sequence[int]) -> None:
+        self._domain_at = domain_at
+        self._records = records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(map(self._domain_at, self._records[index]))
+        return self._domain_at(self._records[index])
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self._domain_at, self._records)
+
+
+class DomainCategories(Mapping):
+    """``domain -> compendium category`` over a sorted view and its category codes.
+
+    Iteration is in sorted domain order (``sorted_keys``), which lets
+    ``registry_history.diff`` merge two snapshots in one pass.
+    """
+
+    sorted_keys = True
+
+    def __init__(self, domains: Sequence[str], codes: Sequence[int]) -> None:
+        self.domains = domains
+        self.codes = codes
+
+    def __getitem__(self, domain: str) -> str:
+        position = bisect_left(self.domains, domain)
+        if position < len(self.domains) and self.domains[position] == domain:
+            return COMPENDIUM_CATEGORIES[self.codes[position]]
+        raise KeyError(domain)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.domains)
+
+    def __len__(self) -> int:
+        return len(self.domains)
+
+    def categories(self) -> Iterator[str]:
+        """Category of each domain, in iteration order."""
+        return map(COMPENDIUM_CATEGORIES.__getitem__, self.codes)
+
+    def items(self):
+        return zip(self.domains, self.categories())
@@ -0,0 +1,250 @@
+"""Full-snapshot export of the domain compendium as NDJSON or CSV.
+
+Mirroring the compendium page by page re-filters the whole list on every
+request. An ``ExportBody`` is instead encoded once per snapshot, format and
+category and then served as-is: as a chunked stream, as a byte range
+(``Range``/``If-Range``) or from a row cursor (``after=<last domain seen>``).
+Rows are sorted by domain and ``offsets[i]`` is the byte offset where row
+``i`` starts, so both ways of resuming are a bisect followed by a slice.
+
+``snapshot_version`` fingerprints the data the export is built from; the
+export ETag combines it with the format and category, so re-downloading an
+unchanged snapshot costs a 304.
+
+With a shared registry snapshot the encoded export is written once per host
+next to the snapshot (``build_export(..., directory=...)``) and every worker
+maps that file instead of holding its own copy of the bytes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import re
+import struct
+import tempfile
+from array import array
+from bisect import bisect_right
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from backend.registry_snapshot import builder_lock
+from backend.serialization import dumps
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+CSV_HEADER = b"domain,category\r\n"
+# Size of the pieces written to the socket; small enough to start sending at once.
+STREAM_CHUNK_SIZE = 1 << 16
+
+_CSV_SPECIAL = re.compile(r'[,"\r\n]')
+
+# Shared export file: magic | rows u64 | body length u64 | offsets u64[rows + 1] | body
+EXPORT_MAGIC = b"MVEXP01\0"
+_EXPORT_PREAMBLE = struct.Struct("=8sQQ")
+# Domains hashed per update() call by snapshot_version
+_VERSION_BATCH = 4096
+
+
+def snapshot_version(domains: Sequence[str], last_updated: Optional[str]) -> str:
+    """Short content hash of a registry snapshot; identical data gives the same version in every worker."""
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update((last_updated or "").encode("utf-8"))
+    digest.update(b"\0")
+    # The domains joined by "\n", hashed in batches instead of building one string of the whole registry
+    iterator = iter(domains)
+    separator = b""
+    while True:
+        batch = list(islice(iterator, _VERSION_BATCH))
+        if not batch:
+            break
+        digest.update(separator + "\n".join(batch).encode("utf-8"))
+        separator = b"\n"
+    return digest.hexdigest()
+
+
+def _csv_field(value: Optional[str]) -> str:
+    if value is None:
+        return ""
+    if _CSV_SPECIAL.search(value):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+# format -> (encode domain as the start of a row, encode category as the rest of the row)
+_ROW_ENCODERS: Dict[str, Tuple[Callable[[str], bytes], Callable[[Optional[str]], bytes]]] = {
+    "ndjson": (
+        lambda domain: b'{"domain":' + dumps(domain),
+        lambda category: b',"category":' + dumps(category) + b"}\n",
+    ),
+    "csv": (
+        lambda domain: _csv_field(domain).encode("utf-8"),
+        lambda category: b"," + _csv_field(category).encode("utf-8") + b"\r\n",
+    ),
+}
+
+
+class ExportBody:
+    """One encoded export: the bytes plus the row index used to resume it."""
+
+    __slots__ = ("body", "domains", "offsets", "etag", "media_type")
+
+    def __init__(self, body: Sequence[int], offsets: Sequence[int], domains: Sequence[str], etag: str, media_type: str) -> None:
+        # bytes, or a view into a mapped shared export file
+        self.body = body
+        self.offsets = offsets
+        # The sorted domains the rows were encoded from (not copied), for resume cursors
+        self.domains = domains
+        self.etag = etag
+        self.media_type = media_type
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+    @property
+    def rows(self) -> int:
+        return len(self.domains)
+
+    def offset_after(self, domain: str) -> int:
+        """Byte offset of the first row sorted after ``domain`` (a resume cursor)."""
+        return self.offsets[bisect_right(self.domains, domain)]
+
+    def stream(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        view = memoryview(self.body)
+        end = len(view) if end is None else end
+        for position in range(start, end, STREAM_CHUNK_SIZE):
+            yield bytes(view[position:min(position + STREAM_CHUNK_SIZE, end)])
+
+
+def parse_range(header: str, length: int) -> Optional[Tuple[int, int]]:
+    """``(start, end)`` (end exclusive) for a single ``bytes=`` range; None when unsatisfiable.
+
+    Raises ValueError for syntax this endpoint does not serve (other units,
+    multiple ranges) and for invalid ranges such as ``bytes=5-3``; RFC 9110
+    has the server ignore those, so the full body is sent.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(header)
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = int(last) + 1 if last else length
+        if last and end <= start:
+            raise ValueError(header)
+    else:
+        # Suffix range: the last N bytes.
+        start, end = max(length - int(last), 0), length
+    end = min(end, length)
+    if start >= end:
+        return None
+    return start, end
+
+
+def export_etag(version: str, export_format: str, category: Optional[str]) -> str:
+    """Strong ETag of one export; known before the export is built, so a 304 never builds it."""
+    return f'"{version}-{export_format}-{category or "all"}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, so ``W/`` prefixes added by proxies still match)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def encode_export(
+    domains: Sequence[str],
+    categories: Iterable[Optional[str]],
+    export_format: str,
+    etag: str,
+) -> ExportBody:
+    """Encode one row per domain with its category; ``domains`` must be sorted for ``offset_after``."""
+    encode_domain, encode_category = _ROW_ENCODERS[export_format]
+    parts: List[bytes] = [CSV_HEADER] if export_format == "csv" else []
+    position = len(parts[0]) if parts else 0
+    offsets = array("Q")
+    # Only a handful of categories: each row encodes its domain and reuses the encoded category.
+    tails: Dict[Optional[str], bytes] = {}
+    for domain, category in zip(domains, categories):
+        tail = tails.get(category)
+        if tail is None:
+            tail = tails[category] = encode_category(category)
+        line = encode_domain(domain) + tail
+        offsets.append(position)
+        parts.append(line)
+        position += len(line)
+    offsets.append(position)
+    return ExportBody(b"".join(parts), offsets, domains, etag, EXPORT_FORMATS[export_format])
+
+
+def write_export(path: Path, export: ExportBody) -> None:
+    """Write ``export`` to ``path`` atomically (temporary file and rename)."""
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(_EXPORT_PREAMBLE.pack(EXPORT_MAGIC, export.rows, len(export)))
+            handle.write(array("Q", export.offsets).tobytes())
+            handle.write(export.body)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def load_export(path: Path, domains: Sequence[str], etag: str, media_type: str) -> ExportBody:
+    """Map an export written by ``write_export``; the mapping stays valid after the file is replaced."""
+    with path.open("rb") as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, rows, length = _EXPORT_PREAMBLE.unpack_from(mapped, 0)
+    if magic != EXPORT_MAGIC or rows != len(domains):
+        raise ValueError(f"{path} nie pasuje do bieżącego snapshotu")
+    view = memoryview(mapped)
+    offsets_end = _EXPORT_PREAMBLE.size + 8 * (rows + 1)
+    offsets = view[_EXPORT_PREAMBLE.size:offsets_end].cast("Q")
+    return ExportBody(view[offsets_end:offsets_end + length], offsets, domains, etag, media_type)
+
+
+def build_export(
+    domains: Sequence[str],
+    categories: Iterable[Optional[str]],
+    export_format: str,
+    version: str,
+    category: Optional[str] = None,
+    *,
+    directory: Optional[Path] = None,
+) -> ExportBody:
+    """Encoded export of ``domains`` (``categories`` aligned with them); with ``directory``
+    it is built once per host and mapped by every worker."""
+    etag = export_etag(version, export_format, category)
+    if directory is None:
+        return encode_export(domains, categories, export_format, etag)
+
+    path = Path(directory) / f"{version}-{export_format}-{category or 'all'}.export"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with builder_lock(path, blocking=True):
+            if not path.exists():
+                write_export(path, encode_export(domains, categories, export_format, etag))
+                _remove_stale_exports(path.parent, version)
+    return load_export(path, domains, etag, EXPORT_FORMATS[export_format])
+
+
+def _remove_stale_exports(directory: Path, version: str) -> None:
+    # Exports of replaced snapshots; workers still streaming one keep their mapping.
+    for stale in directory.iterdir():
+        if not stale.name.startswith((f"{version}-", ".")):
+            try:
+                stale.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,389 @@
+"""Asynchronous DNS resolution check with a shared, TTL-respecting cache.
+
+A host listed in the registry can still be pointed somewhere unexpected, so
+verification can resolve its A/AAAA records and CNAME chain and flag CNAME
+targets outside the official zones. Queries go straight to a recursive
+resolver over UDP (TCP when truncated) on the event loop; answers are cached
+for the record TTL, NXDOMAIN/NODATA for the SOA negative TTL (RFC 2308), and
+concurrent requests for the same host share one lookup, so a host costs at
+most one resolution per TTL regardless of request volume.
+
+The resolver defaults to the first ``nameserver`` in ``/etc/resolv.conf``;
+``MVERIFY_DNS_SERVER=127.0.0.1:5353`` points it at a local stub server in
+tests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import os
+import secrets
+import socket
+import struct
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend.metrics import DNS_LOOKUPS
+
+DEFAULT_DNS_SERVER = os.getenv("MVERIFY_DNS_SERVER") or None
+DEFAULT_DNS_CONCURRENCY = int(os.getenv("MVERIFY_DNS_CONCURRENCY", "32") or "32")
+DEFAULT_DNS_TIMEOUT_SECONDS = float(os.getenv("MVERIFY_DNS_TIMEOUT_SECONDS", "2") or "2")
+DEFAULT_DNS_MIN_TTL_SECONDS = int(os.getenv("MVERIFY_DNS_MIN_TTL_SECONDS", "5") or "5")
+DEFAULT_DNS_MAX_TTL_SECONDS = int(os.getenv("MVERIFY_DNS_MAX_TTL_SECONDS", "3600") or "3600")
+DEFAULT_DNS_NEGATIVE_TTL_SECONDS = int(os.getenv("MVERIFY_DNS_NEGATIVE_TTL_SECONDS", "300") or "300")
+DEFAULT_DNS_ERROR_TTL_SECONDS = int(os.getenv("MVERIFY_DNS_ERROR_TTL_SECONDS", "30") or "30")
+DEFAULT_DNS_CACHE_SIZE = int(os.getenv("MVERIFY_DNS_CACHE_SIZE", "10000") or "10000")
+# Hosty spoza oficjalnych stref, które wolno rozwiązywać (np. "localhost" w testach)
+DEFAULT_DNS_EXTRA_HOSTS = frozenset(
+    host.strip().lower() for host in os.getenv("MVERIFY_DNS_EXTRA_HOSTS", "").split(",") if host.strip()
+)
+
+TYPE_A = 1
+TYPE_CNAME = 5
+TYPE_SOA = 6
+TYPE_AAAA = 28
+CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+_HEADER = struct.Struct("!HHHHHH")
+_RR = struct.Struct("!HHIH")
+_MAX_CNAME_CHAIN = 16
+
+
+class DNSError(Exception):
+    """The resolver did not return a usable answer (timeout, SERVFAIL, malformed reply)."""
+
+
+def parse_server(value: str, default_port: int = 53) -> Tuple[str, int]:
+    """Parse ``host``, ``host:port``, ``ipv6`` or ``[ipv6]:port``."""
+    value = value.strip()
+    if value.startswith("["):
+        host, _, port = value[1:].partition("]")
+        return host, int(port.lstrip(":") or default_port)
+    if value.count(":") == 1:
+        host, port = value.split(":")
+        return host, int(port)
+    return value, default_port
+
+
+def system_nameserver(resolv_conf: str = "/etc/resolv.conf") -> Tuple[str, int]:
+    try:
+        with open(resolv_conf, encoding="utf-8") as handle:
+            for line in handle:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    # Link-local IPv6 servers carry a zone id ("fe80::1%eth0") which the socket API takes as-is.
+                    return parts[1], 53
+    except OSError:
+        pass
+    return "127.0.0.1", 53
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def in_zones(hostname: str, zones: Iterable[str]) -> bool:
+    return any(hostname == zone or hostname.endswith(f".{zone}") for zone in zones)
+
+
+def encode_query(query_id: int, hostname: str, rtype: int) -> bytes:
+    """Recursive query (RD set) for ``hostname``/``rtype`` in class IN.
+
+    Raises ValueError for a name that cannot be encoded: non-ASCII (IDNA not
+    applied), a label over 63 bytes or a name over 253 bytes (RFC 1035).
+    """
+    try:
+        encoded = hostname.rstrip(".").encode("ascii")
+    except UnicodeEncodeError:
+        raise ValueError(f"nazwa {hostname!r} nie jest w formie ASCII (IDNA)") from None
+    labels = encoded.split(b".")
+    if len(encoded) > 253 or not all(0 < len(label) <= 63 for label in labels):
+        raise ValueError(f"nieprawidłowa długość nazwy lub etykiety: {hostname!r}")
+    qname = b"".join(bytes((len(label),)) + label for label in labels) + b"\0"
+    return _HEADER.pack(query_id, 0x0100, 1, 0, 0, 0) + qname + struct.pack("!HH", rtype, CLASS_IN)
+
+
+def _read_name(message: bytes, offset: int) -> Tuple[str, int]:
+    """Decode a possibly compressed name; returns (name, offset after the name in place)."""
+    labels: List[str] = []
+    end = None
+    jumps = 0
+    while True:
+        if offset >= len(message):
+            raise DNSError("Uszkodzona odpowiedź DNS (nazwa poza wiadomością)")
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(message):
+                raise DNSError("Uszkodzona odpowiedź DNS (wskaźnik kompresji)")
+            if end is None:
+                end = offset + 2
+            jumps += 1
+            if jumps > 64:
+                raise DNSError("Uszkodzona odpowiedź DNS (pętla kompresji)")
+            offset = ((length & 0x3F) << 8) | message[offset + 1]
+            continue
+        if length == 0:
+            offset += 1
+            break
+        labels.append(message[offset + 1:offset + 1 + length].decode("ascii", "replace").lower())
+        offset += 1 + length
+    return ".".join(labels), (end if end is not None else offset)
+
+
+def decode_response(message: bytes, query_id: int, hostname: str, rtype: int) -> Dict[str, Any]:
+    """Parse a reply into rcode, answer records and the negative-caching TTL from the SOA."""
+    if len(message) < _HEADER.size:
+        raise DNSError("Uszkodzona odpowiedź DNS (za krótki nagłówek)")
+    rid, flags, qdcount, ancount, nscount, _ = _HEADER.unpack_from(message, 0)
+    if rid != query_id or not flags & 0x8000:
+        raise DNSError("Odpowiedź DNS nie pasuje do zapytania")
+
+    offset = _HEADER.size
+    for _ in range(qdcount):
+        qname, offset = _read_name(message, offset)
+        qtype, _ = struct.unpack_from("!HH", message, offset)
+        offset += 4
+        if qname != hostname or qtype != rtype:
+            raise DNSError("Odpowiedź DNS dotyczy innego pytania")
+
+    records: List[Tuple[str, int, int, Any]] = []
+    negative_ttl: Optional[int] = None
+    for index in range(ancount + nscount):
+        owner, offset = _read_name(message, offset)
+        if offset + _RR.size > len(message):
+            raise DNSError("Uszkodzona odpowiedź DNS (rekord poza wiadomością)")
+        kind, rclass, ttl, rdlength = _RR.unpack_from(message, offset)
+        offset += _RR.size
+        rdata_offset, offset = offset, offset + rdlength
+        if rclass != CLASS_IN:
+            continue
+        if index < ancount:
+            if kind == TYPE_A and rdlength == 4:
+                records.append((owner, kind, ttl, socket.inet_ntop(socket.AF_INET, message[rdata_offset:offset])))
+            elif kind == TYPE_AAAA and rdlength == 16:
+                records.append((owner, kind, ttl, socket.inet_ntop(socket.AF_INET6, message[rdata_offset:offset])))
+            elif kind == TYPE_CNAME:
+                records.append((owner, kind, ttl, _read_name(message, rdata_offset)[0]))
+        elif kind == TYPE_SOA:
+            _, position = _read_name(message, rdata_offset)
+            _, position = _read_name(message, position)
+            minimum = struct.unpack_from("!IIIII", message, position)[4]
+            negative_ttl = min(ttl, minimum)
+
+    return {
+        "rcode": flags & 0x000F,
+        "truncated": bool(flags & 0x0200),
+        "records": records,
+        "negative_ttl": negative_ttl,
+    }
+
+
+class _DatagramQuery(asyncio.DatagramProtocol):
+    def __init__(self, future: asyncio.Future, query_id: int) -> None:
+        self.future = future
+        self.query_id = query_id
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        # Datagrams with a different id are stray or spoofed; keep waiting for the real reply.
+        if not self.future.done() and data[:2] == struct.pack("!H", self.query_id):
+            self.future.set_result(data)
+
+    def error_received(self, exc: Exception) -> None:
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class DNSResolver:
+    """Resolves A/AAAA/CNAME for hosts and caches the outcome per host."""
+
+    def __init__(
+        self,
+        zones: Iterable[str],
+        *,
+        server: Optional[str] = DEFAULT_DNS_SERVER,
+        max_concurrency: int = DEFAULT_DNS_CONCURRENCY,
+        timeout: float = DEFAULT_DNS_TIMEOUT_SECONDS,
+        min_ttl: int = DEFAULT_DNS_MIN_TTL_SECONDS,
+        max_ttl: int = DEFAULT_DNS_MAX_TTL_SECONDS,
+        negative_ttl: int = DEFAULT_DNS_NEGATIVE_TTL_SECONDS,
+        error_ttl: int = DEFAULT_DNS_ERROR_TTL_SECONDS,
+        cache_size: int = DEFAULT_DNS_CACHE_SIZE,
+        extra_hosts: frozenset = DEFAULT_DNS_EXTRA_HOSTS,
+    ) -> None:
+        self.zones = tuple(zones)
+        self.server = parse_server(server) if server else system_nameserver()
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.cache_size = cache_size
+        self.extra_hosts = extra_hosts
+        self._family = socket.AF_INET6 if ":" in self.server[0] else socket.AF_INET
+
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cached": len(self._cache), "in_flight": len(self._inflight), "server": f"{self.server[0]}:{self.server[1]}"}
+
+    async def resolve(self, hostname: str) -> Dict[str, Any]:
+        cached = self._cache.get(hostname)
+        if cached is not None and cached[0] > time.monotonic():
+            self._cache.move_to_end(hostname)
+            DNS_LOOKUPS.inc(("cache_hit",))
+            return {**cached[1], "cached": True}
+
+        self._bind_loop()
+        pending = self._inflight.get(hostname)
+        if pending is None:
+            pending = self._inflight[hostname] = asyncio.ensure_future(self._lookup(hostname))
+            pending.add_done_callback(lambda _: self._inflight.pop(hostname, None))
+        else:
+            DNS_LOOKUPS.inc(("shared",))
+        # shield: a caller that goes away must not cancel the lookup others wait for
+        result = await asyncio.shield(pending)
+        return {**result, "cached": False}
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # asyncio primitives belong to one loop; the result cache is plain data and survives.
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+
+    async def _lookup(self, hostname: str) -> Dict[str, Any]:
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                answers = await asyncio.gather(self._query(hostname, TYPE_A), self._query(hostname, TYPE_AAAA))
+                result, ttl = self._describe(hostname, answers)
+                outcome = result["status"]
+            except (DNSError, OSError, EOFError, struct.error, ValueError, asyncio.TimeoutError) as exc:
+                message = f"Przekroczono czas zapytania DNS ({self.timeout:g} s)" if isinstance(exc, asyncio.TimeoutError) else f"Błąd zapytania DNS: {exc}"
+                result, ttl = self._failure(hostname, message), self.error_ttl
+                outcome = "timeout" if isinstance(exc, asyncio.TimeoutError) else "error"
+            result["lookup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        DNS_LOOKUPS.inc((outcome,))
+        self._store(hostname, result, ttl)
+        return result
+
+    def _store(self, hostname: str, result: Dict[str, Any], ttl: float) -> None:
+        self._cache[hostname] = (time.monotonic() + ttl, result)
+        self._cache.move_to_end(hostname)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _query(self, hostname: str, rtype: int) -> Dict[str, Any]:
+        query_id = secrets.randbits(16)
+        message = encode_query(query_id, hostname, rtype)
+        loop = asyncio.get_running_loop()
+        # A fresh socket per query gives a random source port next to the random id.
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramQuery(future, query_id), remote_addr=self.server, family=self._family
+        )
+        try:
+            transport.sendto(message)
+            reply = await asyncio.wait_for(future, self.timeout)
+        finally:
+            transport.close()
+        response = decode_response(reply, query_id, hostname, rtype)
+        if response["truncated"]:
+            response = await asyncio.wait_for(self._query_tcp(hostname, rtype), self.timeout)
+        if response["rcode"] not in (RCODE_NOERROR, RCODE_NXDOMAIN):
+            raise DNSError(f"serwer DNS zwrócił kod {response['rcode']}")
+        return response
+
+    async def _query_tcp(self, hostname: str, rtype: int) -> Dict[str, Any]:
+        query_id = secrets.randbits(16)
+        message = encode_query(query_id, hostname, rtype)
+        reader, writer = await asyncio.open_connection(*self.server)
+        try:
+            writer.write(struct.pack("!H", len(message)) + message)
+            await writer.drain()
+            (length,) = struct.unpack("!H", await reader.readexactly(2))
+            reply = await reader.readexactly(length)
+        finally:
+            writer.close()
+        return decode_response(reply, query_id, hostname, rtype)
+
+    def _describe(self, hostname: str, answers: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], float]:
+        chain: List[str] = []
+        aliases: Dict[str, str] = {}
+        addresses: Dict[int, List[str]] = {TYPE_A: [], TYPE_AAAA: []}
+        ttls: List[int] = []
+        nxdomain = False
+
+        for answer in answers:
+            nxdomain = nxdomain or answer["rcode"] == RCODE_NXDOMAIN
+            for owner, kind, ttl, value in answer["records"]:
+                ttls.append(ttl)
+                if kind == TYPE_CNAME:
+                    aliases[owner] = value
+                elif value not in addresses[kind]:
+                    addresses[kind].append(value)
+            if not any(kind != TYPE_CNAME for _, kind, _, _ in answer["records"]):
+                # No address of this type: the negative answer has its own (SOA) lifetime.
+                negative = answer["negative_ttl"]
+                ttls.append(min(negative, self.negative_ttl) if negative is not None else self.negative_ttl)
+
+        current = hostname
+        while current in aliases and len(chain) < _MAX_CNAME_CHAIN:
+            current = aliases[current]
+            chain.append(current)
+
+        offzone = [target for target in chain if not in_zones(target, self.zones)]
+        if nxdomain:
+            status = "nxdomain"
+        elif addresses[TYPE_A] or addresses[TYPE_AAAA]:
+            status = "resolved"
+        else:
+            status = "nodata"
+
+        ttl = max(self.min_ttl, min(min(ttls, default=self.negative_ttl), self.max_ttl))
+        return {
+            "hostname": hostname,
+            "status": status,
+            "a": addresses[TYPE_A],
+            "aaaa": addresses[TYPE_AAAA],
+            "cname_chain": chain,
+            "canonical_name": current,
+            "cname_leaves_official_zones": bool(offzone),
+            "offzone_targets": offzone,
+            "private_addresses": [
+                address for address in addresses[TYPE_A] + addresses[TYPE_AAAA]
+                if not ipaddress.ip_address(address).is_global
+            ],
+            "ttl": int(ttl),
+            "error": None,
+            "checked_at": _iso(time.time()),
+        }, ttl
+
+    def _failure(self, hostname: str, error: str) -> Dict[str, Any]:
+        return {
+            "hostname": hostname,
+            "status": "error",
+            "a": [],
+            "aaaa": [],
+            "cname_chain": [],
+            "canonical_name": None,
+            "cname_leaves_official_zones": False,
+            "offzone_targets": [],
+            "private_addresses": [],
+            "ttl": self.error_ttl,
+            "error": error,
+            "checked_at": _iso(time.time()),
+        }
+
@@ -2,18 +2,33 @@
 
 from __future__ import annotations
 
+import io
 import json
 import logging
 import os
+import re
 import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 from urllib.error import HTTPError, URLError
 from urllib.parse import urlparse
 from urllib.request import Request, urlopen
 
+from backend.file_watch import DEFAULT_WATCH_ENABLED, FileWatcher, file_digest
+from backend.metrics import REGISTRY_ENTRIES, REGISTRY_LOAD_SECONDS, REGISTRY_LOADS
+from backend.payload_stream import StreamedPayload
+from backend.registry_snapshot import (
+    MappedSnapshot,
+    builder_lock,
+    shared_snapshots_supported,
+    snapshot_identity,
+    write_snapshot,
+)
+from backend.timing import span
+
 logger = logging.getLogger(__name__)
 
 GOV_SUFFIX = ".gov.pl"
@@ -22,6 +37,15 @@ ROOT_DOMAIN = "gov.pl"
 DEFAULT_CACHE_TTL_SECONDS = int(os.getenv("GOV_DOMAIN_CACHE_TTL_SECONDS", "43200") or "43200")
 DEFAULT_REMOTE_URL = os.getenv("GOV_DOMAIN_REMOTE_URL")
 DEFAULT_REMOTE_TIMEOUT_SECONDS = int(os.getenv("GOV_DOMAIN_REMOTE_TIMEOUT_SECONDS", "15") or "15")
+# Wspólny dla wszystkich workerów snapshot rejestru (mmap); puste = indeks w każdym procesie osobno
+DEFAULT_SNAPSHOT_PATH = os.getenv("GOV_DOMAIN_SNAPSHOT_PATH") or None
+DEFAULT_SNAPSHOT_CHECK_SECONDS = int(os.getenv("GOV_DOMAIN_SNAPSHOT_CHECK_SECONDS", "5") or "5")
+# Dodatkowe oficjalne strefy (mil.pl, edu.pl, listy samorządów...) – format w parse_zones()
+DEFAULT_EXTRA_ZONES = os.getenv("GOV_DOMAIN_EXTRA_ZONES", "")
+# Ponowna próba załadowania strefy po błędzie
+ZONE_RETRY_SECONDS = 60
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 CATEGORY_ROOT = "Portal główny gov.pl"
 CATEGORY_CENTRAL = "Administracja centralna"
@@ -105,6 +129,10 @@ def _to_iso(ts: Optional[float]) -> Optional[str]:
     )
 
 
+# A bare ASCII hostname (the form registry rows come in) needs neither URL parsing nor IDNA.
+_PLAIN_HOSTNAME = re.compile(r"[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.?")
+
+
 def normalize_hostname(value: Optional[str]) -> Optional[str]:
     """Normalize arbitrary user input into a lowercase hostname."""
     if value is None:
@@ -114,6 +142,9 @@ def normalize_hostname(value: Optional[str]) -> Optional[str]:
     if not candidate:
         return None
 
+    if _PLAIN_HOSTNAME.fullmatch(candidate):
+        return candidate.rstrip(".").lower()
+
     parsed = urlparse(candidate if "://" in candidate else f"//{candidate}", scheme="https")
     host = (parsed.hostname or "").strip()
 
@@ -135,8 +166,118 @@ def normalize_hostname(value: Optional[str]) -> Optional[str]:
     return host.lower()
 
 
+def is_valid_hostname(host: str) -> bool:
+    """True when ``host`` can go on the wire: ASCII (IDNA already applied), at most
+    253 characters, labels of 1-63 characters.
+
+    ``normalize_hostname`` keeps input that fails IDNA encoding as-is, so a
+    name must pass this check before it is dialed or queried.
+    """
+    if not host or len(host) > 253 or not host.isascii():
+        return False
+    return all(0 < len(label) <= 63 for label in host.split("."))
+
+
+def _snapshot_meta(primary: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Source metadata of the gov.pl zone carried by the merged snapshot."""
+    return {
+        "declared_count": primary.get("declared_count"),
+        "data_timestamp": primary.get("data_timestamp"),
+        "server_time": primary.get("server_time"),
+    }
+
+
+class Zone(NamedTuple):
+    """One official zone dataset with its own source and refresh cadence."""
+
+    name: str
+    source_path: Optional[Path] = None
+    remote_url: Optional[str] = None
+    cache_ttl: int = DEFAULT_CACHE_TTL_SECONDS
+    category: Optional[str] = None
+
+
+def parse_zones(value: str) -> List[Zone]:
+    """Parse ``GOV_DOMAIN_EXTRA_ZONES``.
+
+    The value is a JSON list such as
+    ``[{"zone": "mil.pl", "source": "assets/mil.json", "ttl": 3600}]``.
+    ``source`` may be a path (relative to the project root) or an http(s) URL;
+    ``category`` optionally overrides the category given to the zone's entries.
+    """
+    if not value.strip():
+        return []
+
+    zones: List[Zone] = []
+    for item in json.loads(value):
+        source = str(item.get("source") or "")
+        remote_url = source if source.startswith(("http://", "https://")) else None
+        source_path = None
+        if source and not remote_url:
+            source_path = Path(source)
+            if not source_path.is_absolute():
+                source_path = PROJECT_ROOT / source_path
+        zones.append(Zone(
+            name=normalize_hostname(item["zone"]),
+            source_path=source_path,
+            remote_url=remote_url,
+            cache_ttl=int(item.get("ttl") or DEFAULT_CACHE_TTL_SECONDS),
+            category=item.get("category"),
+        ))
+    return zones
+
+
+EXTRA_ZONES = parse_zones(DEFAULT_EXTRA_ZONES)
+
+
+def official_zones() -> Tuple[str, ...]:
+    """Names of all configured official zones, gov.pl first."""
+    return (ROOT_DOMAIN,) + tuple(zone.name for zone in EXTRA_ZONES if zone.name != ROOT_DOMAIN)
+
+
+class ZoneData(NamedTuple):
+    """Parsed entries of one zone, kept by the writer to merge zones."""
+
+    entries: List[Dict]
+    categories: List[str]
+    info: Dict[str, Any]
+
+
+class RegistrySnapshot(NamedTuple):
+    """One immutable version of the registry.
+
+    Reloads build a new snapshot and publish it with a single reference
+    assignment, so a reader that grabbed a snapshot sees one consistent
+    version for the whole request without taking a lock. All zones share
+    one ``lookup``, so a verify is a single suffix walk whatever the zone
+    count.
+    """
+
+    version: int
+    entries: Sequence[Dict]
+    lookup: Any  # dict or MappedSnapshot; both provide .get(domain)
+    categories: List[str]
+    meta: Dict[str, Optional[str]]
+    origin: Optional[str]
+    refreshed_at: float
+    load_seconds: Optional[float]
+    zones: Dict[str, Dict[str, Any]]
+    zone_names: frozenset
+    expires_at: float
+    # Arrays derived from the entries by the registry's ``views`` builder (stored in the snapshot file when shared)
+    views: Dict[str, Sequence[int]]
+    # Domain of entry ``index`` without decoding the whole record
+    domain_at: Callable[[int], str]
+
+
+EMPTY_SNAPSHOT = RegistrySnapshot(0, (), {}, [], {}, None, 0.0, None, {}, frozenset(), 0.0, {}, lambda index: "")
+
+# Builds the snapshot's views from its merged entries; ``shared`` is True when they go into the snapshot file
+ViewsBuilder = Callable[..., Dict[str, Sequence[int]]]
+
+
 class DomainRegistry:
-    """Loads and caches the official list of gov.pl domains."""
+    """Loads and caches the official lists of gov.pl (and other configured zone) domains."""
 
     def __init__(
         self,
@@ -145,93 +286,409 @@ class DomainRegistry:
         cache_ttl: int = DEFAULT_CACHE_TTL_SECONDS,
         remote_url: Optional[str] = DEFAULT_REMOTE_URL,
         remote_timeout: int = DEFAULT_REMOTE_TIMEOUT_SECONDS,
+        snapshot_path: Optional[Path] = DEFAULT_SNAPSHOT_PATH,
+        snapshot_check_interval: int = DEFAULT_SNAPSHOT_CHECK_SECONDS,
+        watch: bool = DEFAULT_WATCH_ENABLED,
+        zones: Optional[Sequence[Zone]] = None,
+        views: Optional[ViewsBuilder] = None,
     ) -> None:
         self.source_path = Path(source_path)
         self.cache_ttl = cache_ttl
         self.remote_url = remote_url
         self.remote_timeout = remote_timeout
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.snapshot_check_interval = snapshot_check_interval
+        self.views = views
+        if self.snapshot_path and not shared_snapshots_supported():
+            logger.warning("Współdzielony snapshot rejestru wymaga flock (POSIX) – każdy proces ładuje dane osobno.")
+            self.snapshot_path = None
+
+        self.zones: Dict[str, Zone] = {
+            ROOT_DOMAIN: Zone(ROOT_DOMAIN, self.source_path, remote_url, cache_ttl),
+        }
+        for zone in EXTRA_ZONES if zones is None else zones:
+            self.zones.setdefault(zone.name, zone)
 
+        # Writers serialize on the lock; readers only ever read self._state.
         self._lock = threading.Lock()
-        self._entries: List[Dict] = []
-        self._lookup: Dict[str, Dict] = {}
-        self._categories: List[str] = []
-        self._meta: Dict[str, Optional[str]] = {}
-        self._last_refreshed: float = 0.0
-        self._last_source: Optional[str] = None
-        self._last_error: Optional[str] = None
+        self._state: RegistrySnapshot = EMPTY_SNAPSHOT
+        self._zone_data: Dict[str, ZoneData] = {}
+        self._zone_errors: Dict[str, str] = {}
+        self._next_refresh: Dict[str, float] = {}
+        self._mapped: Optional[MappedSnapshot] = None
+        self._snapshot_checked_at: float = 0.0
+        self._watchers: Dict[str, FileWatcher] = {}
+        # Background refresh started by ensure_fresh(); at most one runs at a time
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._refresh_thread_lock = threading.Lock()
+
+        REGISTRY_ENTRIES.track(("domain_registry",), lambda: len(self._state.entries))
 
         # Attempt an initial load so endpoints can respond immediately.
-        self.ensure_fresh(force=True)
-
-    def ensure_fresh(self, *, force: bool = False) -> None:
-        """Reload the dataset if the cache expired or when forced."""
-        now = time.time()
-        if not force and self._entries and (now - self._last_refreshed) < self.cache_ttl:
+        if self.snapshot_path:
+            self._refresh_snapshot()
+        else:
+            self.ensure_fresh(force=True)
+
+        # Local source files are reloaded when their content changes instead of on TTL expiry.
+        if watch:
+            for zone in self.zones.values():
+                if zone.source_path and zone.source_path.exists():
+                    self._watchers[zone.name] = FileWatcher(
+                        zone.source_path,
+                        lambda digest, zone=zone: self._on_source_changed(zone, digest),
+                        name="domain_registry",
+                    ).start()
+            if self._watchers and not self.snapshot_path:
+                with self._lock:
+                    for name in self._watchers:
+                        self._next_refresh[name] = float("inf")
+                    self._state = self._state._replace(expires_at=min(self._next_refresh.values()))
+
+    @property
+    def snapshot(self) -> RegistrySnapshot:
+        return self._state
+
+    def watching(self, zone: str = ROOT_DOMAIN) -> bool:
+        watcher = self._watchers.get(zone)
+        return watcher is not None and watcher.running
+
+    def close(self) -> None:
+        for watcher in self._watchers.values():
+            watcher.stop()
+
+    def _on_source_changed(self, zone: Zone, digest: Optional[str]) -> None:
+        """Called from a watcher thread once a zone's source file content changed."""
+        if not self.snapshot_path:
+            with self._lock:
+                self._load_zone(zone, raise_errors=True)
+                self._publish()
             return
 
+        # Every worker's watcher fires; only the first to take the builder lock
+        # rebuilds, the others find the snapshot already built from this content.
+        with self._lock:
+            with builder_lock(self.snapshot_path, blocking=True):
+                self._attach_if_changed()
+                if self._mapped is not None and digest is not None and self._mapped.source_digests.get(zone.name) == digest:
+                    return
+                self._build_snapshot(raise_errors=True)
+
+    def ensure_fresh(self, *, force: bool = False) -> RegistrySnapshot:
+        """Reload zones whose cache expired (all zones when forced); return the current snapshot.
+
+        Each request checks a single precomputed expiry, so the zone count
+        does not add per-request work. Once data is loaded, expired zones
+        (and, with a shared snapshot, checking and rebuilding the file, which
+        may wait for another worker's builder lock) are reloaded on a
+        background thread while readers keep the previous snapshot; only the
+        first load and forced reloads block the caller.
+        """
+        if self.snapshot_path:
+            state = self._state
+            if force or not state.entries:
+                return self._refresh_snapshot(force=force)
+            if time.time() - self._snapshot_checked_at >= self.snapshot_check_interval:
+                self._refresh_in_background(self._refresh_snapshot)
+            return state
+
+        state = self._state
+        if not force and state.entries and time.time() < state.expires_at:
+            return state
+        if force or not state.entries:
+            return self._reload_zones(force=force)
+        # TTL refreshes and retries may fetch a remote zone (up to remote_timeout each)
+        self._refresh_in_background(self._reload_zones)
+        return state
+
+    def _reload_zones(self, *, force: bool = False) -> RegistrySnapshot:
+        """Reload expired zones (all when forced) under the writer lock and publish."""
         with self._lock:
+            state = self._state
+            if not force and state.entries and time.time() < state.expires_at:
+                return state
+
             now = time.time()
-            if not force and self._entries and (now - self._last_refreshed) < self.cache_ttl:
+            for zone in self.zones.values():
+                if force or now >= self._next_refresh.get(zone.name, 0.0):
+                    self._load_zone(zone)
+            return self._publish()
+
+    def _refresh_in_background(self, refresh: Callable[[], RegistrySnapshot]) -> None:
+        with self._refresh_thread_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
                 return
+            self._refresh_thread = threading.Thread(
+                target=self._run_refresh, args=(refresh,), name="domain_registry-refresh", daemon=True
+            )
+            self._refresh_thread.start()
 
-            try:
-                payload, origin = self._load_payload()
-                entries, lookup, categories, meta = self._parse_payload(payload)
-            except Exception as exc:  # pragma: no cover - defensive
-                self._last_error = str(exc)
-                logger.exception("Nie udało się załadować bazy domen gov.pl: %s", exc)
-                if self._entries:
-                    # Keep serving stale data but expose the error via cache info.
-                    return
-                raise RuntimeError("Brak danych o domenach gov.pl") from exc
-
+    def _run_refresh(self, refresh: Callable[[], RegistrySnapshot]) -> None:
+        try:
+            refresh()
+        except Exception as exc:  # pragma: no cover - defensive
+            # Readers keep the last good snapshot; the next due check tries again.
+            logger.warning("Odświeżenie rejestru domen w tle nie powiodło się: %s", exc)
+
+    def _load_zone(self, zone: Zone, *, raise_errors: bool = False) -> None:
+        """Parse one zone into ``self._zone_data``; on failure keep its previous data."""
+        started = time.perf_counter()
+        now = time.time()
+        try:
+            with self._open_payload(zone) as (payload, origin):
+                entries, categories, meta = self._parse_payload(payload.rows(), payload.fields, zone)
             if not entries:
-                raise RuntimeError("Pobrany plik gov.json nie zawiera żadnych domen.")
+                raise RuntimeError(f"Źródło strefy {zone.name} nie zawiera żadnych domen.")
+        except Exception as exc:  # pragma: no cover - defensive
+            REGISTRY_LOADS.inc(("domain_registry", "error"))
+            self._zone_errors[zone.name] = str(exc)
+            self._next_refresh[zone.name] = now + min(zone.cache_ttl, ZONE_RETRY_SECONDS)
+            logger.exception("Nie udało się załadować bazy domen strefy %s: %s", zone.name, exc)
+            if raise_errors or (zone.name == ROOT_DOMAIN and zone.name not in self._zone_data):
+                raise RuntimeError(f"Brak danych o domenach {zone.name}") from exc
+            # Keep serving stale data (or go without an extra zone) and expose the error via cache info.
+            return
 
-            self._entries = entries
-            self._lookup = lookup
-            self._categories = categories
-            self._meta = meta
-            self._last_refreshed = time.time()
-            self._last_source = origin
-            self._last_error = None
+        load_seconds = time.perf_counter() - started
+        self._zone_data[zone.name] = ZoneData(entries, categories, {
+            "version": time.time_ns(),
+            "origin": origin,
+            "refreshed_at": now,
+            "ttl_seconds": zone.cache_ttl,
+            "load_seconds": load_seconds,
+            "entries": len(entries),
+            **meta,
+        })
+        self._zone_errors.pop(zone.name, None)
+        self._next_refresh[zone.name] = float("inf") if self.watching(zone.name) else now + zone.cache_ttl
+        REGISTRY_LOADS.inc(("domain_registry", "ok"))
+        REGISTRY_LOAD_SECONDS.observe(load_seconds, ("domain_registry",))
+
+    def _merge_zones(self) -> Tuple[List[Dict], Dict[str, Dict], List[str], Dict[str, Dict[str, Any]]]:
+        entries: List[Dict] = []
+        lookup: Dict[str, Dict] = {}
+        categories: set = set()
+        zones: Dict[str, Dict[str, Any]] = {}
+        for name in self.zones:
+            data = self._zone_data.get(name)
+            if data is None:
+                continue
+            for entry in data.entries:
+                # Zones earlier in the configuration (gov.pl first) win on duplicates.
+                lookup.setdefault(entry["domain"], entry)
+            entries.extend(data.entries)
+            categories.update(data.categories)
+            zones[name] = data.info
+        return entries, lookup, sorted(categories), zones
+
+    def _publish(self) -> RegistrySnapshot:
+        entries, lookup, categories, zones = self._merge_zones()
+        primary = zones.get(ROOT_DOMAIN, {})
+        state = RegistrySnapshot(
+            version=time.time_ns(),
+            entries=entries,
+            lookup=lookup,
+            categories=categories,
+            meta=_snapshot_meta(primary),
+            origin=primary.get("origin"),
+            refreshed_at=min((info["refreshed_at"] for info in zones.values()), default=0.0),
+            load_seconds=sum(info["load_seconds"] for info in zones.values()),
+            zones=zones,
+            zone_names=frozenset(self.zones),
+            expires_at=min(self._next_refresh.values(), default=0.0),
+            views=self.views(entries) if self.views else {},
+            # A list of the (shared) domain strings, so views index it at C speed
+            domain_at=[entry["domain"] for entry in entries].__getitem__,
+        )
+        self._state = state
+        return state
+
+    def _refresh_snapshot(self, *, force: bool = False) -> RegistrySnapshot:
+        """Attach to the newest host-wide snapshot, rebuilding it if stale.
+
+        Only the worker holding the builder lock rebuilds; the others keep
+        serving their current snapshot and attach once the new file is
+        published. A worker without any snapshot waits for the builder.
+        """
+        state = self._state
+        if not force and state.entries and (time.time() - self._snapshot_checked_at) < self.snapshot_check_interval:
+            return state
+
+        if not self._lock.acquire(blocking=force or not state.entries):
+            return state
+        try:
+            if not force and self._state.entries and (time.time() - self._snapshot_checked_at) < self.snapshot_check_interval:
+                return self._state
+            self._snapshot_checked_at = time.time()
+
+            self._attach_if_changed()
+            if not force and self._snapshot_is_fresh():
+                return self._state
+
+            with builder_lock(self.snapshot_path, blocking=self._mapped is None) as acquired:
+                if not acquired:
+                    return self._state
+                # Another worker may have published while we waited for the lock.
+                if self._attach_if_changed() and not force and self._snapshot_is_fresh():
+                    return self._state
+                self._build_snapshot()
+            return self._state
+        finally:
+            self._lock.release()
+
+    def _snapshot_is_fresh(self) -> bool:
+        if self._mapped is None:
+            return False
+        now = time.time()
+        for name, zone in self.zones.items():
+            # Rebuilds of watched zones are driven by the watcher; the TTL only applies to unwatched sources.
+            if self.watching(name):
+                continue
+            info = self._mapped.zones.get(name)
+            refreshed_at = info["refreshed_at"] if info else self._mapped.built_at
+            if now - refreshed_at >= zone.cache_ttl:
+                return False
+        return True
+
+    def _attach_if_changed(self) -> bool:
+        identity = snapshot_identity(self.snapshot_path)
+        if identity is None or (self._mapped and self._mapped.identity == identity):
+            return False
+        try:
+            mapped = MappedSnapshot(self.snapshot_path)
+        except (OSError, ValueError) as exc:
+            logger.warning("Nie udało się podłączyć snapshotu %s: %s", self.snapshot_path, exc)
+            return False
+
+        # The previous mapping is released once in-flight readers drop it.
+        self._mapped = mapped
+        self._state = RegistrySnapshot(
+            version=mapped.version,
+            entries=mapped.entries,
+            lookup=mapped,
+            categories=mapped.categories,
+            meta=mapped.meta,
+            origin=mapped.origin,
+            refreshed_at=min((info["refreshed_at"] for info in mapped.zones.values()), default=mapped.built_at),
+            load_seconds=sum(info["load_seconds"] for info in mapped.zones.values()) if mapped.zones else None,
+            zones=mapped.zones,
+            zone_names=frozenset(self.zones),
+            expires_at=float("inf"),
+            views=mapped.views,
+            domain_at=mapped.domain,
+        )
+        REGISTRY_LOADS.inc(("domain_registry", "attached"))
+        return True
 
-    def cache_info(self) -> Dict[str, Optional[str]]:
+    def _build_snapshot(self, *, raise_errors: bool = False) -> None:
+        """Load every zone and publish the merged index as a new snapshot file."""
+        try:
+            source_digests = {
+                name: file_digest(zone.source_path)
+                for name, zone in self.zones.items()
+                if zone.source_path and zone.source_path.exists()
+            }
+            for zone in self.zones.values():
+                self._load_zone(zone, raise_errors=raise_errors)
+            entries, _, categories, zones = self._merge_zones()
+            primary = zones.get(ROOT_DOMAIN, {})
+            write_snapshot(
+                self.snapshot_path,
+                entries,
+                categories=categories,
+                meta=_snapshot_meta(primary),
+                origin=primary.get("origin"),
+                zones=zones,
+                source_digests=source_digests,
+                views=self.views(entries, shared=True) if self.views else None,
+            )
+        except Exception as exc:  # pragma: no cover - defensive
+            REGISTRY_LOADS.inc(("domain_registry", "error"))
+            logger.exception("Nie udało się zbudować snapshotu domen gov.pl: %s", exc)
+            if self._mapped and not raise_errors:
+                return
+            raise RuntimeError("Brak danych o domenach gov.pl") from exc
+        finally:
+            # Parsed entries are only needed to write the file; workers read the mapping.
+            self._zone_data.clear()
+
+        self._attach_if_changed()
+
+    def cache_info(self, state: Optional[RegistrySnapshot] = None) -> Dict[str, Any]:
         """Return metadata about the current cache state."""
-        expires_at = self._last_refreshed + self.cache_ttl if self._last_refreshed else None
+        state = state or self._state
+        expires_at = state.refreshed_at + self.cache_ttl if state.refreshed_at else None
         return {
-            "last_refreshed": _to_iso(self._last_refreshed),
+            "last_refreshed": _to_iso(state.refreshed_at),
             "expires_at": _to_iso(expires_at),
             "ttl_seconds": self.cache_ttl,
-            "entries_cached": len(self._entries),
-            "last_error": self._last_error,
+            "entries_cached": len(state.entries),
+            "last_load_seconds": state.load_seconds,
+            "last_error": self._zone_errors.get(ROOT_DOMAIN),
+            "snapshot_path": str(self.snapshot_path) if self.snapshot_path else None,
+            "snapshot_version": state.version,
+            "watch_mode": self._watchers[ROOT_DOMAIN].mode if self.watching() else None,
         }
 
+    def zone_info(self, state: Optional[RegistrySnapshot] = None) -> Dict[str, Dict[str, Any]]:
+        """Per-zone source, size and freshness (kept out of cache_info so verify stays O(1) in zones)."""
+        state = state or self._state
+        zones: Dict[str, Dict[str, Any]] = {}
+        for name, zone in self.zones.items():
+            info = state.zones.get(name) or {}
+            refreshed_at = info.get("refreshed_at")
+            watched = self.watching(name)
+            zones[name] = {
+                "entries": info.get("entries", 0),
+                "version": info.get("version"),
+                "origin": info.get("origin"),
+                "last_refreshed": _to_iso(refreshed_at),
+                "expires_at": None if watched or not refreshed_at else _to_iso(refreshed_at + zone.cache_ttl),
+                "ttl_seconds": zone.cache_ttl,
+                "watched": watched,
+                "declared_count": info.get("declared_count"),
+                "data_timestamp": info.get("data_timestamp"),
+                "last_error": self._zone_errors.get(name),
+            }
+        return zones
+
     def verify(self, hostname: str) -> Dict:
         """Return a structured verification payload for a given hostname."""
-        normalized = normalize_hostname(hostname)
+        with span("normalize"):
+            normalized = normalize_hostname(hostname)
         if not normalized:
             raise ValueError("Nieprawidłowy hostname.")
 
-        self.ensure_fresh()
+        with span("registry"):
+            state = self.ensure_fresh()
 
-        is_gov_domain = normalized == ROOT_DOMAIN or normalized.endswith(GOV_SUFFIX)
+        zone: Optional[str] = None
         matched_domain = None
         matched_entry: Optional[Dict] = None
 
-        for candidate in self._candidate_domains(normalized):
-            if candidate in self._lookup:
-                matched_domain = candidate
-                matched_entry = self._lookup[candidate]
-                break
+        with span("lookup"):
+            # One walk over the hostname's suffixes serves every zone.
+            for candidate in self._candidate_domains(normalized):
+                if matched_entry is None:
+                    matched_entry = state.lookup.get(candidate)
+                    if matched_entry is not None:
+                        matched_domain = candidate
+                if candidate in state.zone_names:
+                    zone = candidate
+                    break
+
+        if matched_entry is not None:
+            zone = matched_entry.get("zone") or zone
+        is_gov_domain = zone is not None
 
         confidence = 1.0 if matched_entry and normalized == matched_domain else (0.85 if matched_entry else 0.0)
 
         message = self._build_message(
             normalized=normalized,
             matched_domain=matched_domain,
-            is_gov_domain=is_gov_domain,
+            zone=zone,
             has_match=matched_entry is not None,
+            zone_names=state.zone_names,
         )
 
         advice = self._build_advice(is_gov_domain=is_gov_domain, has_match=matched_entry is not None)
@@ -240,6 +697,7 @@ class DomainRegistry:
             "hostname": hostname,
             "normalized_hostname": normalized,
             "is_gov_domain": is_gov_domain,
+            "zone": zone,
             "is_listed": matched_entry is not None,
             "matched_domain": matched_domain,
             "display_name": matched_entry.get("display_name") if matched_entry else None,
@@ -249,11 +707,12 @@ class DomainRegistry:
             "confidence": confidence,
             "message": message,
             "advice": advice,
-            "cache": self.cache_info(),
+            "snapshot_version": state.version,
+            "cache": self.cache_info(state),
             "source": {
-                "origin": self._last_source,
-                "declared_count": self._meta.get("declared_count"),
-                "data_timestamp": self._meta.get("data_timestamp"),
+                "origin": state.origin,
+                "declared_count": state.meta.get("declared_count"),
+                "data_timestamp": state.meta.get("data_timestamp"),
             },
         }
 
@@ -262,20 +721,23 @@ class DomainRegistry:
         *,
         q: Optional[str] = None,
         category: Optional[str] = None,
+        zone: Optional[str] = None,
         limit: int = 250,
         offset: int = 0,
     ) -> Dict:
         """Return a filtered slice of the dataset."""
-        self.ensure_fresh()
+        state = self.ensure_fresh()
 
         q_lower = q.lower().strip() if q else None
         filtered: List[Dict] = []
 
-        for entry in self._entries:
+        for entry in state.entries:
             if q_lower and q_lower not in entry["domain"] and q_lower not in entry.get("display_name", "").lower():
                 continue
             if category and entry.get("category") != category:
                 continue
+            if zone and entry.get("zone") != zone:
+                continue
             filtered.append(entry)
 
         total = len(filtered)
@@ -289,8 +751,10 @@ class DomainRegistry:
             "total": total,
             "offset": start,
             "limit": max(limit, 0),
-            "categories": self._categories,
-            "cache": self.cache_info(),
+            "categories": state.categories,
+            "zones": sorted(state.zone_names),
+            "snapshot_version": state.version,
+            "cache": self.cache_info(state),
         }
 
     def _public_entry(self, entry: Dict) -> Dict:
@@ -298,90 +762,105 @@ class DomainRegistry:
             "domain": entry["domain"],
             "display_name": entry.get("display_name"),
             "category": entry.get("category"),
+            "zone": entry.get("zone"),
             "last_seen_at": entry.get("last_seen_at"),
             "source_link": entry.get("source_link"),
         }
 
-    def _load_payload(self) -> Tuple[Dict, str]:
-        if self.source_path and self.source_path.exists():
-            with self.source_path.open("r", encoding="utf-8") as handle:
-                return json.load(handle), f"file://{self.source_path}"
+    @contextmanager
+    def _open_payload(self, zone: Zone) -> Iterator[Tuple[StreamedPayload, str]]:
+        if zone.source_path and zone.source_path.exists():
+            with zone.source_path.open("r", encoding="utf-8") as handle:
+                yield StreamedPayload(handle), f"file://{zone.source_path}"
+            return
 
-        if self.remote_url:
-            return self._fetch_remote_payload(), self.remote_url
+        if zone.remote_url:
+            with self._open_remote_payload(zone.remote_url) as handle:
+                yield StreamedPayload(handle), zone.remote_url
+            return
 
+        setting = "GOV_DOMAIN_REMOTE_URL" if zone.name == ROOT_DOMAIN else "źródło strefy w GOV_DOMAIN_EXTRA_ZONES"
         raise FileNotFoundError(
-            f"Nie znaleziono pliku {self.source_path}. "
-            "Ustaw zmienną GOV_DOMAIN_REMOTE_URL aby pobierać dane z API."
+            f"Nie znaleziono pliku {zone.source_path}. "
+            f"Ustaw {setting} aby pobierać dane z API."
         )
 
-    def _fetch_remote_payload(self) -> Dict:
-        if not self.remote_url:
-            raise FileNotFoundError("Brak zdefiniowanego źródła zewnętrznego dla domen gov.pl.")
-
+    @contextmanager
+    def _open_remote_payload(self, url: str) -> Iterator[io.TextIOBase]:
         request = Request(
-            self.remote_url,
+            url,
             headers={"User-Agent": "m-verify-domain-registry/1.0"},
             method="GET",
         )
 
         try:
-            with urlopen(request, timeout=self.remote_timeout) as response:
-                encoding = response.headers.get_content_charset() or "utf-8"
-                payload = response.read().decode(encoding, errors="replace")
-                return json.loads(payload)
+            response = urlopen(request, timeout=self.remote_timeout)
         except (HTTPError, URLError) as exc:
-            raise RuntimeError(f"Nie udało się pobrać danych z {self.remote_url}: {exc}") from exc
+            raise RuntimeError(f"Nie udało się pobrać danych z {url}: {exc}") from exc
+
+        # Body is decoded and parsed chunk by chunk as it arrives from the socket.
+        with response:
+            encoding = response.headers.get_content_charset() or "utf-8"
+            yield io.TextIOWrapper(response, encoding=encoding, errors="replace")
 
     def _parse_payload(
         self,
-        payload: Dict,
-    ) -> Tuple[List[Dict], Dict[str, Dict], List[str], Dict[str, Optional[str]]]:
+        rows: Iterable[Dict],
+        payload: Dict[str, Any],
+        zone: Zone,
+    ) -> Tuple[List[Dict], List[str], Dict[str, Optional[str]]]:
+        """Build the zone's entries from ``rows``; ``payload`` holds the top-level members.
+
+        ``rows`` is consumed before ``payload`` is read, so streamed documents
+        may place ``meta``/``links`` after ``data``.
+        """
         entries: List[Dict] = []
-        lookup: Dict[str, Dict] = {}
+        seen: set = set()
         categories: set = set()
 
-        for row in payload.get("data", []):
+        for row in rows:
             raw_domain = self._extract_domain(row)
             if not raw_domain:
                 continue
 
             normalized = normalize_hostname(raw_domain)
-            if not normalized:
+            if not normalized or normalized in seen:
                 continue
 
             entry = {
                 "domain": normalized,
                 "display_name": raw_domain.strip(),
-                "category": self._infer_category(normalized),
+                "category": self._infer_category(normalized, zone),
+                "zone": zone.name,
                 "last_seen_at": row.get("meta", {}).get("updated_at"),
                 "source_link": row.get("links", {}).get("self"),
             }
 
-            lookup[normalized] = entry
+            seen.add(normalized)
             entries.append(entry)
             categories.add(entry["category"])
 
         entries.sort(key=lambda item: item["domain"])
 
-        if ROOT_DOMAIN not in lookup:
+        if zone.name not in seen:
             root_entry = {
-                "domain": ROOT_DOMAIN,
-                "display_name": "gov.pl",
-                "category": CATEGORY_ROOT,
+                "domain": zone.name,
+                "display_name": zone.name,
+                "category": self._infer_category(zone.name, zone),
+                "zone": zone.name,
                 "last_seen_at": payload.get("meta", {}).get("headers_map", {}).get("col1"),
                 "source_link": payload.get("links", {}).get("self"),
             }
             entries.append(root_entry)
-            lookup[ROOT_DOMAIN] = root_entry
-            categories.add(CATEGORY_ROOT)
+            categories.add(root_entry["category"])
 
         meta = {
             "declared_count": str(payload.get("meta", {}).get("count") or ""),
             "data_timestamp": payload.get("meta", {}).get("headers_map", {}).get("col1"),
+            "server_time": payload.get("meta", {}).get("server_time"),
         }
 
-        return entries, lookup, sorted(categories), meta
+        return entries, sorted(categories), meta
 
     def _extract_domain(self, row: Dict) -> Optional[str]:
         attributes = row.get("attributes") or {}
@@ -389,35 +868,40 @@ class DomainRegistry:
         return (col1.get("val") or col1.get("repr") or "").strip()
 
     def _candidate_domains(self, hostname: str) -> Iterable[str]:
+        """Yield ``hostname`` and its parent domains, longest first (at least two labels)."""
         parts = hostname.split(".")
         for index in range(len(parts) - 1):
-            candidate = ".".join(parts[index:])
-            if candidate == ROOT_DOMAIN or candidate.endswith(GOV_SUFFIX):
-                yield candidate
+            yield ".".join(parts[index:])
 
     def _build_message(
         self,
         *,
         normalized: str,
         matched_domain: Optional[str],
-        is_gov_domain: bool,
+        zone: Optional[str],
         has_match: bool,
+        zone_names: frozenset,
     ) -> str:
-        if not is_gov_domain:
+        if zone is None:
+            if len(zone_names) <= 1:
+                return (
+                    f"Domena {normalized} nie kończy się na {GOV_SUFFIX} – "
+                    "prawdopodobnie nie należy do administracji publicznej."
+                )
             return (
-                f"Domena {normalized} nie kończy się na {GOV_SUFFIX} – "
-                "prawdopodobnie nie należy do administracji publicznej."
+                f"Domena {normalized} nie należy do żadnej z oficjalnych stref "
+                f"({', '.join(sorted(zone_names))}) – prawdopodobnie nie należy do administracji publicznej."
             )
 
         if has_match and matched_domain:
             if normalized == matched_domain:
-                return f"Domena {matched_domain} figuruje w oficjalnym rejestrze gov.pl."
+                return f"Domena {matched_domain} figuruje w oficjalnym rejestrze {zone}."
             return (
                 f"Domena {normalized} korzysta z oficjalnie zarejestrowanej bazy "
-                f"{matched_domain} w strefie gov.pl."
+                f"{matched_domain} w strefie {zone}."
             )
 
-        return f"Nie znaleziono domeny {normalized} w kompendium gov.pl."
+        return f"Nie znaleziono domeny {normalized} w kompendium {zone}."
 
     def _build_advice(self, *, is_gov_domain: bool, has_match: bool) -> List[str]:
         if has_match:
@@ -438,7 +922,10 @@ class DomainRegistry:
             "Porównaj adres z listą domen w kompendium gov.pl.",
         ]
 
-    def _infer_category(self, domain: str) -> str:
+    def _infer_category(self, domain: str, zone: Zone) -> str:
+        if zone.name != ROOT_DOMAIN:
+            return zone.category or f"Strefa {zone.name}"
+
         if domain == ROOT_DOMAIN:
             return CATEGORY_ROOT
 
@@ -0,0 +1,168 @@
+"""Background watcher that reloads a dataset when its file content changes.
+
+Replaces TTL polling for local registry files: a daemon thread waits for
+inotify events on the file's directory (Linux, via libc) or falls back to
+cheap ``stat`` polling, and calls ``on_change(digest)`` only when the file's
+content hash differs from the last one seen. The reload runs on the watcher
+thread, so requests never pay for a re-parse.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import select
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from backend.metrics import REGISTRY_LOADS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCH_ENABLED = os.getenv("GOV_DOMAINS_WATCH", "1") != "0"
+DEFAULT_WATCH_POLL_SECONDS = float(os.getenv("GOV_DOMAINS_WATCH_POLL_SECONDS", "2") or "2")
+DEFAULT_WATCH_DEBOUNCE_SECONDS = 0.2
+
+# IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_INOTIFY_MASK = 0x002 | 0x004 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+
+Fingerprint = Optional[Tuple[int, int, int]]
+
+
+def file_digest(path: Path) -> Optional[str]:
+    """BLAKE2b of the file content, or None if it does not exist."""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as handle:
+            for chunk in iter(lambda: handle.read(1 << 20), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def _fingerprint(path: Path) -> Fingerprint:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _open_inotify(directory: Path) -> Optional[int]:
+    if not sys.platform.startswith("linux"):
+        return None
+    import ctypes
+    import ctypes.util
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        # The directory is watched so atomic replacements (rename over the file) are seen.
+        if libc.inotify_add_watch(fd, os.fsencode(str(directory)), _INOTIFY_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def _drain(fd: int) -> None:
+    try:
+        while os.read(fd, 65536):
+            pass
+    except BlockingIOError:
+        pass
+
+
+class FileWatcher:
+    """Calls ``on_change(digest)`` from a daemon thread whenever ``path`` changes content."""
+
+    def __init__(
+        self,
+        path: Path,
+        on_change: Callable[[Optional[str]], None],
+        *,
+        name: str,
+        poll_interval: float = DEFAULT_WATCH_POLL_SECONDS,
+        use_inotify: bool = True,
+    ) -> None:
+        self.path = Path(path)
+        self.name = name
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.mode: Optional[str] = None
+        self._on_change = on_change
+        self._fingerprint: Fingerprint = None
+        self._digest: Optional[str] = None
+        # Content whose reload failed; not retried until the file changes again.
+        self._failed_digest: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, digest: Optional[str] = None) -> "FileWatcher":
+        """Start watching; ``digest`` is the content hash of the already loaded file, if known."""
+        self._fingerprint = _fingerprint(self.path)
+        self._digest = digest if digest is not None else file_digest(self.path)
+        self._thread = threading.Thread(target=self._run, name=f"watch-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def check(self) -> bool:
+        """Reload if the file content changed since the last check; return True if it did."""
+        fingerprint = _fingerprint(self.path)
+        if fingerprint == self._fingerprint:
+            return False
+
+        digest = file_digest(self.path)
+        if digest == self._digest or (digest is not None and digest == self._failed_digest):
+            # Touched or rewritten with identical (or already rejected) content: nothing to re-parse.
+            self._fingerprint = fingerprint
+            REGISTRY_LOADS.inc((self.name, "unchanged"))
+            return False
+
+        try:
+            self._on_change(digest)
+        except Exception as exc:  # pragma: no cover - defensive
+            # A broken file is parsed once per content, not on every poll; the previous data stays in use.
+            logger.exception("Przeładowanie %s po zmianie pliku nie powiodło się: %s", self.path, exc)
+            self._fingerprint = fingerprint
+            self._failed_digest = digest
+            return False
+        self._fingerprint = fingerprint
+        self._digest = digest
+        self._failed_digest = None
+        return True
+
+    def _run(self) -> None:
+        fd = _open_inotify(self.path.parent) if self.use_inotify else None
+        self.mode = "inotify" if fd is not None else "poll"
+        try:
+            while not self._stop.is_set():
+                if fd is not None:
+                    # poll_interval also bounds how long stop() waits and acts as a stat safety net.
+                    readable, _, _ = select.select([fd], [], [], self.poll_interval)
+                    if readable:
+                        self._stop.wait(DEFAULT_WATCH_DEBOUNCE_SECONDS)
+                        _drain(fd)
+                else:
+                    self._stop.wait(self.poll_interval)
+                if not self._stop.is_set():
+                    self.check()
+        finally:
+            if fd is not None:
+                os.close(fd)
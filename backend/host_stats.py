@@ -0,0 +1,208 @@
+"""Fixed-memory counts and top-k of the hosts seen by verify and the pairing flow.
+
+Exact per-hostname counters grow with every look-alike domain an attacker
+registers. Each stream (``verify_unlisted``, ``pairing_origin``...) instead
+keeps a ring of time buckets; a bucket holds a count-min sketch (conservative
+update) for frequency estimates and a small heavy-hitter candidate table. A
+sliding window query sums the buckets it covers, so memory is bounded by
+``streams x buckets x (width x depth + k)`` regardless of traffic.
+
+Recording is O(depth) with no lock on the common path: increments racing
+between threads may occasionally be lost, which an approximate counter
+tolerates. Only bucket rotation and evicting a heavy-hitter candidate take
+the stream's lock.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_HOST_STATS_ENABLED = os.getenv("MVERIFY_HOST_STATS", "1") != "0"
+DEFAULT_SKETCH_WIDTH = int(os.getenv("MVERIFY_HOST_STATS_WIDTH", "2048") or "2048")
+DEFAULT_SKETCH_DEPTH = int(os.getenv("MVERIFY_HOST_STATS_DEPTH", "4") or "4")
+DEFAULT_TOP_K = int(os.getenv("MVERIFY_HOST_STATS_TOP_K", "50") or "50")
+DEFAULT_BUCKET_SECONDS = int(os.getenv("MVERIFY_HOST_STATS_BUCKET_SECONDS", "300") or "300")
+DEFAULT_BUCKETS = int(os.getenv("MVERIFY_HOST_STATS_BUCKETS", "12") or "12")
+# Token nagłówka X-Mverify-Admin dla endpointów administracyjnych; puste = endpointy wyłączone
+DEFAULT_ADMIN_TOKEN = os.getenv("MVERIFY_ADMIN_TOKEN") or None
+
+_MASK64 = (1 << 64) - 1
+
+
+class CountMinSketch:
+    """Count-min sketch with conservative update; estimates never undercount."""
+
+    __slots__ = ("width", "depth", "counts", "_bits", "_rows")
+
+    def __init__(self, width: int, depth: int) -> None:
+        # Width is rounded up to a power of two so each row takes its own slice of hash bits.
+        self._bits = max(width - 1, 1).bit_length()
+        self.width = 1 << self._bits
+        self.depth = depth
+        self.counts = array("I", bytes(4 * self.width * depth))
+        self._rows = tuple((row * self.width, row * self._bits) for row in range(depth))
+
+    def _cells(self, key_hash: int) -> List[int]:
+        bits = key_hash & _MASK64
+        if self._bits * self.depth > 64:
+            bits |= (hash((key_hash, 1)) & _MASK64) << 64
+        mask = self.width - 1
+        # Independent bit slices per row: two keys share every cell only with probability 1/width**depth.
+        return [offset + ((bits >> shift) & mask) for offset, shift in self._rows]
+
+    def add(self, key_hash: int) -> int:
+        """Count one occurrence and return the new estimate."""
+        counts = self.counts
+        bits = key_hash & _MASK64
+        if self._bits * self.depth > 64:
+            bits |= (hash((key_hash, 1)) & _MASK64) << 64
+        mask = self.width - 1
+        # _cells() inlined: this runs on every recorded hit.
+        cells = []
+        estimate = None
+        for offset, shift in self._rows:
+            cell = offset + ((bits >> shift) & mask)
+            cells.append(cell)
+            value = counts[cell]
+            if estimate is None or value < estimate:
+                estimate = value
+        estimate += 1
+        # Conservative update: only counters below the new estimate move, which limits overcounting.
+        for cell in cells:
+            if counts[cell] < estimate:
+                counts[cell] = estimate
+        return estimate
+
+    def estimate(self, key_hash: int) -> int:
+        counts = self.counts
+        return min([counts[cell] for cell in self._cells(key_hash)])
+
+
+class _Bucket:
+    __slots__ = ("epoch", "sketch", "candidates", "floor", "total")
+
+    def __init__(self, epoch: int, width: int, depth: int) -> None:
+        self.epoch = epoch
+        self.sketch = CountMinSketch(width, depth)
+        # host -> estimate when last seen; at most k entries
+        self.candidates: Dict[str, int] = {}
+        self.floor = 0
+        self.total = 0
+
+
+class HostStream:
+    """Sliding-window frequency estimates and heavy hitters for one kind of event."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        width: int = DEFAULT_SKETCH_WIDTH,
+        depth: int = DEFAULT_SKETCH_DEPTH,
+        k: int = DEFAULT_TOP_K,
+        bucket_seconds: int = DEFAULT_BUCKET_SECONDS,
+        buckets: int = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.width = width
+        self.depth = depth
+        self.k = k
+        self.bucket_seconds = bucket_seconds
+        self._buckets: List[Optional[_Bucket]] = [None] * buckets
+        self._lock = threading.Lock()
+
+    @property
+    def window_seconds(self) -> int:
+        return self.bucket_seconds * len(self._buckets)
+
+    def record(self, host: str, now: Optional[float] = None) -> None:
+        epoch = int((time.time() if now is None else now) // self.bucket_seconds)
+        bucket = self._buckets[epoch % len(self._buckets)]
+        if bucket is None or bucket.epoch != epoch:
+            bucket = self._rotate(epoch)
+        bucket.total += 1
+        estimate = bucket.sketch.add(hash(host))
+
+        candidates = bucket.candidates
+        if host in candidates or len(candidates) < self.k:
+            candidates[host] = estimate
+        elif estimate > bucket.floor:
+            with self._lock:
+                # Replace the weakest candidate; the floor only rises, so this stays rare.
+                weakest = min(candidates, key=candidates.__getitem__)
+                if candidates[weakest] < estimate:
+                    del candidates[weakest]
+                    candidates[host] = estimate
+                    bucket.floor = min(candidates.values())
+
+    def _rotate(self, epoch: int) -> _Bucket:
+        with self._lock:
+            slot = epoch % len(self._buckets)
+            bucket = self._buckets[slot]
+            if bucket is None or bucket.epoch < epoch:
+                bucket = self._buckets[slot] = _Bucket(epoch, self.width, self.depth)
+            return bucket
+
+    def _window(self, window_seconds: Optional[int], now: Optional[float]) -> Tuple[List[_Bucket], Optional[_Bucket], int]:
+        epoch = int((time.time() if now is None else now) // self.bucket_seconds)
+        count = len(self._buckets)
+        if window_seconds is not None:
+            count = max(1, min(count, -(-window_seconds // self.bucket_seconds)))
+        live = [bucket for bucket in self._buckets if bucket is not None and epoch - count < bucket.epoch <= epoch]
+        current = next((bucket for bucket in live if bucket.epoch == epoch), None)
+        return live, current, count
+
+    def estimate(self, host: str, window_seconds: Optional[int] = None, now: Optional[float] = None) -> int:
+        key_hash = hash(host)
+        return sum(bucket.sketch.estimate(key_hash) for bucket in self._window(window_seconds, now)[0])
+
+    def top(self, limit: int = 20, window_seconds: Optional[int] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        """Heavy hitters over the window with their estimated counts and current-bucket counts."""
+        buckets, current, count = self._window(window_seconds, now)
+        hosts = set()
+        for bucket in buckets:
+            hosts.update(list(bucket.candidates))
+
+        rows = []
+        for host in hosts:
+            key_hash = hash(host)
+            rows.append({
+                "host": host,
+                "count": sum(bucket.sketch.estimate(key_hash) for bucket in buckets),
+                "recent": current.sketch.estimate(key_hash) if current is not None else 0,
+            })
+        rows.sort(key=lambda row: (-row["count"], row["host"]))
+
+        return {
+            "window_seconds": count * self.bucket_seconds,
+            "bucket_seconds": self.bucket_seconds,
+            "total": sum(bucket.total for bucket in buckets),
+            "top": rows[:limit],
+        }
+
+    def memory_bytes(self) -> int:
+        return sum(bucket.sketch.counts.buffer_info()[1] * 4 for bucket in self._buckets if bucket is not None)
+
+
+class HostStats:
+    """Named host streams sharing one configuration."""
+
+    def __init__(self, streams: Tuple[str, ...], *, enabled: bool = DEFAULT_HOST_STATS_ENABLED, **config: Any) -> None:
+        self.enabled = enabled
+        self.streams: Dict[str, HostStream] = {name: HostStream(name, **config) for name in streams}
+
+    def record(self, stream: str, host: Optional[str]) -> None:
+        if self.enabled and host:
+            # Hostnames are at most 253 characters; longer input would only bloat the candidate tables.
+            self.streams[stream].record(host[:253])
+
+    def report(self, *, stream: Optional[str] = None, limit: int = 20, window_seconds: Optional[int] = None) -> Dict[str, Any]:
+        names = [stream] if stream else list(self.streams)
+        return {
+            "streams": {name: self.streams[name].top(limit, window_seconds) for name in names},
+            "memory_bytes": sum(item.memory_bytes() for item in self.streams.values()),
+        }
@@ -0,0 +1,252 @@
+"""Storage for the Items API: an id index, keyset pagination and bulk operations.
+
+Both implementations share the ``ItemStore`` interface and hand out items as
+``{"id", "name", "description"}`` dicts. Ids grow monotonically and are never
+reused, so "items after id N" is a stable cursor: a page costs O(log n + limit)
+no matter how deep into the collection it starts, and inserts or deletes
+between requests never shift or repeat items the way ``offset`` would.
+
+``MemoryItemStore`` keeps a dict for id lookups and an append-only sorted
+``array('q')`` of ids for seeking; deletes leave tombstones in the array that
+are compacted once they outnumber the live items or a page has to skip a long
+run of them. ``SQLiteItemStore`` (chosen with ``MVERIFY_ITEMS_DB``) relies on
+the ``INTEGER PRIMARY KEY`` B-tree for the same operations.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Ścieżka do bazy SQLite; puste = elementy tylko w pamięci procesu
+DEFAULT_ITEMS_DB = os.getenv("MVERIFY_ITEMS_DB") or None
+DEFAULT_ITEMS_PAGE_SIZE = int(os.getenv("MVERIFY_ITEMS_PAGE_SIZE", "100") or "100")
+DEFAULT_ITEMS_MAX_PAGE_SIZE = int(os.getenv("MVERIFY_ITEMS_MAX_PAGE_SIZE", "1000") or "1000")
+# Cap for a listing without limit and cursor (clients from before pagination expect every item)
+DEFAULT_ITEMS_UNPAGED_MAX = int(os.getenv("MVERIFY_ITEMS_UNPAGED_MAX", "100000") or "100000")
+DEFAULT_ITEMS_BULK_MAX = int(os.getenv("MVERIFY_ITEMS_BULK_MAX", "1000") or "1000")
+
+# Tombstones are compacted only past this count, so small stores never pay for it.
+COMPACT_MIN_TOMBSTONES = 1024
+# SQLite's default limit on bound parameters is 999 on older builds.
+SQLITE_MAX_PARAMS = 900
+
+Item = Dict[str, object]
+Page = Tuple[List[Item], Optional[int]]
+
+
+def encode_cursor(after_id: Optional[int]) -> Optional[str]:
+    return None if after_id is None else str(after_id)
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Id the next page starts after; raises ValueError for a malformed cursor."""
+    if not cursor:
+        return 0
+    after_id = int(cursor)
+    if after_id < 0:
+        raise ValueError("negative cursor")
+    return after_id
+
+
+class ItemStore(ABC):
+    """Interface shared by the in-memory and SQLite item stores.
+
+    Methods block (SQLite does file I/O under a lock), so callers on the event
+    loop must run them in a worker thread.
+    """
+
+    @abstractmethod
+    def get(self, item_id: int) -> Optional[Item]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def page(self, after_id: int = 0, limit: int = DEFAULT_ITEMS_PAGE_SIZE) -> Page:
+        """Up to ``limit`` items with ids above ``after_id`` and the id to continue after, if any remain."""
+        raise NotImplementedError
+
+    def create(self, name: str, description: Optional[str]) -> Item:
+        return self.create_many([(name, description)])[0]
+
+    @abstractmethod
+    def create_many(self, entries: Sequence[Tuple[str, Optional[str]]]) -> List[Item]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, item_id: int, name: str, description: Optional[str]) -> Optional[Item]:
+        raise NotImplementedError
+
+    def delete(self, item_id: int) -> Optional[Item]:
+        deleted = self.delete_many([item_id])
+        return deleted[0] if deleted else None
+
+    @abstractmethod
+    def delete_many(self, item_ids: Iterable[int]) -> List[Item]:
+        """Delete the listed items; ids that do not exist are skipped."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryItemStore(ItemStore):
+    """Items held in the process: dict by id plus a sorted id array for pagination."""
+
+    def __init__(self) -> None:
+        self._items: Dict[int, Item] = {}
+        # Sorted because ids are only ever appended in increasing order; may contain deleted ids.
+        self._ids = array("q")
+        self._tombstones = 0
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, item_id: int) -> Optional[Item]:
+        return self._items.get(item_id)
+
+    def page(self, after_id: int = 0, limit: int = DEFAULT_ITEMS_PAGE_SIZE) -> Page:
+        items, ids = self._items, self._ids
+        page: List[Item] = []
+        position = bisect_right(ids, after_id)
+        end = len(ids)
+        skipped = 0
+        next_after = None
+        while position < end:
+            item = items.get(ids[position])
+            position += 1
+            if item is None:
+                skipped += 1
+                continue
+            if len(page) == limit:
+                # One more live item exists, so the client gets a cursor for the next page.
+                next_after = page[-1]["id"]
+                break
+            page.append(item)
+        if skipped > COMPACT_MIN_TOMBSTONES:
+            # A run of deletes this page had to walk over; later pages should not pay for it again.
+            with self._lock:
+                self._compact()
+        return page, next_after
+
+    def create_many(self, entries: Sequence[Tuple[str, Optional[str]]]) -> List[Item]:
+        created = []
+        with self._lock:
+            for name, description in entries:
+                item = {"id": self._next_id, "name": name, "description": description}
+                self._items[self._next_id] = item
+                self._ids.append(self._next_id)
+                self._next_id += 1
+                created.append(item)
+        return created
+
+    def update(self, item_id: int, name: str, description: Optional[str]) -> Optional[Item]:
+        with self._lock:
+            if item_id not in self._items:
+                return None
+            # A new dict rather than mutation, so pages already handed out stay consistent.
+            item = self._items[item_id] = {"id": item_id, "name": name, "description": description}
+        return item
+
+    def delete_many(self, item_ids: Iterable[int]) -> List[Item]:
+        deleted = []
+        with self._lock:
+            for item_id in item_ids:
+                item = self._items.pop(item_id, None)
+                if item is not None:
+                    deleted.append(item)
+            self._tombstones += len(deleted)
+            if self._tombstones > COMPACT_MIN_TOMBSTONES and self._tombstones > len(self._items):
+                self._compact()
+        return deleted
+
+    def _compact(self) -> None:
+        # O(live) once per O(live) deletes: amortized O(1) per delete, and pages skip few tombstones.
+        items = self._items
+        self._ids = array("q", [item_id for item_id in self._ids if item_id in items])
+        self._tombstones = 0
+
+
+class SQLiteItemStore(ItemStore):
+    """Items in a SQLite file; lookups and pages use the primary key index."""
+
+    def __init__(self, path: Path) -> None:
+        import sqlite3
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the threadpool workers, serialized by the lock.
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            # AUTOINCREMENT keeps ids of deleted items from being reused, which cursors rely on.
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, description TEXT)"
+            )
+
+    @staticmethod
+    def _row(row: Tuple[int, str, Optional[str]]) -> Item:
+        return {"id": row[0], "name": row[1], "description": row[2]}
+
+    def get(self, item_id: int) -> Optional[Item]:
+        with self._lock:
+            row = self._db.execute("SELECT id, name, description FROM items WHERE id = ?", (item_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def page(self, after_id: int = 0, limit: int = DEFAULT_ITEMS_PAGE_SIZE) -> Page:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, name, description FROM items WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit + 1),
+            ).fetchall()
+        page = [self._row(row) for row in rows[:limit]]
+        return page, (page[-1]["id"] if len(rows) > limit else None)
+
+    def create_many(self, entries: Sequence[Tuple[str, Optional[str]]]) -> List[Item]:
+        created = []
+        with self._lock, self._db:
+            # One transaction for the whole batch: a single commit instead of one per item.
+            for name, description in entries:
+                cursor = self._db.execute("INSERT INTO items (name, description) VALUES (?, ?)", (name, description))
+                created.append({"id": cursor.lastrowid, "name": name, "description": description})
+        return created
+
+    def update(self, item_id: int, name: str, description: Optional[str]) -> Optional[Item]:
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE items SET name = ?, description = ? WHERE id = ?", (name, description, item_id)
+            )
+        if cursor.rowcount == 0:
+            return None
+        return {"id": item_id, "name": name, "description": description}
+
+    def delete_many(self, item_ids: Iterable[int]) -> List[Item]:
+        ids = list(dict.fromkeys(item_ids))
+        deleted: List[Item] = []
+        with self._lock, self._db:
+            for start in range(0, len(ids), SQLITE_MAX_PARAMS):
+                chunk = ids[start:start + SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT id, name, description FROM items WHERE id IN ({placeholders}) ORDER BY id", chunk
+                ).fetchall()
+                self._db.execute(f"DELETE FROM items WHERE id IN ({placeholders})", chunk)
+                deleted.extend(self._row(row) for row in rows)
+        return deleted
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def open_item_store(path: Optional[str] = DEFAULT_ITEMS_DB) -> ItemStore:
+    return SQLiteItemStore(Path(path)) if path else MemoryItemStore()
@@ -1,23 +1,115 @@
 from fastapi import FastAPI, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, Response, JSONResponse
+from fastapi.responses import HTMLResponse, Response, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, validator
-from typing import List, Optional, Dict, Set, Any
-import uvicorn
+from typing import List, Optional, Dict, Any
 from pathlib import Path
+import asyncio
+import sys
 import secrets
+import threading
 import time
-import qrcode
 import io
 import re
-import json
 from datetime import datetime, timedelta
 from functools import lru_cache
+from itertools import repeat
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
+# Pozwala importować moduły pakietu `backend` także przy uruchomieniu `python main.py`
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.audit_log import DEFAULT_AUDIT_LOG_PATH, AuditLog, token_ref
+from backend.autocomplete import PrefixIndex, popularity_from_report
+from backend.blocklist import DEFAULT_BLOCKLIST_NAME, DEFAULT_BLOCKLIST_SOURCE, Blocklist
+from backend.compendium import (
+    ALL_DOMAINS,
+    COMPENDIUM_CATEGORIES,
+    DOMAIN_CATEGORIES,
+    DomainCategories,
+    DomainView,
+    compendium_category,
+    compendium_views,
+    is_listed_entry,
+    stored_labels,
+)
+from backend.dataset_export import (
+    EXPORT_FORMATS,
+    ExportBody,
+    build_export,
+    etag_matches,
+    export_etag,
+    parse_range,
+    snapshot_version,
+)
+from backend.domain_registry import (
+    ROOT_DOMAIN,
+    ZONE_RETRY_SECONDS,
+    DomainRegistry,
+    RegistrySnapshot,
+    is_valid_hostname,
+    normalize_hostname as parse_hostname,
+    official_zones,
+)
+from backend.host_stats import DEFAULT_ADMIN_TOKEN, HostStats
+from backend.item_store import (
+    DEFAULT_ITEMS_BULK_MAX,
+    DEFAULT_ITEMS_MAX_PAGE_SIZE,
+    DEFAULT_ITEMS_PAGE_SIZE,
+    DEFAULT_ITEMS_UNPAGED_MAX,
+    ItemStore,
+    decode_cursor,
+    encode_cursor,
+    open_item_store,
+)
+from backend.metrics import (
+    CLEANUP_SECONDS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    DEFAULT_METRICS_PUBLIC,
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    QR_RENDERS,
+    RATE_LIMIT_REJECTIONS,
+    REGISTRY as METRICS_REGISTRY,
+    SESSION_TABLE_REMOVALS,
+    SESSION_TABLE_SIZE,
+    MetricsMiddleware,
+)
+from backend.registry_history import RegistryHistory
+from backend.profiling import (
+    DEFAULT_PROFILE_DIR,
+    DEFAULT_PROFILE_SAMPLE_RATE,
+    DEFAULT_PROFILE_TOKEN,
+    ProfilingMiddleware,
+    profiling_enabled,
+)
+from backend.serialization import JSONBytesResponse, dumps, dumps_bool
+from backend.sessions import (
+    ADMISSION_TRUST_FULL,
+    CONFIRM_ALREADY_CONFIRMED,
+    CONFIRM_EXPIRED,
+    CONFIRM_INVALID_NONCE,
+    CONFIRM_NONCE_USED,
+    CONFIRM_NOT_FOUND,
+    DEFAULT_TRUSTED_PROXIES,
+    PAIRING_CONFIRMED,
+    PAIRING_EXPIRED,
+    PAIRING_PENDING,
+    AdmissionRejected,
+    ConfirmRejected,
+    PairingSession,
+    PairingSessionTable,
+    TrustSessionTable,
+    admission_client,
+    parse_networks,
+)
+from backend.timing import DEFAULT_SERVER_TIMING_ENABLED, ServerTimingMiddleware, span
+
 app = FastAPI(
     title="Gov API",
     description="API dla frontendu i aplikacji mobilnej",
@@ -45,10 +137,24 @@ def get_client_ip(request: Request) -> str:
     # Ostateczny fallback
     return "unknown"
 
+# Proxy z MVERIFY_TRUSTED_PROXIES - tylko ich X-Forwarded-For wskazuje klienta przy limitach sesji
+TRUSTED_PROXIES = parse_networks(DEFAULT_TRUSTED_PROXIES)
+
+def get_admission_client(request: Request) -> str:
+    """Klient, na którego liczone są sesje - adres połączenia, X-Forwarded-For tylko od zaufanego proxy"""
+    # get_client_ip ufa nagłówkom, które klient ustawia sam - zmieniając je, ominąłby limit sesji na klienta
+    return admission_client(request.client.host if request.client else None, request.headers.get("X-Forwarded-For"), TRUSTED_PROXIES)
+
 # Rate Limiting - ochrona przed nadużyciami
 limiter = Limiter(key_func=get_client_ip)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> Response:
+    """Zlicza odrzucenia w metrykach i deleguje do domyślnego handlera slowapi"""
+    RATE_LIMIT_REJECTIONS.inc(("request_rate",))
+    return _rate_limit_exceeded_handler(request, exc)
+
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
 # CORS - pozwala na żądania z frontendu i aplikacji mobilnej
 app.add_middleware(
@@ -59,6 +165,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metryki HTTP (liczniki i histogramy opóźnień per szablon ścieżki) - dostępne pod /metrics
+app.add_middleware(MetricsMiddleware, requests=HTTP_REQUESTS, latency=HTTP_LATENCY)
+
+# Nagłówki Server-Timing z podziałem na fazy (normalizacja, rejestr, wyszukiwanie, QR...) - tylko z MVERIFY_SERVER_TIMING=1
+if DEFAULT_SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
+# Profilowanie wybranych żądań (nagłówek X-Mverify-Profile lub próbkowanie) - tylko gdy włączone
+if profiling_enabled():
+    app.add_middleware(
+        ProfilingMiddleware,
+        output_dir=DEFAULT_PROFILE_DIR,
+        token=DEFAULT_PROFILE_TOKEN,
+        sample_rate=DEFAULT_PROFILE_SAMPLE_RATE,
+    )
+
 # Ścieżki do katalogów
 BASE_DIR = Path(__file__).resolve().parent.parent
 # W produkcji użyj zbudowanych plików z Vite, w dev użyj źródłowych
@@ -66,6 +188,9 @@ DIST_DIR = BASE_DIR / "dist"
 FRONTEND_DIR = DIST_DIR if DIST_DIR.exists() else BASE_DIR
 ASSETS_DIR = BASE_DIR / "assets"
 
+# Maksymalna liczba hostów w jednym zapytaniu /api/domain/verify-batch (linki jednej strony)
+VERIFY_BATCH_MAX = 500
+
 # Modele danych
 class Item(BaseModel):
     id: Optional[int] = None
@@ -76,6 +201,15 @@ class ItemCreate(BaseModel):
     name: str
     description: Optional[str] = None
 
+class ItemBulkDelete(BaseModel):
+    ids: List[int]
+
+    @validator("ids")
+    def validate_ids(cls, v):
+        if len(v) > DEFAULT_ITEMS_BULK_MAX:
+            raise ValueError(f"At most {DEFAULT_ITEMS_BULK_MAX} ids per request")
+        return v
+
 class PairingConfirm(BaseModel):
     token: Optional[str] = None
     pin: Optional[str] = None
@@ -117,6 +251,17 @@ class PairingConfirm(BaseModel):
             v = re.sub(r'[<>"\']', '', v)
         return v
 
+class VerifyBatchRequest(BaseModel):
+    hosts: List[str]
+
+    @validator("hosts")
+    def validate_hosts(cls, v):
+        if len(v) > VERIFY_BATCH_MAX:
+            raise ValueError(f"At most {VERIFY_BATCH_MAX} hosts per request")
+        if any(len(host) > 2048 for host in v):
+            raise ValueError("Host too long")
+        return v
+
 class TrustStartRequest(BaseModel):
     hostname: str
 
@@ -127,14 +272,39 @@ class TrustStartRequest(BaseModel):
             raise ValueError("Hostname jest wymagany.")
         return host
 
-# Przykładowa baza danych w pamięci (w produkcji użyj prawdziwej bazy danych)
-items_db = []
-next_id = 1
+# Magazyn elementów: w pamięci albo SQLite (MVERIFY_ITEMS_DB), indeks po id i paginacja kursorem
+# Handlery działają w puli wątków - lock, żeby dwa pierwsze równoległe żądania nie otworzyły dwóch magazynów
+_item_store: Optional[ItemStore] = None
+_item_store_lock = threading.Lock()
+
+def get_item_store() -> ItemStore:
+    global _item_store
+    if _item_store is None:
+        with _item_store_lock:
+            if _item_store is None:
+                _item_store = open_item_store()
+    return _item_store
+
+# Dziennik audytu (potwierdzenia, wygaśnięcia, odrzucenia) - handler tylko dopisuje do kolejki
+@lru_cache(maxsize=1)
+def get_audit_log() -> Optional[AuditLog]:
+    """Dziennik audytu z wątkiem zapisującym w tle; None gdy MVERIFY_AUDIT_LOG_PATH nie jest ustawione"""
+    if not DEFAULT_AUDIT_LOG_PATH:
+        return None
+    return AuditLog(DEFAULT_AUDIT_LOG_PATH).start()
+
+def audit(event: str, **fields: Any) -> None:
+    log = get_audit_log()
+    if log is not None:
+        log.record(event, **fields)
+
+def audit_pairing_expired(session: PairingSession) -> None:
+    audit("pairing_expired", token_ref=token_ref(session.token), expires_at=session.expires_at)
 
 # System parowania QR code
-pairing_sessions: Dict[str, dict] = {}  # token -> session data
-pin_to_token: Dict[str, str] = {}  # pin -> token
 PAIRING_TIMEOUT_SECONDS = 300  # 5 minut
+# token -> sesja (obiekty ze __slots__), z indeksem PIN -> sesja
+pairing_sessions = PairingSessionTable(timeout_seconds=PAIRING_TIMEOUT_SECONDS, on_expire=audit_pairing_expired)
 
 # Mechanizm trusted image
 TRUST_COOKIE_NAME = "gov_trust_token"
@@ -143,7 +313,15 @@ TRUST_SESSION_AUTO_APPROVE_SECONDS = 5
 TRUST_SESSION_TTL_SECONDS = 600
 TRUST_TOKEN_TTL_SECONDS = 60 * 60 * 24 * 365
 trust_tokens: Dict[str, dict] = {}
-trust_sessions: Dict[str, dict] = {}
+# Ograniczona tabela sesji (limit globalny + limit na klienta), wygasanie w kolejności utworzenia
+trust_sessions = TrustSessionTable(ttl_seconds=TRUST_SESSION_TTL_SECONDS)
+
+# Rozmiary tabel w pamięci odczytywane przy każdym scrapie /metrics
+SESSION_TABLE_SIZE.track(("pairing_sessions",), lambda: len(pairing_sessions))
+SESSION_TABLE_SIZE.track(("pin_to_token",), lambda: pairing_sessions.pin_count())
+SESSION_TABLE_SIZE.track(("trust_sessions",), lambda: len(trust_sessions))
+SESSION_TABLE_SIZE.track(("trust_tokens",), lambda: len(trust_tokens))
+SESSION_TABLE_REMOVALS.track(("trust_sessions", "expired"), lambda: trust_sessions.expired)
 
 def normalize_hostname(hostname: str) -> str:
     host = (hostname or "").strip().lower()
@@ -153,140 +331,275 @@ def normalize_hostname(hostname: str) -> str:
     return host
 
 
-def is_allowed_trust_hostname(hostname: str) -> bool:
+# Przybliżone liczniki i top-k hostów w przesuwnym oknie (stała pamięć, bez bazy danych)
+host_stats = HostStats((
+    "verify_official",
+    "verify_unlisted",
+    "verify_blocklisted",
+    "trust_start",
+    "trust_rejected",
+    "pairing_origin",
+))
+
+
+# Oficjalne strefy z konfiguracji rejestru (gov.pl + GOV_DOMAIN_EXTRA_ZONES)
+TRUST_ZONES = official_zones()
+# Do komunikatów: ".gov.pl" albo ".gov.pl, .mil.pl, ..."
+TRUST_ZONES_LABEL = ", ".join(f".{zone}" for zone in TRUST_ZONES)
+
+
+def is_listed_host(host: str, lookup: Any = None) -> bool:
+    """Host wpisany do rejestru albo subdomena wpisanej domeny (np. www.mf.gov.pl).
+
+    Sam sufiks strefy nie wystarcza - strefa może obejmować dowolne nazwy (np. skonfigurowane "pl"),
+    więc poszukiwanie domeny nadrzędnej kończy się przed nazwą strefy.
+    """
+    if not host:
+        return False
+    if lookup is None:
+        lookup = load_gov_domains()["lookup"]
+    labels = host.removeprefix("www.").split(".")
+    for index in range(len(labels) - 1):
+        candidate = ".".join(labels[index:])
+        if index and candidate in TRUST_ZONES:
+            return False
+        if is_listed_entry(lookup.get(candidate)):
+            return True
+    return False
+
+
+def is_allowed_trust_hostname(hostname: str, lookup: Any = None) -> bool:
     if not hostname:
         return False
-    return hostname.endswith(".gov.pl") or hostname in {"localhost", "127.0.0.1"}
+    return hostname in {"localhost", "127.0.0.1"} or is_listed_host(hostname, lookup)
 
 
-def ensure_trust_hostname(hostname: str) -> str:
+def ensure_trust_hostname(hostname: str, lookup: Any = None) -> str:
     host = normalize_hostname(hostname)
-    if not is_allowed_trust_hostname(host):
-        raise HTTPException(status_code=400, detail="Obsługujemy wyłącznie domeny gov.pl")
+    if not is_allowed_trust_hostname(host, lookup):
+        host_stats.record("trust_rejected", host)
+        raise HTTPException(status_code=400, detail=f"Obsługujemy wyłącznie domeny z rejestru {TRUST_ZONES_LABEL}")
     return host
 
 
 def cleanup_trust_tokens() -> None:
     if not trust_tokens:
         return
-    now = datetime.utcnow()
-    expired_tokens = [
-        token for token, payload in trust_tokens.items()
-        if payload.get("expires_at") and payload["expires_at"] < now
-    ]
-    for token in expired_tokens:
+    with CLEANUP_SECONDS.time(("trust_tokens",)), span("cleanup"):
+        now = datetime.utcnow()
+        expired_tokens = [
+            token for token, payload in trust_tokens.items()
+            if payload.get("expires_at") and payload["expires_at"] < now
+        ]
+        for token in expired_tokens:
+            trust_tokens.pop(token, None)
+
+
+def get_trust_token_payload(request: Request) -> Optional[dict]:
+    """Ważny token zaufania z ciasteczka żądania (wygasły jest usuwany) albo None"""
+    token = request.cookies.get(TRUST_COOKIE_NAME)
+    if not token:
+        return None
+
+    token_payload = trust_tokens.get(token)
+    if not token_payload:
+        return None
+
+    expires_at = token_payload.get("expires_at")
+    if expires_at and expires_at < datetime.utcnow():
         trust_tokens.pop(token, None)
+        return None
+    return token_payload
 
 
 def cleanup_trust_sessions() -> None:
-    if not trust_sessions:
-        return
-    now = datetime.utcnow()
-    expired_sessions = [
-        session_id
-        for session_id, payload in trust_sessions.items()
-        if payload.get("created_at") and now - payload["created_at"] > timedelta(seconds=TRUST_SESSION_TTL_SECONDS)
-    ]
-    for session_id in expired_sessions:
-        trust_sessions.pop(session_id, None)
+    # Usuwa tylko wygasły początek tabeli - bez skanowania wszystkich sesji
+    with CLEANUP_SECONDS.time(("trust_sessions",)), span("cleanup"):
+        trust_sessions.expire()
 
 
 def isoformat_now() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
 # System weryfikacji domen .gov.pl
+# Dane pochodzą z DomainRegistry: z GOV_DOMAIN_SNAPSHOT_PATH gov.json parsuje jeden proces na hosta,
+# a workery czytają wspólny snapshot (mmap) - razem z posortowanymi listami kompendium i indeksem podpowiedzi;
+# bez niego rejestr ładuje i obserwuje plik w procesie
 GOV_DOMAINS_CACHE: Optional[Dict[str, Any]] = None
-GOV_DOMAINS_SET: Optional[Set[str]] = None
-GOV_DOMAINS_LAST_LOADED: Optional[float] = None
-GOV_DOMAINS_CACHE_TTL = 3600  # 1 godzina
+# Wersja snapshotu rejestru, z której zbudowano GOV_DOMAINS_CACHE
+GOV_DOMAINS_VERSION: Optional[int] = None
+# Po nieudanym pierwszym ładowaniu (brak gov.json) kolejna próba najwcześniej po ZONE_RETRY_SECONDS
+_gov_domains_retry_at = 0.0
+_gov_domains_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def get_domain_registry() -> DomainRegistry:
+    """Rejestr tworzony przy pierwszym użyciu - start aplikacji nie parsuje gov.json"""
+    return DomainRegistry(ASSETS_DIR / "gov.json", views=compendium_views)
+
+def _empty_gov_domains() -> Dict[str, Any]:
+    return {
+        "domains": [],
+        "categories": {name: [] for name in COMPENDIUM_CATEGORIES},
+        "total": 0,
+        "last_updated": None,
+        "lookup": {},
+        "domain_categories": DomainCategories([], []),
+        "prefix_labels": None
+    }
+
+def _build_gov_domains(state: RegistrySnapshot) -> Dict[str, Any]:
+    """Struktura kompendium z jednego snapshotu rejestru (domeny posortowane, podział na kategorie)"""
+    # Widoki to tablice numerów wpisów (przy snapshocie mmap w pliku) - domeny dekodowane dopiero przy odczycie
+    domains = DomainView(state.domain_at, state.views[ALL_DOMAINS])
+    return {
+        "domains": domains,
+        "categories": {name: DomainView(state.domain_at, state.views[name]) for name in COMPENDIUM_CATEGORIES},
+        "total": len(domains),
+        "last_updated": state.meta.get("server_time"),
+        # Wyszukiwanie pojedynczych domen idzie do rejestru (dict albo wspólny snapshot mmap)
+        "lookup": state.lookup,
+        # domena -> kategoria z zapisanych kodów kategorii (bez słownika na cały rejestr)
+        "domain_categories": DomainCategories(domains, state.views[DOMAIN_CATEGORIES]),
+        # Indeks podpowiedzi zapisany w snapshocie (None: budowany przy pierwszym użyciu)
+        "prefix_labels": stored_labels(state.views)
+    }
 
 def load_gov_domains() -> Dict[str, Any]:
-    """Ładuje domeny z pliku gov.json i zwraca przetworzoną strukturę"""
-    global GOV_DOMAINS_CACHE, GOV_DOMAINS_SET, GOV_DOMAINS_LAST_LOADED
-    
-    current_time = time.time()
-    
-    # Sprawdź cache
-    if (GOV_DOMAINS_CACHE is not None and 
-        GOV_DOMAINS_LAST_LOADED is not None and
-        current_time - GOV_DOMAINS_LAST_LOADED < GOV_DOMAINS_CACHE_TTL):
+    """Zwraca strukturę kompendium dla bieżącego snapshotu rejestru domen"""
+    global GOV_DOMAINS_CACHE, GOV_DOMAINS_VERSION, _gov_domains_retry_at
+    if GOV_DOMAINS_CACHE is not None and GOV_DOMAINS_VERSION is None and time.time() < _gov_domains_retry_at:
         return GOV_DOMAINS_CACHE
-    
-    gov_json_path = ASSETS_DIR / "gov.json"
-    if not gov_json_path.exists():
-        # Fallback - zwróć pustą strukturę
-        empty_structure = {
-            "domains": [],
-            "categories": {},
-            "total": 0,
-            "last_updated": None
-        }
-        GOV_DOMAINS_CACHE = empty_structure
-        GOV_DOMAINS_SET = set()
-        GOV_DOMAINS_LAST_LOADED = current_time
-        return empty_structure
-    
     try:
-        with open(gov_json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        domains = []
-        domains_set = set()
-        categories = {
-            "ministerstwa": [],
-            "urzedy": [],
-            "serwisy": [],
-            "inne": []
-        }
-        
-        # Parsuj domeny z struktury JSON API
-        for item in data.get("data", []):
-            domain = item.get("attributes", {}).get("col1", {}).get("val")
-            if domain and isinstance(domain, str) and domain.endswith(".gov.pl"):
-                domain_lower = domain.lower().strip()
-                if domain_lower:
-                    domains.append(domain_lower)
-                    domains_set.add(domain_lower)
-                    
-                    # Kategoryzacja na podstawie domeny
-                    if any(keyword in domain_lower for keyword in ["ministerstwo", "msp", "mk", "mz", "msw", "mkidn"]):
-                        categories["ministerstwa"].append(domain_lower)
-                    elif any(keyword in domain_lower for keyword in [".sr.", ".uw.", ".um.", ".gmina"]):
-                        categories["urzedy"].append(domain_lower)
-                    elif any(keyword in domain_lower for keyword in ["epuap", "obywatel", "pacjent", "edukacja"]):
-                        categories["serwisy"].append(domain_lower)
-                    else:
-                        categories["inne"].append(domain_lower)
-        
-        # Sortuj alfabetycznie
-        domains.sort()
-        for category in categories.values():
-            category.sort()
-        
-        structure = {
-            "domains": domains,
-            "categories": categories,
-            "total": len(domains),
-            "last_updated": data.get("meta", {}).get("server_time")
-        }
-        
-        GOV_DOMAINS_CACHE = structure
-        GOV_DOMAINS_SET = domains_set
-        GOV_DOMAINS_LAST_LOADED = current_time
-        
-        return structure
-    except Exception as e:
-        print(f"Błąd podczas ładowania domen z gov.json: {e}")
-        empty_structure = {
-            "domains": [],
-            "categories": {},
-            "total": 0,
-            "last_updated": None
-        }
-        GOV_DOMAINS_CACHE = empty_structure
-        GOV_DOMAINS_SET = set()
-        GOV_DOMAINS_LAST_LOADED = current_time
-        return empty_structure
+        # Tanie, gdy dane są świeże: jedno porównanie czasu (obserwowany plik przeładowuje się w tle)
+        state = get_domain_registry().ensure_fresh()
+    except RuntimeError as exc:
+        # Brak gov.json i GOV_DOMAIN_REMOTE_URL - pusta lista, jak dotychczas
+        print(f"Błąd podczas ładowania domen z gov.json: {exc}")
+        GOV_DOMAINS_CACHE, GOV_DOMAINS_VERSION = _empty_gov_domains(), None
+        _gov_domains_retry_at = time.time() + ZONE_RETRY_SECONDS
+        return GOV_DOMAINS_CACHE
+
+    cached = GOV_DOMAINS_CACHE
+    if cached is not None and GOV_DOMAINS_VERSION == state.version:
+        return cached
+    with _gov_domains_lock:
+        if GOV_DOMAINS_CACHE is None or GOV_DOMAINS_VERSION != state.version:
+            GOV_DOMAINS_CACHE = _build_gov_domains(state)
+            GOV_DOMAINS_VERSION = state.version
+        return GOV_DOMAINS_CACHE
+
+async def current_dataset() -> "DatasetFragments":
+    """Fragmenty bieżącego snapshotu bez blokowania pętli zdarzeń.
+
+    Po udanym załadowaniu load_gov_domains() tylko porównuje wersję (odświeżanie rejestru idzie w tle);
+    pierwsze ładowanie, ponowne próby po błędzie i budowa fragmentów nowego snapshotu idą do puli wątków.
+    """
+    fragments = _dataset_fragments
+    if fragments is not None and GOV_DOMAINS_VERSION is not None:
+        domains_data = load_gov_domains()
+        if fragments.source is domains_data:
+            return fragments
+    return await asyncio.get_running_loop().run_in_executor(None, lambda: get_dataset_fragments(load_gov_domains()))
+
+def export_cache_dir() -> Optional[Path]:
+    """Katalog eksportów wspólnych dla workerów (obok snapshotu rejestru) albo None bez GOV_DOMAIN_SNAPSHOT_PATH"""
+    snapshot_path = get_domain_registry().snapshot_path
+    return snapshot_path.with_name(f"{snapshot_path.name}.exports") if snapshot_path else None
+
+# Zakodowane fragmenty JSON niezmienne w obrębie jednego snapshotu gov.json
+DATASET_PAGE_CACHE_MAX = 64
+
+class DatasetFragments:
+    """Fragmenty odpowiedzi JSON wspólne dla wszystkich żądań do danego snapshotu danych"""
+
+    def __init__(self, domains_data: Dict[str, Any]) -> None:
+        self.source = domains_data
+        # Wpisy rejestru po domenie - przy snapshocie mmap współdzielone przez workery
+        self.lookup = domains_data["lookup"]
+        self.categories = dumps({name: len(domains) for name, domains in domains_data["categories"].items()})
+        self.last_updated = dumps(domains_data.get("last_updated"))
+        self.domain_categories: DomainCategories = domains_data["domain_categories"]
+        # (category, limit, offset) -> pełna odpowiedź kompendium bez wyszukiwania
+        self.pages: Dict[tuple, bytes] = {}
+        # (is_official, category, blocklisted, zone) -> odpowiedź verify bez pola "domain"
+        self.verify_tails: Dict[tuple, bytes] = {}
+        # (format, category) -> zakodowany eksport całego snapshotu
+        self.exports: Dict[tuple, ExportBody] = {}
+        # wersja klienta (since) -> odpowiedź /api/domains/changes względem tego snapshotu
+        self.changes: Dict[str, bytes] = {}
+        # Indeks prefiksów dla podpowiedzi (budowany przy pierwszym użyciu) i odpowiedzi dla bieżącej popularności
+        self.prefix_index: Optional[PrefixIndex] = None
+        self.suggestions: Dict[tuple, bytes] = {}
+        self.suggestions_popularity: Optional[Dict[str, int]] = None
+        self._version: Optional[str] = None
+
+    @property
+    def version(self) -> str:
+        """Wersja snapshotu (skrót zawartości) - podstawa ETag eksportu"""
+        if self._version is None:
+            self._version = snapshot_version(self.source["domains"], self.source.get("last_updated"))
+        return self._version
+
+    def export(self, export_format: str, category: Optional[str]) -> ExportBody:
+        key = (export_format, category)
+        body = self.exports.get(key)
+        if body is None:
+            if category:
+                domains, categories = self.source["categories"][category], repeat(category)
+            else:
+                domains, categories = self.source["domains"], self.domain_categories.categories()
+            body = self.exports[key] = build_export(
+                domains, categories, export_format, self.version, category, directory=export_cache_dir()
+            )
+        return body
+
+    def cache_page(self, key: tuple, body: bytes) -> None:
+        if len(self.pages) >= DATASET_PAGE_CACHE_MAX:
+            del self.pages[next(iter(self.pages))]
+        self.pages[key] = body
+
+    def verify_tail(self, is_official: bool, category: Optional[str], blocklisted: bool = False, zone: str = ROOT_DOMAIN) -> bytes:
+        key = (is_official, category, blocklisted, zone)
+        tail = self.verify_tails.get(key)
+        if tail is None:
+            if blocklisted:
+                # Ostrzeżenie ma pierwszeństwo - także przed wpisem na oficjalnej liście (np. przejęta domena)
+                status, trust_score = "blocklisted", 0
+                message = f"Uwaga: domena znajduje się na liście niebezpiecznych domen ({DEFAULT_BLOCKLIST_NAME})"
+            elif is_official:
+                status, trust_score, message = "verified", 100, f"Domena jest oficjalną domeną .{zone}"
+            else:
+                status, trust_score, message = "unverified", 0, f"Domena nie została znaleziona na oficjalnej liście domen {TRUST_ZONES_LABEL}"
+            encoded = dumps({
+                "is_official": is_official,
+                "status": status,
+                "category": category,
+                "trust_score": trust_score,
+                "message": message,
+                "last_updated": self.source.get("last_updated")
+            })
+            tail = self.verify_tails[key] = b"," + encoded[1:]
+        return tail
+
+_dataset_fragments: Optional[DatasetFragments] = None
+_dataset_fragments_lock = threading.Lock()
+# Zmiany między kolejnymi snapshotami (ograniczona liczba wersji) dla /api/domains/changes
+registry_history = RegistryHistory()
+
+def get_dataset_fragments(domains_data: Dict[str, Any]) -> DatasetFragments:
+    """Zwraca fragmenty dla bieżącego snapshotu, budując je po przeładowaniu danych"""
+    global _dataset_fragments
+    fragments = _dataset_fragments
+    if fragments is not None and fragments.source is domains_data:
+        return fragments
+    # Wersja (skrót zawartości) i diff dla historii przechodzą przez cały rejestr - jeden wątek na snapshot
+    with _dataset_fragments_lock:
+        if _dataset_fragments is None or _dataset_fragments.source is not domains_data:
+            fragments = DatasetFragments(domains_data)
+            registry_history.record(fragments.version, fragments.domain_categories)
+            _dataset_fragments = fragments
+        return _dataset_fragments
 
 def normalize_domain(domain: str) -> str:
     """Normalizuje domenę do małych liter i usuwa białe znaki"""
@@ -301,21 +614,15 @@ def normalize_domain(domain: str) -> str:
     # Normalizuj do małych liter i usuń białe znaki
     return domain.lower().strip()
 
-def is_official_gov_domain(domain: str) -> bool:
-    """Sprawdza czy domena jest oficjalną domeną .gov.pl"""
-    global GOV_DOMAINS_SET
-    normalized = normalize_domain(domain)
-    if not normalized.endswith(".gov.pl"):
-        return False
-    
-    # Załaduj domeny (ustawi też GOV_DOMAINS_SET)
-    load_gov_domains()
-    return normalized in (GOV_DOMAINS_SET or set())
-
 # Endpointy weryfikacji domen
 @app.get("/api/domain/verify")
 @limiter.limit("60/minute")  # Rate limiting
-async def verify_domain(request: Request, domain: Optional[str] = Query(None)):
+async def verify_domain(
+    request: Request,
+    domain: Optional[str] = Query(None),
+    tls: bool = Query(False, description="Dołącz wynik sprawdzenia certyfikatu TLS"),
+    dns: bool = Query(False, description="Dołącz rekordy DNS (A/AAAA/CNAME) domeny")
+):
     """Weryfikuje czy domena jest oficjalną domeną .gov.pl"""
     # Jeśli domena nie jest podana, spróbuj użyć hostname z requestu
     if not domain:
@@ -330,28 +637,184 @@ async def verify_domain(request: Request, domain: Optional[str] = Query(None)):
             detail="Domain parameter is required. Provide ?domain=example.gov.pl or use Host header"
         )
     
-    normalized = normalize_domain(domain)
-    is_official = is_official_gov_domain(normalized)
+    with span("normalize"):
+        normalized = normalize_domain(domain)
     
-    domains_data = load_gov_domains()
+    # Jeden snapshot dla statusu i kategorii - przeładowanie w trakcie żądania nie da mieszanych wyników
+    with span("registry"):
+        fragments = await current_dataset()
     
-    # Określ kategorię domeny
-    category = None
-    for cat_name, cat_domains in domains_data["categories"].items():
-        if normalized in cat_domains:
-            category = cat_name
-            break
+    with span("lookup"):
+        entry = fragments.lookup.get(normalized)
+        is_official = is_listed_entry(entry)
+        category = compendium_category(normalized) if is_official else None
+        zone = (entry.get("zone") or ROOT_DOMAIN) if is_official else ROOT_DOMAIN
     
-    return {
-        "domain": normalized,
-        "is_official": is_official,
-        "status": "verified" if is_official else "unverified",
-        "category": category,
-        "trust_score": 100 if is_official else 0,
-        "message": "Domena jest oficjalną domeną .gov.pl" if is_official else "Domena nie została znaleziona na oficjalnej liście domen .gov.pl",
-        "last_updated": domains_data.get("last_updated")
+    # Lista ostrzeżeń (np. CERT Polska) - sprawdzana także dla domen nadrzędnych
+    blocklist = get_blocklist()
+    blocklist_match = None
+    if blocklist is not None:
+        with span("blocklist"):
+            # Lista trzyma nazwy IDNA (punycode), więc host Unicode trzeba zakodować tak samo
+            blocklist_match = blocklist.match(parse_hostname(normalized) or "")
+    
+    if blocklist_match is not None:
+        host_stats.record("verify_blocklisted", normalized)
+    else:
+        host_stats.record("verify_official" if is_official else "verify_unlisted", normalized)
+    
+    with span("serialize"):
+        tail = fragments.verify_tail(is_official, category, blocklist_match is not None, zone)
+        body = b'{"domain":' + dumps(normalized) + tail
+        if blocklist is not None:
+            body = body[:-1] + b',"blocklisted":' + dumps_bool(blocklist_match is not None) + b',"blocklist_match":' + dumps(blocklist_match) + b"}"
+    
+    # Opcjonalnie: certyfikat TLS i rekordy DNS (tylko dla domen z oficjalnych stref, wyniki z cache),
+    # oba sprawdzenia równolegle
+    if tls or dns:
+        host = parse_hostname(domain)
+        checks = [name for name, wanted in (("tls", tls), ("dns", dns)) if wanted]
+        results = await asyncio.gather(*(run_network_check(name, host, fragments.lookup) for name in checks))
+        for name, result in zip(checks, results):
+            body = body[:-1] + b',"' + name.encode("ascii") + b'":' + dumps(result) + b"}"
+    return JSONBytesResponse(body)
+
+async def run_network_check(name: str, host: Optional[str], lookup: Any = None) -> Optional[Dict[str, Any]]:
+    """Wynik sprawdzenia TLS/DNS dla verify albo None, gdy hosta nie ma w rejestrze lub nazwa jest nieprawidłowa"""
+    if not host or not is_valid_hostname(host):
+        return None
+    if name == "tls":
+        if is_tls_inspectable(host, lookup):
+            with span("tls"):
+                return await get_tls_inspector().inspect(host)
+    elif is_dns_resolvable(host, lookup):
+        with span("dns"):
+            return await get_dns_resolver().resolve(host)
+    return None
+
+@lru_cache(maxsize=1)
+def get_blocklist():
+    """Lista ostrzeżeń ładowana w tle przy pierwszym użyciu; None gdy MVERIFY_BLOCKLIST_SOURCE nie jest ustawione"""
+    if not DEFAULT_BLOCKLIST_SOURCE:
+        return None
+    return Blocklist(DEFAULT_BLOCKLIST_SOURCE).start()
+
+@lru_cache(maxsize=1)
+def get_tls_inspector():
+    """Inspektor TLS tworzony przy pierwszym użyciu (moduł ssl i pula połączeń nie są potrzebne przy starcie)"""
+    from backend.tls_inspect import TLSInspector
+    return TLSInspector()
+
+def is_tls_inspectable(host: str, lookup: Any = None) -> bool:
+    # Połączenia wychodzące tylko do hostów z rejestru - endpoint nie może służyć do skanowania dowolnych hostów
+    return is_listed_host(host, lookup) or host in get_tls_inspector().extra_hosts
+
+@app.post("/api/domain/verify-batch")
+@limiter.limit("30/minute")  # Rate limiting - jedno zapytanie zastępuje weryfikację każdego linku osobno
+async def verify_domains_batch(request: Request, batch: VerifyBatchRequest):
+    """Weryfikuje wiele hostów naraz (np. wszystkie linki strony) względem jednego snapshotu rejestru,
+    razem ze statusem ciasteczka zaufania użytkownika"""
+    # Jeden snapshot dla całej partii - przeładowanie w trakcie nie da mieszanych wyników
+    with span("registry"):
+        fragments = await current_dataset()
+    lookup = fragments.lookup
+
+    # Deduplikacja po normalizacji; aliases mapuje podane wartości na klucze wyników
+    with span("normalize"):
+        hosts: Dict[str, None] = {}
+        aliases: Dict[str, str] = {}
+        invalid: List[str] = []
+        for value in batch.hosts:
+            host = normalize_domain(value).partition(":")[0]
+            if not host:
+                invalid.append(value)
+                continue
+            hosts[host] = None
+            if host != value:
+                aliases[value] = host
+
+    cleanup_trust_tokens()
+    token_payload = get_trust_token_payload(request)
+    trust = {"trusted": False} if token_payload is None else {
+        "trusted": True,
+        "trustImageUrl": token_payload["trustImageUrl"],
+        "lastVerifiedAt": token_payload["lastVerifiedAt"]
     }
 
+    blocklist = get_blocklist()
+    with span("lookup"):
+        entries = []
+        for host in hosts:
+            record = lookup.get(host)
+            is_official = is_listed_entry(record)
+            category = compendium_category(host) if is_official else None
+            zone = (record.get("zone") or ROOT_DOMAIN) if is_official else ROOT_DOMAIN
+            blocklist_match = blocklist.match(parse_hostname(host) or "") if blocklist is not None else None
+            # Ten sam zakodowany ogon co w /api/domain/verify - identyczne pola i komunikaty
+            # Zaufanie jak w /api/trust/trust-status: tylko hosty z rejestru, nie każdy host w strefie
+            trusted = token_payload is not None and is_allowed_trust_hostname(host, lookup)
+            entry = (
+                dumps(host) + b':{"trusted":' + dumps_bool(trusted)
+                + fragments.verify_tail(is_official, category, blocklist_match is not None, zone)
+            )
+            if blocklist is not None:
+                entry = entry[:-1] + b',"blocklisted":' + dumps_bool(blocklist_match is not None) + b',"blocklist_match":' + dumps(blocklist_match) + b"}"
+            entries.append(entry)
+
+    with span("serialize"):
+        body = b"".join((
+            b'{"version":', dumps(fragments.version),
+            b',"last_updated":', fragments.last_updated,
+            b',"trust":', dumps(trust),
+            b',"results":{', b",".join(entries),
+            b'},"aliases":', dumps(aliases),
+            b',"invalid":', dumps(invalid),
+            b"}",
+        ))
+    return JSONBytesResponse(body)
+
+@app.get("/api/domain/tls")
+@limiter.limit("30/minute")  # Rate limiting
+async def inspect_domain_tls(request: Request, domain: str = Query(..., description="Domena do sprawdzenia")):
+    """Sprawdza certyfikat TLS domeny: wystawca, SAN, ważność i zgodność z nazwą hosta"""
+    host = parse_hostname(domain)
+    if not host or not is_valid_hostname(host):
+        raise HTTPException(status_code=400, detail="Nieprawidłowa nazwa hosta")
+    if not is_tls_inspectable(host, (await current_dataset()).lookup):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sprawdzanie TLS dostępne wyłącznie dla domen z rejestru {TRUST_ZONES_LABEL}"
+        )
+    with span("tls"):
+        result = await get_tls_inspector().inspect(host)
+    return JSONBytesResponse(dumps(result))
+
+@lru_cache(maxsize=1)
+def get_dns_resolver():
+    """Resolver DNS tworzony przy pierwszym użyciu; CNAME spoza TRUST_ZONES są oznaczane w wyniku"""
+    from backend.dns_check import DNSResolver
+    return DNSResolver(TRUST_ZONES)
+
+def is_dns_resolvable(host: str, lookup: Any = None) -> bool:
+    # Jak przy TLS: endpoint nie może służyć jako otwarty resolver dla dowolnych nazw
+    return is_listed_host(host, lookup) or host in get_dns_resolver().extra_hosts
+
+@app.get("/api/domain/dns")
+@limiter.limit("30/minute")  # Rate limiting
+async def resolve_domain_dns(request: Request, domain: str = Query(..., description="Domena do sprawdzenia")):
+    """Rozwiązuje rekordy A/AAAA/CNAME domeny i oznacza CNAME wychodzące poza oficjalne strefy"""
+    host = parse_hostname(domain)
+    if not host or not is_valid_hostname(host):
+        raise HTTPException(status_code=400, detail="Nieprawidłowa nazwa hosta")
+    if not is_dns_resolvable(host, (await current_dataset()).lookup):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sprawdzanie DNS dostępne wyłącznie dla domen z rejestru {TRUST_ZONES_LABEL}"
+        )
+    with span("dns"):
+        result = await get_dns_resolver().resolve(host)
+    return JSONBytesResponse(dumps(result))
+
 @app.get("/api/domains/compendium")
 @limiter.limit("30/minute")  # Rate limiting
 async def get_domains_compendium(
@@ -362,7 +825,16 @@ async def get_domains_compendium(
     offset: Optional[int] = Query(0, ge=0)
 ):
     """Zwraca kompendium wszystkich oficjalnych domen .gov.pl z możliwością wyszukiwania i filtrowania"""
-    domains_data = load_gov_domains()
+    with span("registry"):
+        fragments = await current_dataset()
+    domains_data = fragments.source
+    
+    # Strony bez wyszukiwania są takie same dla całego snapshotu - zwróć gotowe bajty
+    page_key = None if search else (category, limit, offset)
+    if page_key is not None:
+        cached = fragments.pages.get(page_key)
+        if cached is not None:
+            return JSONBytesResponse(cached)
     
     # Pobierz domeny
     all_domains = domains_data["domains"]
@@ -375,26 +847,166 @@ async def get_domains_compendium(
     
     # Wyszukiwanie
     if search:
-        search_lower = search.lower()
-        filtered_domains = [d for d in filtered_domains if search_lower in d.lower()]
+        with span("search"):
+            search_lower = search.lower()
+            # Przejście przez cały rejestr (domeny dekodowane z widoku) poza pętlą zdarzeń
+            filtered_domains = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: [d for d in filtered_domains if search_lower in d.lower()]
+            )
     
     # Paginacja
     total = len(filtered_domains)
     paginated_domains = filtered_domains[offset:offset + limit]
     
-    return {
-        "domains": paginated_domains,
-        "total": total,
-        "limit": limit,
-        "offset": offset,
-        "has_more": offset + limit < total,
-        "categories": {
-            name: len(domains) for name, domains in domains_data["categories"].items()
-        },
-        "last_updated": domains_data.get("last_updated"),
-        "search": search,
-        "category": category
+    with span("serialize"):
+        body = b"".join((
+            b'{"domains":', dumps(paginated_domains),
+            b',"total":%d,"limit":%d,"offset":%d' % (total, limit, offset),
+            b',"has_more":', dumps_bool(offset + limit < total),
+            b',"categories":', fragments.categories,
+            b',"last_updated":', fragments.last_updated,
+            b',"search":', dumps(search),
+            b',"category":', dumps(category),
+            b"}",
+        ))
+    if page_key is not None:
+        fragments.cache_page(page_key, body)
+    return JSONBytesResponse(body)
+
+# Podpowiedzi wyszukiwarki kompendium: popularność z top-k statystyk verify, odświeżana co najwyżej raz na minutę
+AUTOCOMPLETE_POPULARITY_TTL = 60
+AUTOCOMPLETE_CACHE_MAX = 4096
+_autocomplete_popularity: tuple = (float("-inf"), {})
+
+def get_autocomplete_popularity() -> Dict[str, int]:
+    global _autocomplete_popularity
+    loaded_at, popularity = _autocomplete_popularity
+    now = time.monotonic()
+    if now - loaded_at >= AUTOCOMPLETE_POPULARITY_TTL:
+        popularity = popularity_from_report(host_stats.streams["verify_official"].top(limit=200))
+        _autocomplete_popularity = (now, popularity)
+    return popularity
+
+@app.get("/api/domains/autocomplete")
+@limiter.limit("600/minute")  # Wywoływane przy każdym naciśnięciu klawisza - limit tylko przeciw nadużyciom
+async def autocomplete_domains(
+    request: Request,
+    q: str = Query(..., max_length=253, description="Początek nazwy domeny lub jej etykiety"),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """Podpowiedzi domen zaczynających się od prefiksu (także od wewnętrznej etykiety, np. krak -> um.krakow.gov.pl)"""
+    prefix = normalize_domain(q)
+    with span("registry"):
+        fragments = await current_dataset()
+    domains_data = fragments.source
+    if fragments.prefix_index is None:
+        # Indeks zapisany we wspólnym snapshocie tylko się opakowuje; bez niego budowa (sortowanie etykiet)
+        # poza pętlą zdarzeń - raz na snapshot
+        fragments.prefix_index = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: PrefixIndex(domains_data["domains"], labels=domains_data["prefix_labels"])
+        )
+
+    popularity = get_autocomplete_popularity()
+    if fragments.suggestions_popularity is not popularity:
+        fragments.suggestions = {}
+        fragments.suggestions_popularity = popularity
+    key = (prefix, limit)
+    body = fragments.suggestions.get(key)
+    if body is None:
+        with span("lookup"):
+            suggestions = fragments.prefix_index.complete(prefix, limit, popularity)
+        body = b'{"q":' + dumps(prefix) + b',"suggestions":' + dumps(suggestions) + b"}"
+        if len(fragments.suggestions) >= AUTOCOMPLETE_CACHE_MAX:
+            del fragments.suggestions[next(iter(fragments.suggestions))]
+        fragments.suggestions[key] = body
+    # Krótkie cache w przeglądarce - powrót do wcześniejszego prefiksu (Backspace) bez zapytania
+    return JSONBytesResponse(body, headers={"Cache-Control": "public, max-age=60"})
+
+@app.get("/api/domains/changes")
+@limiter.limit("60/minute")  # Rate limiting
+async def get_domain_changes(
+    request: Request,
+    since: str = Query(..., description="Wersja snapshotu posiadana przez klienta (X-Export-Version / pole version)")
+):
+    """Zmiany w kompendium od wersji `since`: dodane, usunięte i przeniesione między kategoriami domeny"""
+    with span("registry"):
+        fragments = await current_dataset()
+    headers = {"X-Registry-Version": fragments.version, "Cache-Control": "no-cache"}
+
+    # Klienci z tą samą wersją dostają tę samą odpowiedź - liczona raz na snapshot
+    body = fragments.changes.get(since)
+    if body is None:
+        with span("diff"):
+            changes = registry_history.changes_since(since)
+        if changes is None:
+            # Wersja spoza historii (lub zmian więcej niż danych) - klient pobiera pełny eksport
+            return JSONBytesResponse(dumps({
+                "detail": "Wersja niedostępna w historii zmian - wymagana pełna synchronizacja",
+                "full_resync": True,
+                "version": fragments.version,
+                "export": "/api/domains/export",
+            }), status_code=410, headers=headers)
+        with span("serialize"):
+            body = dumps({**changes, "full_resync": False})
+        if len(fragments.changes) <= registry_history.max_versions:
+            fragments.changes[since] = body
+    return JSONBytesResponse(body, headers=headers)
+
+@app.get("/api/domains/export")
+@limiter.limit("10/minute")  # Rate limiting - pełny eksport zastępuje dziesiątki zapytań o strony
+async def export_domains(
+    request: Request,
+    format: str = Query("ndjson", description="ndjson albo csv"),
+    category: Optional[str] = Query(None),
+    after: Optional[str] = Query(None, description="Wznowienie: ostatnia otrzymana domena")
+):
+    """Strumieniuje całe kompendium (NDJSON/CSV) z ETag wersji snapshotu; wznowienie przez ?after= lub Range"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Nieobsługiwany format. Dostępne: {', '.join(EXPORT_FORMATS)}")
+    with span("registry"):
+        fragments = await current_dataset()
+    domains_data = fragments.source
+    if category and category not in domains_data["categories"]:
+        raise HTTPException(status_code=400, detail=f"Nieznana kategoria. Dostępne: {', '.join(domains_data['categories'])}")
+    headers = {
+        "ETag": export_etag(fragments.version, format, category),
+        "Cache-Control": "no-cache",
+        "Accept-Ranges": "bytes",
+        "X-Export-Version": fragments.version,
     }
+    # Niezmieniony snapshot: 304 bez budowania eksportu
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    # Kodowany raz na snapshot, format i kategorię - kolejne pobrania tylko wysyłają gotowe bajty
+    with span("export"):
+        export = fragments.exports.get((format, category))
+        if export is None:
+            # Kodowanie całej listy nie blokuje pętli zdarzeń (inne żądania obsługiwane w tym czasie)
+            export = await asyncio.get_running_loop().run_in_executor(None, fragments.export, format, category)
+    headers["X-Export-Rows"] = str(export.rows)
+
+    if after:
+        # Wiersze posortowane po domenie - dalsza część od pierwszej domeny po kursorze (CSV bez nagłówka)
+        return StreamingResponse(export.stream(export.offset_after(after.lower())), media_type=export.media_type, headers=headers)
+
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", export.etag) == export.etag:
+        try:
+            byte_range = parse_range(range_header, len(export))
+        except ValueError:
+            byte_range = (0, len(export))
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(export)}"})
+        start, end = byte_range
+        if (start, end) != (0, len(export)):
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(export)}"
+            headers["Content-Length"] = str(end - start)
+            return StreamingResponse(export.stream(start, end), status_code=206, media_type=export.media_type, headers=headers)
+
+    # Pełny eksport wysyłany kawałkami (chunked) - pierwsze bajty od razu, bez kopiowania całości
+    headers["Content-Disposition"] = f'attachment; filename="gov-domains{"-" + category if category else ""}.{format}"'
+    return StreamingResponse(export.stream(), media_type=export.media_type, headers=headers)
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -441,6 +1053,9 @@ async def api_info():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
+            "tls": "/api/domain/tls",
+            "dns": "/api/domain/dns",
             "items": "/api/items",
             "docs": "/docs",
             "frontend": "/list"
@@ -450,7 +1065,47 @@ async def api_info():
 @app.get("/health")
 async def health_check():
     """Sprawdzenie stanu API"""
-    return {"status": "healthy", "service": "gov-api"}
+    # Pierwsze wywołanie tworzy rejestr (ładowanie gov.json) - poza pętlą zdarzeń
+    zones = await asyncio.get_running_loop().run_in_executor(None, lambda: get_domain_registry().zone_info())
+    return {
+        "status": "healthy",
+        "service": "gov-api",
+        "trust_sessions": trust_sessions.stats(),
+        # Źródło, rozmiar i świeżość każdej strefy rejestru (stan ostatniego snapshotu, bez odświeżania)
+        "zones": zones,
+        "blocklist": get_blocklist().info() if DEFAULT_BLOCKLIST_SOURCE else None,
+        "audit_log": get_audit_log().stats() if DEFAULT_AUDIT_LOG_PATH else None,
+        "registry_history": registry_history.stats()
+    }
+
+def require_admin(request: Request) -> None:
+    """Endpointy administracyjne: wyłączone bez MVERIFY_ADMIN_TOKEN, dostęp tylko z nagłówkiem X-Mverify-Admin"""
+    if not DEFAULT_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-mverify-admin", "")
+    if not secrets.compare_digest(token.encode("utf-8"), DEFAULT_ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Metryki w formacie Prometheus (trasy, rejestr domen, sesje, QR, rate limiting)"""
+    # Metryki zdradzają ruch i rozmiary tabel - jak host-stats wymagają tokenu, chyba że MVERIFY_METRICS_PUBLIC=1
+    if not DEFAULT_METRICS_PUBLIC:
+        require_admin(request)
+    return Response(content=METRICS_REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/admin/host-stats")
+async def get_host_stats(
+    request: Request,
+    stream: Optional[str] = Query(None, description="Strumień (np. verify_unlisted); domyślnie wszystkie"),
+    window: Optional[int] = Query(None, ge=1, description="Długość okna w sekundach (zaokrąglana do pełnych kubełków)"),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Najczęściej sprawdzane hosty (count-min sketch + top-k) w przesuwnym oknie czasowym"""
+    require_admin(request)
+    if stream is not None and stream not in host_stats.streams:
+        raise HTTPException(status_code=400, detail=f"Nieznany strumień. Dostępne: {', '.join(host_stats.streams)}")
+    return JSONBytesResponse(dumps(host_stats.report(stream=stream, limit=limit, window_seconds=window)))
 
 # Trusted image endpoints
 @app.get("/api/trust/trust-status")
@@ -458,20 +1113,11 @@ async def get_trust_status(request: Request, hostname: str = Query(..., descript
     """Zwraca status zaufania użytkownika względem domeny."""
     cleanup_trust_tokens()
     host = normalize_hostname(hostname)
-    if not is_allowed_trust_hostname(host):
+    if not is_allowed_trust_hostname(host, (await current_dataset()).lookup):
         return {"trusted": False}
 
-    token = request.cookies.get(TRUST_COOKIE_NAME)
-    if not token:
-        return {"trusted": False}
-
-    token_payload = trust_tokens.get(token)
-    if not token_payload:
-        return {"trusted": False}
-
-    expires_at = token_payload.get("expires_at")
-    if expires_at and expires_at < datetime.utcnow():
-        trust_tokens.pop(token, None)
+    token_payload = get_trust_token_payload(request)
+    if token_payload is None:
         return {"trusted": False}
 
     return {
@@ -482,20 +1128,34 @@ async def get_trust_status(request: Request, hostname: str = Query(..., descript
 
 
 @app.post("/api/trust/start-verification")
-async def start_trust_verification(payload: TrustStartRequest):
+@limiter.limit("20/minute")  # Rate limiting
+async def start_trust_verification(request: Request, payload: TrustStartRequest):
     """Rozpoczyna proces weryfikacji trusted image i zwraca dane sesji."""
-    host = ensure_trust_hostname(payload.hostname)
-    cleanup_trust_sessions()
+    host = ensure_trust_hostname(payload.hostname, (await current_dataset()).lookup)
+    host_stats.record("trust_start", host)
 
     session_id = secrets.token_urlsafe(16)
     qr_code_url = f"https://via.placeholder.com/200x200.png?text={session_id[-4:].upper()}"
 
-    trust_sessions[session_id] = {
-        "hostname": host,
-        "created_at": datetime.utcnow(),
-        "trusted": False,
-        "qrCodeUrl": qr_code_url
-    }
+    try:
+        trust_sessions.add(
+            session_id,
+            {
+                "hostname": host,
+                "created_at": datetime.utcnow(),
+                "trusted": False,
+                "qrCodeUrl": qr_code_url
+            },
+            client=get_admission_client(request),
+        )
+    except AdmissionRejected as exc:
+        RATE_LIMIT_REJECTIONS.inc((exc.reason,))
+        # Pełna tabela odrzuca nowe sesje zamiast wypierać trwające weryfikacje innych klientów
+        raise HTTPException(
+            status_code=503 if exc.reason == ADMISSION_TRUST_FULL else 429,
+            detail="Zbyt wiele aktywnych sesji weryfikacji. Spróbuj ponownie później.",
+            headers={"Retry-After": str(TRUST_SESSION_TTL_SECONDS)}
+        )
 
     return {
         "sessionId": session_id,
@@ -529,6 +1189,7 @@ async def verify_trust_status(sessionId: str = Query(..., description="Identyfik
         session["trusted"] = True
         session["trust_token"] = trust_token
         session["trust_payload"] = payload
+        audit("trust_verified", hostname=session["hostname"], session_ref=token_ref(sessionId), client=session["client"])
 
     if session.get("trusted"):
         response = JSONResponse({
@@ -551,117 +1212,127 @@ async def verify_trust_status(sessionId: str = Query(..., description="Identyfik
     return {"trusted": False}
 
 # Endpoints dla Items
+# Zwykłe def: FastAPI uruchamia je w puli wątków, więc zapytania SQLite nie blokują pętli zdarzeń
 @app.get("/api/items", response_model=List[Item])
-async def get_items():
-    """Pobierz wszystkie elementy"""
-    return items_db
+def get_items(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=DEFAULT_ITEMS_MAX_PAGE_SIZE, description="Rozmiar strony (domyślnie MVERIFY_ITEMS_PAGE_SIZE)"),
+    cursor: Optional[str] = Query(None, description="Kursor z nagłówka X-Next-Cursor poprzedniej strony")
+):
+    """Pobierz stronę elementów (kolejne strony przez kursor z nagłówka X-Next-Cursor / Link).
+
+    Bez limit i cursor - wszystkie elementy jak przed wprowadzeniem stronicowania, najwyżej MVERIFY_ITEMS_UNPAGED_MAX;
+    ponad ten limit odpowiedź też niesie kursor następnej strony.
+    """
+    try:
+        after_id = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if limit is None and cursor is None:
+        page_size = DEFAULT_ITEMS_UNPAGED_MAX
+    else:
+        page_size = limit or DEFAULT_ITEMS_PAGE_SIZE
+    items, next_after = get_item_store().page(after_id, page_size)
+    response = JSONBytesResponse(dumps(items))
+    next_cursor = encode_cursor(next_after)
+    if next_cursor is not None:
+        # Treść pozostaje listą jak wcześniej; klient bez limit dostaje pełną listę, a kursor tylko ponad limit
+        response.headers["X-Next-Cursor"] = next_cursor
+        next_url = request.url.include_query_params(cursor=next_cursor, limit=limit or DEFAULT_ITEMS_PAGE_SIZE)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
 
 @app.get("/api/items/{item_id}", response_model=Item)
-async def get_item(item_id: int):
+def get_item(item_id: int):
     """Pobierz konkretny element"""
-    item = next((i for i in items_db if i["id"] == item_id), None)
+    item = get_item_store().get(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     return item
 
 @app.post("/api/items", response_model=Item)
-async def create_item(item: ItemCreate):
+def create_item(item: ItemCreate):
     """Utwórz nowy element"""
-    global next_id
-    new_item = {
-        "id": next_id,
-        "name": item.name,
-        "description": item.description
-    }
-    items_db.append(new_item)
-    next_id += 1
-    return new_item
+    return get_item_store().create(item.name, item.description)
+
+@app.post("/api/items/bulk", response_model=List[Item])
+def create_items_bulk(items: List[ItemCreate]):
+    """Utwórz wiele elementów naraz (jedna transakcja w SQLite)"""
+    if len(items) > DEFAULT_ITEMS_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {DEFAULT_ITEMS_BULK_MAX} items per request")
+    created = get_item_store().create_many([(item.name, item.description) for item in items])
+    return JSONBytesResponse(dumps(created))
+
+@app.post("/api/items/bulk-delete")
+def delete_items_bulk(body: ItemBulkDelete):
+    """Usuń wiele elementów naraz; nieistniejące id są zwracane w polu missing"""
+    deleted = get_item_store().delete_many(body.ids)
+    deleted_ids = {item["id"] for item in deleted}
+    missing = [item_id for item_id in dict.fromkeys(body.ids) if item_id not in deleted_ids]
+    return JSONBytesResponse(dumps({"message": "Items deleted", "items": deleted, "missing": missing}))
 
 @app.put("/api/items/{item_id}", response_model=Item)
-async def update_item(item_id: int, item: ItemCreate):
+def update_item(item_id: int, item: ItemCreate):
     """Zaktualizuj element"""
-    item_index = next((i for i, x in enumerate(items_db) if x["id"] == item_id), None)
-    if item_index is None:
+    updated = get_item_store().update(item_id, item.name, item.description)
+    if updated is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    
-    items_db[item_index] = {
-        "id": item_id,
-        "name": item.name,
-        "description": item.description
-    }
-    return items_db[item_index]
+    return updated
 
 @app.delete("/api/items/{item_id}")
-async def delete_item(item_id: int):
+def delete_item(item_id: int):
     """Usuń element"""
-    item_index = next((i for i, x in enumerate(items_db) if x["id"] == item_id), None)
-    if item_index is None:
+    deleted_item = get_item_store().delete(item_id)
+    if deleted_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    
-    deleted_item = items_db.pop(item_index)
     return {"message": "Item deleted", "item": deleted_item}
 
 # Endpoints dla parowania QR code
-def generate_pin() -> str:
-    """Generuje unikalny 6-cyfrowy kod PIN"""
-    while True:
-        pin = f"{secrets.randbelow(1000000):06d}"  # 000000-999999
-        if pin not in pin_to_token:
-            return pin
+# Powód odrzucenia potwierdzenia -> (kod HTTP, komunikat, X-Verification-Result)
+CONFIRM_ERRORS = {
+    CONFIRM_NOT_FOUND: (404, "Token not found or expired", "error"),
+    CONFIRM_EXPIRED: (410, "Token expired", "expired"),
+    CONFIRM_ALREADY_CONFIRMED: (400, "Pairing already confirmed", "already_confirmed"),
+    CONFIRM_NONCE_USED: (400, "Nonce already used - this QR code was already scanned", "nonce_used"),
+    CONFIRM_INVALID_NONCE: (400, "Invalid nonce - QR code may be invalid or tampered", "invalid_nonce"),
+}
 
 def cleanup_expired_sessions():
-    """Usuwa wygasłe sesje parowania"""
-    current_time = time.time()
-    expired_tokens = [
-        token for token, session in pairing_sessions.items()
-        if current_time > session["expires_at"]
-    ]
-    for token in expired_tokens:
-        # Usuń również mapowanie PIN -> token
-        session = pairing_sessions[token]
-        if "pin" in session and session["pin"] in pin_to_token:
-            del pin_to_token[session["pin"]]
-        del pairing_sessions[token]
+    """Usuwa wygasłe sesje parowania (razem z mapowaniem PIN -> token)"""
+    with CLEANUP_SECONDS.time(("pairing_sessions",)), span("cleanup"):
+        pairing_sessions.expire()
 
 @app.post("/api/pairing/generate")
 @limiter.limit("20/minute")  # Maksymalnie 20 requestów na minutę
 async def generate_pairing_qr(request: Request):
     """Generuje nowy unikalny kod QR i 6-cyfrowy PIN do parowania (ważny 5 minut)"""
     cleanup_expired_sessions()
+    # Strona osadzająca widget - kopie widgetu na podróbkach gov.pl widać w statystykach
+    origin = request.headers.get("origin") or request.headers.get("referer")
+    if origin:
+        host_stats.record("pairing_origin", parse_hostname(origin))
     
-    # Generuj unikalny token
-    token = secrets.token_urlsafe(32)
-    # Generuj 6-cyfrowy PIN
-    pin = generate_pin()
-    # Generuj nonce (jednorazowy kod) dla QR - zapobiega replay attacks
-    nonce = secrets.token_urlsafe(16)
-    expires_at = time.time() + PAIRING_TIMEOUT_SECONDS
-    
-    pairing_sessions[token] = {
-        "token": token,
-        "pin": pin,
-        "nonce": nonce,  # Jednorazowy kod
-        "nonce_used": False,  # Flaga czy nonce został użyty
-        "status": "pending",  # pending, confirmed, expired
-        "created_at": time.time(),
-        "expires_at": expires_at,
-        "confirmed_at": None,
-        "device_id": None,
-        "device_name": None
-    }
-    
-    # Mapowanie PIN -> token
-    pin_to_token[pin] = token
+    # Unikalny token, 6-cyfrowy PIN i nonce (jednorazowy kod) dla QR
+    try:
+        session = pairing_sessions.create()
+    except AdmissionRejected:
+        # Brak wolnych PIN-ów - odmowa zamiast losowania w nieskończoność na pętli zdarzeń
+        RATE_LIMIT_REJECTIONS.inc(("pairing_sessions",))
+        raise HTTPException(
+            status_code=503,
+            detail="Zbyt wiele aktywnych sesji parowania. Spróbuj ponownie później.",
+            headers={"Retry-After": str(PAIRING_TIMEOUT_SECONDS)}
+        )
     
     # QR code zawiera token i nonce - aplikacja mobilna musi przesłać oba
-    qr_data = f"{token}:{nonce}"
+    qr_data = f"{session.token}:{session.nonce}"
     
     return {
-        "token": token,
-        "pin": pin,
-        "nonce": nonce,  # Nonce jest zwracany, ale nie powinien być w QR (tylko dla testów)
+        "token": session.token,
+        "pin": session.pin,
+        "nonce": session.nonce,  # Nonce jest zwracany, ale nie powinien być w QR (tylko dla testów)
         "qr_data": qr_data,  # QR zawiera token:nonce
-        "expires_at": expires_at,
+        "expires_at": session.expires_at,
         "expires_in_seconds": PAIRING_TIMEOUT_SECONDS
     }
 
@@ -675,37 +1346,43 @@ async def get_qr_code_image(request: Request, token: str):
     if not re.match(r'^[A-Za-z0-9_-]+$', token):
         raise HTTPException(status_code=400, detail="Invalid token format")
     
-    if token not in pairing_sessions:
+    session = pairing_sessions.get(token)
+    if session is None:
         raise HTTPException(status_code=404, detail="Token not found or expired")
     
-    session = pairing_sessions[token]
-    if time.time() > session["expires_at"]:
+    if time.time() > session.expires_at:
         raise HTTPException(status_code=410, detail="Token expired")
     
     # QR code zawiera token:nonce dla bezpieczeństwa
-    qr_data = f"{token}:{session['nonce']}"
+    qr_data = f"{token}:{session.nonce}"
     
+    # qrcode/PIL importowane dopiero tutaj - nie spowalniają zimnego startu innych endpointów
+    import qrcode
+
     # Generuj QR code z kolorami projektu gov.pl
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    
-    # Kolory projektu: niebieski (#0a4d9c) zamiast czarnego, białe tło
-    # Używamy RGB tuple zamiast nazw kolorów dla lepszej kontroli
-    img = qr.make_image(
-        fill_color=(10, 77, 156),  # --blue: #0a4d9c
-        back_color=(255, 255, 255)  # białe tło
-    )
+    with span("qr_encode"):
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
+        )
+        qr.add_data(qr_data)
+        qr.make(fit=True)
     
-    # Konwertuj do bytes
-    img_bytes = io.BytesIO()
-    img.save(img_bytes, format='PNG')
-    img_bytes.seek(0)
+    with span("qr_render"):
+        # Kolory projektu: niebieski (#0a4d9c) zamiast czarnego, białe tło
+        # Używamy RGB tuple zamiast nazw kolorów dla lepszej kontroli
+        img = qr.make_image(
+            fill_color=(10, 77, 156),  # --blue: #0a4d9c
+            back_color=(255, 255, 255)  # białe tło
+        )
+        
+        # Konwertuj do bytes
+        img_bytes = io.BytesIO()
+        img.save(img_bytes, format='PNG')
+        img_bytes.seek(0)
+    QR_RENDERS.inc()
     
     # Zwróć obraz z odpowiednimi nagłówkami CORS
     return Response(
@@ -728,18 +1405,18 @@ async def get_pairing_status(request: Request, token: str):
     if not re.match(r'^[A-Za-z0-9_-]+$', token):
         raise HTTPException(status_code=400, detail="Invalid token format")
     
-    if token not in pairing_sessions:
+    session = pairing_sessions.get(token)
+    if session is None:
         raise HTTPException(status_code=404, detail="Token not found or expired")
     
-    session = pairing_sessions[token]
     current_time = time.time()
     
-    if current_time > session["expires_at"]:
-        session["status"] = "expired"
+    if current_time > session.expires_at:
+        session.status = PAIRING_EXPIRED
         return {
             "token": token,
-            "pin": session.get("pin"),
-            "status": "expired",
+            "pin": session.pin,
+            "status": PAIRING_EXPIRED,
             "message": "Token wygasł",
             "verification_result": {
                 "verified": False,
@@ -748,19 +1425,19 @@ async def get_pairing_status(request: Request, token: str):
             }
         }
     
-    remaining_seconds = int(session["expires_at"] - current_time)
+    remaining_seconds = int(session.expires_at - current_time)
     
     # Przygotuj wynik weryfikacji
     verification_result = None
-    if session["status"] == "confirmed":
+    if session.status == PAIRING_CONFIRMED:
         verification_result = {
             "verified": True,
             "message": "Strona jest zaufana i zweryfikowana.",
             "severity": "success",
-            "device_name": session.get("device_name"),
-            "verified_at": session.get("confirmed_at")
+            "device_name": session.device_name,
+            "verified_at": session.confirmed_at
         }
-    elif session["status"] == "pending":
+    elif session.status == PAIRING_PENDING:
         verification_result = {
             "verified": False,
             "message": "Oczekiwanie na weryfikację...",
@@ -769,12 +1446,12 @@ async def get_pairing_status(request: Request, token: str):
     
     return {
         "token": token,
-        "pin": session.get("pin"),
-        "status": session["status"],
+        "pin": session.pin,
+        "status": session.status,
         "remaining_seconds": remaining_seconds,
-        "device_id": session.get("device_id"),
-        "device_name": session.get("device_name"),
-        "confirmed_at": session.get("confirmed_at"),
+        "device_id": session.device_id,
+        "device_name": session.device_name,
+        "confirmed_at": session.confirmed_at,
         "verification_result": verification_result
     }
 
@@ -789,13 +1466,15 @@ async def confirm_pairing(request: Request, confirm: PairingConfirm):
     if confirm.token:
         token = confirm.token
     elif confirm.pin:
-        if confirm.pin not in pin_to_token:
+        token = pairing_sessions.token_for_pin(confirm.pin)
+        if token is None:
+            # Nieudana próba PIN-u (sam PIN nie trafia do dziennika)
+            audit("pairing_pin_failed", client=get_client_ip(request), device_id=confirm.device_id)
             raise HTTPException(
                 status_code=404, 
                 detail="PIN not found or expired",
                 headers={"X-Verification-Result": "error"}
             )
-        token = pin_to_token[confirm.pin]
     else:
         raise HTTPException(
             status_code=400, 
@@ -803,63 +1482,45 @@ async def confirm_pairing(request: Request, confirm: PairingConfirm):
             headers={"X-Verification-Result": "error"}
         )
     
-    if token not in pairing_sessions:
-        raise HTTPException(
-            status_code=404, 
-            detail="Token not found or expired",
-            headers={"X-Verification-Result": "error"}
+    # Sprawdzenie sesji, zużycie nonce (ochrona przed replay attacks), zmiana statusu
+    # i zwolnienie PIN-u odbywają się atomowo pod blokadą sesji
+    try:
+        session = pairing_sessions.confirm(
+            token,
+            nonce=confirm.nonce if confirm.token else None,
+            device_id=confirm.device_id,
+            device_name=confirm.device_name,
         )
-    
-    session = pairing_sessions[token]
-    current_time = time.time()
-    
-    if current_time > session["expires_at"]:
-        session["status"] = "expired"
-        raise HTTPException(
-            status_code=410, 
-            detail="Token expired",
-            headers={"X-Verification-Result": "expired"}
+    except ConfirmRejected as exc:
+        audit(
+            "pairing_rejected",
+            reason=exc.reason,
+            token_ref=token_ref(token),
+            method="qr" if confirm.token else "pin",
+            client=get_client_ip(request),
+            device_id=confirm.device_id,
         )
-    
-    if session["status"] == "confirmed":
+        status_code, detail, result = CONFIRM_ERRORS[exc.reason]
         raise HTTPException(
-            status_code=400, 
-            detail="Pairing already confirmed",
-            headers={"X-Verification-Result": "already_confirmed"}
+            status_code=status_code,
+            detail=detail,
+            headers={"X-Verification-Result": result}
         )
     
-    # WALIDACJA NONCE - ochrona przed replay attacks
-    if confirm.token and confirm.nonce:
-        # Jeśli użyto QR code (token + nonce), sprawdź nonce
-        if session.get("nonce_used", False):
-            raise HTTPException(
-                status_code=400,
-                detail="Nonce already used - this QR code was already scanned",
-                headers={"X-Verification-Result": "nonce_used"}
-            )
-        
-        if session.get("nonce") != confirm.nonce:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid nonce - QR code may be invalid or tampered",
-                headers={"X-Verification-Result": "invalid_nonce"}
-            )
-        
-        # Oznacz nonce jako użyty
-        session["nonce_used"] = True
-    
-    # Potwierdź parowanie
-    session["status"] = "confirmed"
-    session["confirmed_at"] = current_time
-    session["device_id"] = confirm.device_id
-    session["device_name"] = confirm.device_name
-    
+    audit(
+        "pairing_confirmed",
+        token_ref=token_ref(token),
+        method="qr" if confirm.token else "pin",
+        client=get_client_ip(request),
+        device_id=confirm.device_id,
+        device_name=confirm.device_name,
+    )
     return {
         "success": True,
         "token": token,
-        "pin": session.get("pin"),
+        "pin": session.pin,
         "message": "Pairing confirmed successfully",
-        "confirmed_at": current_time,
+        "confirmed_at": session.confirmed_at,
         "verification_result": {
             "verified": True,
             "message": "Strona jest zaufana i zweryfikowana",
@@ -882,5 +1543,7 @@ if ASSETS_DIR.exists() and not (FRONTEND_DIR / "assets").exists():
     app.mount("/assets", StaticFiles(directory=str(ASSETS_DIR)), name="assets_original")
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8001)
 
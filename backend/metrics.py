@@ -0,0 +1,310 @@
+"""Prometheus-compatible metrics for the m-verify backend.
+
+Only the small subset of the exposition format the service needs is
+implemented: counters, histograms and callback metrics whose values are read
+at scrape time (table sizes). Recording a value takes one uncontended lock per
+metric, so instrumentation is cheap on the request path.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# 1 = /metrics bez tokenu administratora (np. scrape tylko z sieci wewnętrznej)
+DEFAULT_METRICS_PUBLIC = (os.getenv("MVERIFY_METRICS_PUBLIC", "0") or "0") != "0"
+
+# id(app) -> {endpoint: route path}, built lazily on the first request
+_ROUTE_TEMPLATES: Dict[int, Dict[object, str]] = {}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def route_template(scope) -> str:
+    """Return the path template of the route matched for an ASGI scope.
+
+    Only valid once routing has run (after the inner app was called). Falls
+    back to ``"unmatched"`` so that unknown URLs do not create new label values.
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    app = scope.get("app")
+    templates = _ROUTE_TEMPLATES.get(id(app))
+    if templates is None:
+        routes = getattr(app, "routes", [])
+        templates = _ROUTE_TEMPLATES[id(app)] = {
+            getattr(route, "endpoint", None) or route.app: route.path for route in routes
+        }
+    return templates.get(endpoint, "unmatched")
+
+
+class MetricsRegistry:
+    """Holds metrics in registration order and renders them for scraping."""
+
+    def __init__(self) -> None:
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric") -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        *,
+        registry: Optional[MetricsRegistry] = REGISTRY,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def samples(self) -> Iterable[str]:  # pragma: no cover - interface
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def value(self, labels: LabelValues = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket..., count in +Inf], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][index] += 1
+            state[1][0] += value
+
+    def time(self, labels: LabelValues = ()) -> "_Timer":
+        """Context manager observing the duration of the wrapped block."""
+        return _Timer(self, labels)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: Histogram, labels: LabelValues) -> None:
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._started, self._labels)
+
+
+class CallbackMetric(_Metric):
+    """Metric whose values are computed by callbacks when scraped."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), *, kind: str = "gauge", **kwargs) -> None:
+        super().__init__(name, help, labelnames, **kwargs)
+        self.kind = kind
+        self._callbacks: Dict[LabelValues, Callable[[], float]] = {}
+
+    def track(self, labels: LabelValues, callback: Callable[[], float]) -> None:
+        self._callbacks[labels] = callback
+
+    def samples(self) -> Iterable[str]:
+        for labels, callback in list(self._callbacks.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(callback())}"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts and latency per route template.
+
+    Requests are labelled with the matched route's path (``/api/pairing/status/{token}``)
+    rather than the raw URL so the number of series stays bounded.
+    """
+
+    def __init__(self, app, *, requests: Counter, latency: Histogram) -> None:
+        self.app = app
+        self.requests = requests
+        self.latency = latency
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = route_template(scope)
+            self.latency.observe(elapsed, (scope["method"], route))
+            self.requests.inc((scope["method"], route, str(status[0])))
+
+
+# Metryki wspólne dla modułów backendu
+HTTP_REQUESTS = Counter(
+    "mverify_http_requests_total",
+    "HTTP requests by method, route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = Histogram(
+    "mverify_http_request_duration_seconds",
+    "HTTP request latency by method and route template.",
+    ("method", "route"),
+)
+REGISTRY_LOADS = Counter(
+    "mverify_registry_loads_total",
+    "Domain dataset loads and refreshes by loader and outcome.",
+    ("loader", "outcome"),
+)
+REGISTRY_LOAD_SECONDS = Histogram(
+    "mverify_registry_load_duration_seconds",
+    "Time spent loading and indexing the domain dataset.",
+    ("loader",),
+)
+REGISTRY_ENTRIES = CallbackMetric(
+    "mverify_registry_entries",
+    "Number of domains held by each loader.",
+    ("loader",),
+)
+SESSION_TABLE_SIZE = CallbackMetric(
+    "mverify_session_table_size",
+    "Number of entries in the in-memory session tables.",
+    ("table",),
+)
+SESSION_TABLE_REMOVALS = CallbackMetric(
+    "mverify_session_table_removals_total",
+    "Entries removed from bounded session tables by reason.",
+    ("table", "reason"),
+    kind="counter",
+)
+CLEANUP_SECONDS = Histogram(
+    "mverify_cleanup_duration_seconds",
+    "Time spent expiring entries from the session tables.",
+    ("table",),
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0),
+)
+QR_RENDERS = Counter(
+    "mverify_qr_renders_total",
+    "Pairing QR code images rendered.",
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "mverify_rate_limit_rejections_total",
+    "Requests rejected by rate limiting or admission control.",
+    ("limit",),
+)
+TLS_CHECKS = Counter(
+    "mverify_tls_checks_total",
+    "TLS certificate inspections by how they were answered (handshake outcome, cache hit, shared in-flight).",
+    ("outcome",),
+)
+DNS_LOOKUPS = Counter(
+    "mverify_dns_lookups_total",
+    "DNS resolution checks by how they were answered (resolver outcome, cache hit, shared in-flight).",
+    ("outcome",),
+)
+BLOCKLIST_MATCHES = Counter(
+    "mverify_blocklist_matches_total",
+    "Verified hosts found on the phishing blocklist (the host itself or a parent domain).",
+)
+AUDIT_EVENTS = Counter(
+    "mverify_audit_events_total",
+    "Audit log events by outcome (written in a group commit, dropped on a full queue, failed write).",
+    ("outcome",),
+)
+AUDIT_QUEUE_DEPTH = CallbackMetric(
+    "mverify_audit_queue_depth",
+    "Audit events waiting for the background writer.",
+)
+AUDIT_WRITE_SECONDS = Histogram(
+    "mverify_audit_write_duration_seconds",
+    "Time spent writing one batch of audit events, including fsync/commit.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
@@ -0,0 +1,115 @@
+"""Incremental reader for dane.gov.pl JSON:API payloads.
+
+``json.load`` needs the whole document (and, for HTTP responses, a decoded
+copy of the body) in memory before the first row can be indexed. This reader
+walks the top-level object from a text stream instead and yields the
+elements of ``data[]`` one at a time, so peak memory stays at roughly one
+chunk plus one row regardless of payload size. The remaining top-level
+members (``meta``, ``links``, ...) are small and are collected in ``fields``.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, Iterator, TextIO
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+class StreamedPayload:
+    """Streams ``data[]`` rows out of a JSON:API document.
+
+    ``fields`` holds the other top-level members; members that follow
+    ``data`` in the document are only available once ``rows()`` is exhausted.
+    """
+
+    def __init__(self, handle: TextIO, *, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        self._handle = handle
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self.fields: Dict[str, Any] = {}
+
+    def rows(self) -> Iterator[Dict]:
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == "data" and self._peek() == "[":
+                self._pos += 1
+                yield from self._array_items()
+            else:
+                self.fields[key] = self._value()
+
+            separator = self._next_char()
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Nieprawidłowy JSON: oczekiwano ',' lub '}}', otrzymano {separator!r}")
+
+    def _array_items(self) -> Iterator[Any]:
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            separator = self._next_char()
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Nieprawidłowy JSON: oczekiwano ',' lub ']', otrzymano {separator!r}")
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        # Read at least as much as is already buffered so a large value costs
+        # a logarithmic number of re-parse attempts.
+        chunk = self._handle.read(max(self._chunk_size, len(self._buffer) - self._pos))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _whitespace.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def _next_char(self) -> str:
+        char = self._peek()
+        self._pos += 1
+        return char
+
+    def _expect(self, char: str) -> None:
+        found = self._next_char()
+        if found != char:
+            raise ValueError(f"Nieprawidłowy JSON: oczekiwano {char!r}, otrzymano {found!r}")
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal ending exactly at the buffer edge may continue in the next chunk.
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
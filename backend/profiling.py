@@ -0,0 +1,126 @@
+"""Opt-in per-request profiling for diagnosing slow endpoints.
+
+Profiling is enabled only when ``MVERIFY_PROFILE_DIR`` is set together with an
+authentication token (``MVERIFY_PROFILE_TOKEN``) and/or a sampling rate
+(``MVERIFY_PROFILE_SAMPLE_RATE``). When it is disabled the middleware is never
+installed, so requests pay nothing for it.
+
+A request is profiled when it carries ``X-Mverify-Profile: <token>`` or when it
+is picked by the sampler. The profile is written in ``pstats`` format to
+``<dir>/<timestamp>_<method>_<route>_<ms>ms_<id>.pstats``, where ``<ms>`` is the
+time until the response started. Files can be inspected with
+``python -m pstats`` or converted to a flame graph (e.g. with flameprof or
+snakeviz).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from backend.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = os.getenv("MVERIFY_PROFILE_DIR")
+DEFAULT_PROFILE_TOKEN = os.getenv("MVERIFY_PROFILE_TOKEN")
+DEFAULT_PROFILE_SAMPLE_RATE = float(os.getenv("MVERIFY_PROFILE_SAMPLE_RATE", "0") or "0")
+
+PROFILE_HEADER = b"x-mverify-profile"
+PROFILE_FILE_HEADER = b"x-mverify-profile-file"
+
+
+def profiling_enabled(
+    output_dir: Optional[str] = DEFAULT_PROFILE_DIR,
+    token: Optional[str] = DEFAULT_PROFILE_TOKEN,
+    sample_rate: float = DEFAULT_PROFILE_SAMPLE_RATE,
+) -> bool:
+    return bool(output_dir) and (bool(token) or sample_rate > 0)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware wrapping selected requests in ``cProfile``.
+
+    cProfile is per-thread and the event loop interleaves coroutines, so a
+    profile may also contain frames of requests that ran concurrently. Only one
+    request is profiled at a time; others arriving meanwhile are served
+    normally.
+    """
+
+    def __init__(
+        self,
+        app,
+        *,
+        output_dir: str,
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+    ) -> None:
+        self.app = app
+        self.output_dir = Path(output_dir)
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = self._requested(scope)
+        if not (requested or (self.sample_rate and random.random() < self.sample_rate)):
+            await self.app(scope, receive, send)
+            return
+
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        import cProfile
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        path: list = []
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                # Trasa jest już dopasowana; czas w nazwie to czas do startu odpowiedzi
+                path.append(self._profile_path(scope, (time.perf_counter() - started) * 1000))
+                if requested:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [(PROFILE_FILE_HEADER, path[0].name.encode())]
+            await send(message)
+
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+                if not path:
+                    path.append(self._profile_path(scope, (time.perf_counter() - started) * 1000))
+                await asyncio.get_running_loop().run_in_executor(None, profiler.dump_stats, str(path[0]))
+                logger.info("Zapisano profil %s", path[0])
+        finally:
+            self._busy.release()
+
+    def _requested(self, scope) -> bool:
+        if not self.token:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER:
+                return secrets.compare_digest(value, self.token)
+        return False
+
+    def _profile_path(self, scope, elapsed_ms: float) -> Path:
+        route = re.sub(r"[^A-Za-z0-9]+", "-", route_template(scope)).strip("-") or "root"
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        return self.output_dir / f"{stamp}_{scope['method']}_{route}_{elapsed_ms:.0f}ms_{secrets.token_hex(3)}.pstats"
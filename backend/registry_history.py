@@ -0,0 +1,157 @@
+"""Bounded history of registry snapshot versions for delta sync.
+
+Mirrors (the compendium page, the mobile app, partner systems) remember the
+version of the snapshot they hold, the same content hash the export sends
+as ``X-Export-Version``. ``RegistryHistory`` keeps the change set between
+each pair of consecutive snapshots, not the snapshots themselves, so memory
+and the cost of answering ``changes_since`` scale with the rate of change
+rather than with the size of the registry.
+
+The history is per process and bounded both by the number of versions and
+by the total number of recorded changes. A version that was trimmed, or one
+this process never saw (e.g. a worker started after it was replaced), has no
+delta and the client is asked to resync from the full export.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Mapping, NamedTuple, Optional, Tuple
+
+DEFAULT_HISTORY_VERSIONS = int(os.getenv("MVERIFY_REGISTRY_HISTORY_VERSIONS", "32") or "32")
+DEFAULT_HISTORY_MAX_CHANGES = int(os.getenv("MVERIFY_REGISTRY_HISTORY_MAX_CHANGES", "200000") or "200000")
+
+# Category of a domain in one snapshot; _MISSING when the domain is not listed.
+_MISSING = object()
+
+
+class SnapshotDelta(NamedTuple):
+    """Changes that turn snapshot ``previous`` into snapshot ``version``."""
+
+    previous: str
+    version: str
+    recorded_at: float
+    # domain -> (category before, category after); _MISSING marks a domain added or removed
+    changes: Dict[str, Tuple[Any, Any]]
+
+
+class RegistryHistory:
+    """Deltas between the last snapshots seen by this process."""
+
+    def __init__(
+        self,
+        *,
+        max_versions: int = DEFAULT_HISTORY_VERSIONS,
+        max_changes: int = DEFAULT_HISTORY_MAX_CHANGES,
+    ) -> None:
+        self.max_versions = max_versions
+        self.max_changes = max_changes
+        self.version: Optional[str] = None
+        self._current: Mapping[str, Optional[str]] = {}
+        self._deltas: Deque[SnapshotDelta] = deque()
+        self._change_count = 0
+        self._lock = threading.Lock()
+
+    def record(self, version: str, domain_categories: Mapping[str, Optional[str]]) -> None:
+        """Register the snapshot now being served; a repeated version is a no-op."""
+        with self._lock:
+            if version == self.version:
+                return
+            if self.version is not None:
+                self._append(SnapshotDelta(self.version, version, time.time(), diff(self._current, domain_categories)))
+            self.version = version
+            self._current = domain_categories
+
+    def _append(self, delta: SnapshotDelta) -> None:
+        self._deltas.append(delta)
+        self._change_count += len(delta.changes)
+        while self._deltas and (len(self._deltas) > self.max_versions or self._change_count > self.max_changes):
+            self._change_count -= len(self._deltas.popleft().changes)
+
+    def changes_since(self, since: str) -> Optional[Dict[str, Any]]:
+        """Net added/removed/recategorized domains between ``since`` and the current snapshot.
+
+        Returns None when ``since`` is not in the history, or when the net
+        changes touch more than half of the registry and the full export is
+        the cheaper way to bring the client up to date.
+        """
+        with self._lock:
+            version, current, deltas = self.version, self._current, list(self._deltas)
+        if version is None:
+            return None
+        if since == version:
+            return {"since": since, "version": version, "added": [], "removed": [], "changed": []}
+        start = next((index for index, delta in enumerate(deltas) if delta.previous == since), None)
+        if start is None:
+            return None
+
+        # Category each touched domain had at `since`: the "before" side of its first change.
+        before: Dict[str, Any] = {}
+        for delta in deltas[start:]:
+            for domain, (old, _new) in delta.changes.items():
+                before.setdefault(domain, old)
+
+        if len(before) > len(current) // 2 + 1:
+            return None
+
+        added, removed, changed = [], [], []
+        for domain in sorted(before):
+            old = before[domain]
+            new = current.get(domain, _MISSING)
+            if old is _MISSING and new is not _MISSING:
+                added.append({"domain": domain, "category": new})
+            elif new is _MISSING and old is not _MISSING:
+                removed.append(domain)
+            elif old != new:
+                changed.append({"domain": domain, "category": new, "previous_category": old})
+        return {"since": since, "version": version, "added": added, "removed": removed, "changed": changed}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"version": self.version, "versions": len(self._deltas) + (self.version is not None), "changes": self._change_count}
+
+
+def diff(old: Mapping[str, Optional[str]], new: Mapping[str, Optional[str]]) -> Dict[str, Tuple[Any, Any]]:
+    """Per-domain (before, after) categories for every domain that differs between two snapshots.
+
+    Mappings that iterate in sorted key order (``sorted_keys = True``, e.g.
+    the compendium's views over a mapped snapshot) are merged in one pass
+    instead of looking every domain up in the other snapshot.
+    """
+    if getattr(old, "sorted_keys", False) and getattr(new, "sorted_keys", False):
+        return _diff_sorted(old, new)
+    changes: Dict[str, Tuple[Any, Any]] = {}
+    added = 0
+    for domain, category in new.items():
+        previous = old.get(domain, _MISSING)
+        if previous is _MISSING:
+            added += 1
+            changes[domain] = (previous, category)
+        elif previous != category:
+            changes[domain] = (previous, category)
+    if len(old) > len(new) - added:
+        # Some old domains are gone; only then is the second pass over the old snapshot needed.
+        for domain, category in old.items():
+            if domain not in new:
+                changes[domain] = (category, _MISSING)
+    return changes
+
+
+def _diff_sorted(old: Mapping[str, Optional[str]], new: Mapping[str, Optional[str]]) -> Dict[str, Tuple[Any, Any]]:
+    changes: Dict[str, Tuple[Any, Any]] = {}
+    old_items, new_items = iter(old.items()), iter(new.items())
+    before, after = next(old_items, None), next(new_items, None)
+    while before is not None or after is not None:
+        if after is None or (before is not None and before[0] < after[0]):
+            changes[before[0]] = (before[1], _MISSING)
+            before = next(old_items, None)
+        elif before is None or after[0] < before[0]:
+            changes[after[0]] = (_MISSING, after[1])
+            after = next(new_items, None)
+        else:
+            if before[1] != after[1]:
+                changes[after[0]] = (before[1], after[1])
+            before, after = next(old_items, None), next(new_items, None)
+    return changes
@@ -0,0 +1,286 @@
+"""Host-wide, memory-mapped snapshot of the gov.pl domain registry.
+
+Every uvicorn worker building its own registry multiplies memory use and
+refresh work by the worker count. With a snapshot file, one process per host
+(whichever wins the ``flock`` on ``<snapshot>.lock``, or a deploy step running
+``python -m backend.registry_snapshot``) builds the index once and publishes
+it with an atomic rename. Workers ``mmap`` the file read-only, so the pages
+live once in the page cache, and attach to a newer file when one appears.
+
+File layout (native byte order, recorded in the header)::
+
+    magic(8) | header_len u32 | count u32 | header JSON (padded to 8)
+    | offsets u64[count + 1] | sorted index u32[count]
+    | views (each padded to 8) | records
+
+Records keep the registry's entry order and hold the entry fields separated
+by ``\\x1f``; the sorted index lists record numbers ordered by domain for
+binary search. Views are named arrays derived from the entries (e.g. the
+compendium's sorted domain lists, see ``backend.compendium``), stored here so
+that workers map them instead of each building its own copy; the header
+lists their names, typecodes and lengths.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MVREG03\0"
+FIELDS = ("domain", "display_name", "category", "zone", "last_seen_at", "source_link")
+
+_PREAMBLE = struct.Struct("=8sII")
+_SEPARATOR = b"\x1f"
+_NONE = "\x00"
+
+
+def shared_snapshots_supported() -> bool:
+    return fcntl is not None
+
+
+def _encode_record(entry: Dict) -> bytes:
+    values = (_NONE if entry.get(field) is None else str(entry[field]) for field in FIELDS)
+    return _SEPARATOR.join(value.encode("utf-8") for value in values)
+
+
+def write_snapshot(
+    path: Path,
+    entries: Sequence[Dict],
+    *,
+    categories: List[str],
+    meta: Dict[str, Optional[str]],
+    origin: Optional[str],
+    zones: Optional[Dict[str, Dict]] = None,
+    source_digests: Optional[Dict[str, str]] = None,
+    views: Optional[Dict[str, array]] = None,
+) -> int:
+    """Write ``entries`` (and the ``views`` derived from them) to ``path`` atomically; return the snapshot version."""
+    path = Path(path)
+    version = time.time_ns()
+
+    offsets = array("Q", [0])
+    records = bytearray()
+    for entry in entries:
+        records += _encode_record(entry)
+        offsets.append(len(records))
+
+    order = sorted(range(len(entries)), key=lambda index: entries[index]["domain"].encode("utf-8"))
+    sorted_index = array("I", order)
+    views = views or {}
+
+    header = json.dumps({
+        "version": version,
+        "byteorder": sys.byteorder,
+        "categories": categories,
+        "meta": meta,
+        "origin": origin,
+        "zones": zones or {},
+        "source_digests": source_digests or {},
+        "views": [[name, view.typecode, len(view)] for name, view in views.items()],
+    }).encode("utf-8")
+    header += b" " * (-(_PREAMBLE.size + len(header)) % 8)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(_PREAMBLE.pack(MAGIC, len(header), len(entries)))
+            handle.write(header)
+            handle.write(offsets.tobytes())
+            handle.write(sorted_index.tobytes())
+            handle.write(b"\0" * (-len(sorted_index) * 4 % 8))
+            for view in views.values():
+                data = view.tobytes()
+                handle.write(data)
+                handle.write(b"\0" * (-len(data) % 8))
+            handle.write(records)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    return version
+
+
+class _Entries(Sequence):
+    """Read-only sequence view decoding records on access."""
+
+    def __init__(self, snapshot: "MappedSnapshot") -> None:
+        self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._snapshot.record(i) for i in range(*index.indices(self._snapshot.count))]
+        if index < 0:
+            index += self._snapshot.count
+        if not 0 <= index < self._snapshot.count:
+            raise IndexError(index)
+        return self._snapshot.record(index)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(self._snapshot.count):
+            yield self._snapshot.record(index)
+
+
+class MappedSnapshot:
+    """Read-only view of a snapshot file.
+
+    The mapping is released when the last reference goes away, so a reader
+    still holding a replaced snapshot keeps a valid view of the old file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as handle:
+            stat = os.fstat(handle.fileno())
+            self._mm = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+
+        magic, header_len, count = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} nie jest plikiem snapshotu rejestru domen")
+        header_end = _PREAMBLE.size + header_len
+        header = json.loads(self._mm[_PREAMBLE.size:header_end])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"Snapshot {self.path} zapisano z inną kolejnością bajtów")
+
+        self.count = count
+        self.version: int = header["version"]
+        self.categories: List[str] = header["categories"]
+        self.meta: Dict[str, Optional[str]] = header["meta"]
+        self.origin: Optional[str] = header["origin"]
+        # Per-zone metadata and content hashes of the local source files the snapshot was built from
+        self.zones: Dict[str, Dict] = header["zones"]
+        self.source_digests: Dict[str, str] = header["source_digests"]
+
+        view = memoryview(self._mm)
+        offsets_end = header_end + 8 * (count + 1)
+        index_end = offsets_end + 4 * count
+        self._offsets = view[header_end:offsets_end].cast("Q")
+        self._sorted = view[offsets_end:index_end].cast("I")
+        position = index_end + (-index_end % 8)
+        # name -> read-only array view into the mapping
+        self.views: Dict[str, memoryview] = {}
+        for name, typecode, length in header["views"]:
+            end = position + array(typecode).itemsize * length
+            self.views[name] = view[position:end].cast(typecode)
+            position = end + (-end % 8)
+        self._records_start = position
+        self.entries = _Entries(self)
+
+    @property
+    def built_at(self) -> float:
+        return self.version / 1e9
+
+    def record(self, index: int) -> Dict:
+        start = self._records_start + self._offsets[index]
+        end = self._records_start + self._offsets[index + 1]
+        values = self._mm[start:end].decode("utf-8").split("\x1f")
+        return {field: (None if value == _NONE else value) for field, value in zip(FIELDS, values)}
+
+    def domain(self, index: int) -> str:
+        """Domain of record ``index`` without decoding the other fields."""
+        return self._domain_at(index).decode("utf-8")
+
+    def _domain_at(self, index: int) -> bytes:
+        start = self._records_start + self._offsets[index]
+        end = self._mm.find(_SEPARATOR, start, self._records_start + self._offsets[index + 1])
+        return self._mm[start:end]
+
+    def get(self, domain: str) -> Optional[Dict]:
+        key = domain.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._domain_at(self._sorted[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._domain_at(self._sorted[low]) == key:
+            return self.record(self._sorted[low])
+        return None
+
+    def __contains__(self, domain: str) -> bool:
+        return self.get(domain) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def snapshot_identity(path: Path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+
+
+@contextmanager
+def builder_lock(path: Path, *, blocking: bool) -> Iterator[bool]:
+    """Hold the host-wide builder lock for ``path``; yields False if it is taken."""
+    lock_path = Path(f"{path}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a") as handle:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(handle.fileno(), flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def main() -> None:
+    """Build a snapshot at deploy time: ``python -m backend.registry_snapshot --output ...``."""
+    from backend.compendium import compendium_views
+    from backend.domain_registry import DomainRegistry
+
+    parser = argparse.ArgumentParser(description="Zbuduj snapshot rejestru domen gov.pl")
+    parser.add_argument("--source", type=Path, default=Path(__file__).resolve().parent.parent / "assets" / "gov.json")
+    parser.add_argument("--output", type=Path, required=True)
+    args = parser.parse_args()
+
+    state = DomainRegistry(args.source, snapshot_path=None, watch=False).snapshot
+    version = write_snapshot(
+        args.output,
+        state.entries,
+        categories=state.categories,
+        meta=state.meta,
+        origin=state.origin,
+        zones=state.zones,
+        views=compendium_views(state.entries, shared=True),
+    )
+    print(f"Zapisano {len(state.entries)} domen do {args.output} (wersja {version})")
+
+
+if __name__ == "__main__":
+    main()
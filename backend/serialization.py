@@ -0,0 +1,39 @@
+"""Fast JSON encoding helpers for read-only endpoints.
+
+Uses ``orjson`` when it is installed and falls back to the standard library
+otherwise. Handlers that build responses from pre-encoded fragments return
+``JSONBytesResponse`` so FastAPI does not re-validate or re-encode them.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+JSON_TRUE = b"true"
+JSON_FALSE = b"false"
+JSON_NULL = b"null"
+
+
+def dumps(value: Any) -> bytes:
+    """Encode ``value`` as compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_bool(value: bool) -> bytes:
+    return JSON_TRUE if value else JSON_FALSE
+
+
+class JSONBytesResponse(Response):
+    """Response whose content is already-encoded JSON bytes."""
+
+    media_type = "application/json"
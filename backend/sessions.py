@@ -0,0 +1,372 @@
+"""In-memory session tables used by the trust and pairing flows."""
+
+from __future__ import annotations
+
+import ipaddress
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple, Union
+
+DEFAULT_TRUST_SESSIONS_MAX = int(os.getenv("TRUST_SESSIONS_MAX", "10000") or "10000")
+DEFAULT_TRUST_SESSIONS_PER_CLIENT = int(os.getenv("TRUST_SESSIONS_PER_CLIENT", "5") or "5")
+# Proxy (adresy lub sieci, np. "10.0.0.0/8,127.0.0.1"), którym wolno podać adres klienta w X-Forwarded-For
+DEFAULT_TRUSTED_PROXIES = os.getenv("MVERIFY_TRUSTED_PROXIES", "")
+DEFAULT_PAIRING_LOCK_STRIPES = int(os.getenv("PAIRING_LOCK_STRIPES", "64") or "64")
+# Limit sesji z zajętym PIN-em: 10% z 10^6 PIN-ów, więc losowanie wolnego PIN-u trafia zwykle za pierwszym razem
+DEFAULT_PAIRING_SESSIONS_MAX = int(os.getenv("PAIRING_SESSIONS_MAX", "100000") or "100000")
+
+PIN_SPACE = 1000000
+# Upper bound on random draws per PIN; with the table at its cap a draw fails with p <= 0.1.
+PIN_ATTEMPTS = 32
+
+# Pairing statuses are module-level constants so every session shares the same
+# string objects instead of carrying its own copy.
+PAIRING_PENDING = "pending"
+PAIRING_CONFIRMED = "confirmed"
+PAIRING_EXPIRED = "expired"
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# Reasons reported by AdmissionRejected for the trust table.
+ADMISSION_TRUST_FULL = "trust_sessions"
+ADMISSION_TRUST_PER_CLIENT = "trust_sessions_per_client"
+
+# Reasons reported by ConfirmRejected; they double as X-Verification-Result values.
+CONFIRM_NOT_FOUND = "not_found"
+CONFIRM_EXPIRED = "expired"
+CONFIRM_ALREADY_CONFIRMED = "already_confirmed"
+CONFIRM_NONCE_USED = "nonce_used"
+CONFIRM_INVALID_NONCE = "invalid_nonce"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a session table (or a client's share of it) has no room for a new session."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+def parse_networks(value: str) -> Tuple[Network, ...]:
+    """Parse a comma-separated list of addresses and CIDR networks (``MVERIFY_TRUSTED_PROXIES``)."""
+    return tuple(ipaddress.ip_network(part.strip(), strict=False) for part in value.split(",") if part.strip())
+
+
+def _is_trusted(address: str, proxies: Iterable[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def admission_client(peer: Optional[str], forwarded_for: Optional[str], proxies: Tuple[Network, ...]) -> str:
+    """Address a session is admitted for.
+
+    The peer address, unless the peer is a trusted proxy: then the
+    right-most ``X-Forwarded-For`` hop that is not itself a trusted proxy.
+    Hops left of it were written by the client and are not believed.
+    """
+    client = peer or "unknown"
+    if not forwarded_for or not _is_trusted(client, proxies):
+        return client
+    for hop in reversed([hop.strip() for hop in forwarded_for.split(",") if hop.strip()]):
+        client = hop
+        if not _is_trusted(hop, proxies):
+            break
+    return client
+
+
+class ConfirmRejected(Exception):
+    """Raised by ``PairingSessionTable.confirm`` when a session cannot be confirmed."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class TrustSessionTable:
+    """Bounded table of trust verification sessions ordered by creation time.
+
+    Every session gets the same TTL, so insertion order is also expiry order:
+    expiring sessions only touches the expired prefix of the table instead of
+    scanning all of it. A single client can hold at most ``max_per_client``
+    live sessions, and once the table is full new sessions are rejected
+    rather than evicting live ones, so many clients cannot push out everyone
+    else's pending verifications.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: int,
+        max_sessions: int = DEFAULT_TRUST_SESSIONS_MAX,
+        max_per_client: int = DEFAULT_TRUST_SESSIONS_PER_CLIENT,
+    ) -> None:
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_sessions = max_sessions
+        self.max_per_client = max_per_client
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, dict]" = OrderedDict()
+        self._per_client: Dict[str, int] = {}
+
+        self.rejected = 0
+        self.rejected_full = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: object) -> bool:
+        return session_id in self._sessions
+
+    def get(self, session_id: str) -> Optional[dict]:
+        return self._sessions.get(session_id)
+
+    def add(self, session_id: str, payload: dict, *, client: str) -> None:
+        """Store a new session, enforcing the per-client and global limits."""
+        with self._lock:
+            self._expire_locked(datetime.utcnow())
+
+            if self._per_client.get(client, 0) >= self.max_per_client:
+                self.rejected += 1
+                raise AdmissionRejected(ADMISSION_TRUST_PER_CLIENT)
+
+            if len(self._sessions) >= self.max_sessions:
+                self.rejected_full += 1
+                raise AdmissionRejected(ADMISSION_TRUST_FULL)
+
+            payload["client"] = client
+            self._sessions[session_id] = payload
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+
+    def expire(self, now: Optional[datetime] = None) -> int:
+        """Drop sessions older than the TTL and return how many were removed."""
+        if not self._sessions:
+            return 0
+        with self._lock:
+            return self._expire_locked(now or datetime.utcnow())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._sessions),
+            "capacity": self.max_sessions,
+            "clients": len(self._per_client),
+            "rejected": self.rejected,
+            "rejected_full": self.rejected_full,
+            "expired": self.expired,
+        }
+
+    def _expire_locked(self, now: datetime) -> int:
+        cutoff = now - self.ttl
+        removed = 0
+        while self._sessions:
+            session_id, payload = next(iter(self._sessions.items()))
+            if payload["created_at"] >= cutoff:
+                break
+            del self._sessions[session_id]
+            self._release_client(payload["client"])
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def _release_client(self, client: str) -> None:
+        remaining = self._per_client.get(client, 0) - 1
+        if remaining > 0:
+            self._per_client[client] = remaining
+        else:
+            self._per_client.pop(client, None)
+
+
+class PairingSession:
+    """A single QR/PIN pairing session.
+
+    Slotted to keep per-session overhead small: the record itself takes about
+    100 bytes, against roughly 270 for a dict with the same keys.
+    """
+
+    __slots__ = (
+        "token",
+        "pin",
+        "nonce",
+        "nonce_used",
+        "status",
+        "expires_at",
+        "confirmed_at",
+        "device_id",
+        "device_name",
+    )
+
+    def __init__(self, token: str, pin: str, nonce: str, expires_at: float) -> None:
+        self.token = token
+        self.pin = pin
+        self.nonce = nonce
+        self.nonce_used = False
+        self.status = PAIRING_PENDING
+        self.expires_at = expires_at
+        self.confirmed_at: Optional[float] = None
+        self.device_id: Optional[str] = None
+        self.device_name: Optional[str] = None
+
+
+class PairingSessionTable:
+    """Pairing sessions indexed by token and by PIN.
+
+    Sessions share one timeout, so they expire in creation order; a deque of
+    tokens lets ``expire`` stop at the first live session instead of scanning
+    the whole table.
+
+    The table is safe to use from several threads. Structural changes (insert,
+    expiry, freeing a PIN) take a short table-wide lock, while state
+    transitions of a single session are serialized by one of a fixed set of
+    striped locks chosen by token hash, so confirms of different sessions do
+    not contend. Locks are always taken stripe first, table second.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout_seconds: int,
+        lock_stripes: int = DEFAULT_PAIRING_LOCK_STRIPES,
+        max_sessions: int = DEFAULT_PAIRING_SESSIONS_MAX,
+        on_expire: Optional[Callable[[PairingSession], None]] = None,
+    ) -> None:
+        self.timeout_seconds = timeout_seconds
+        self.max_sessions = min(max_sessions, PIN_SPACE)
+        # Called (outside the table lock) for every session that expired without being confirmed
+        self.on_expire = on_expire
+        self._sessions: Dict[str, PairingSession] = {}
+        self._pins: Dict[str, PairingSession] = {}
+        self._order: Deque[str] = deque()
+        self._lock = threading.Lock()
+        self._stripes: Tuple[threading.Lock, ...] = tuple(threading.Lock() for _ in range(max(lock_stripes, 1)))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, token: object) -> bool:
+        return token in self._sessions
+
+    def get(self, token: str) -> Optional[PairingSession]:
+        return self._sessions.get(token)
+
+    def token_for_pin(self, pin: str) -> Optional[str]:
+        session = self._pins.get(pin)
+        return session.token if session else None
+
+    def pin_count(self) -> int:
+        return len(self._pins)
+
+    def create(self, now: Optional[float] = None) -> PairingSession:
+        """Create a session with a fresh token, a unique PIN and a one-time nonce.
+
+        Raises AdmissionRejected when ``max_sessions`` PINs are in use or no
+        free PIN turned up within ``PIN_ATTEMPTS`` draws.
+        """
+        now = time.time() if now is None else now
+        token = secrets.token_urlsafe(32)
+        # Nonce (jednorazowy kod) dla QR - zapobiega replay attacks
+        nonce = secrets.token_urlsafe(16)
+        with self._lock:
+            if len(self._pins) >= self.max_sessions:
+                raise AdmissionRejected("pairing_sessions")
+            session = PairingSession(
+                token=token,
+                pin=self._generate_pin(),
+                nonce=nonce,
+                expires_at=now + self.timeout_seconds,
+            )
+            self._insert(session)
+        return session
+
+    def add(self, session: PairingSession) -> None:
+        with self._lock:
+            self._insert(session)
+
+    def confirm(
+        self,
+        token: str,
+        *,
+        nonce: Optional[str] = None,
+        device_id: Optional[str] = None,
+        device_name: Optional[str] = None,
+        now: Optional[float] = None,
+    ) -> PairingSession:
+        """Atomically check and confirm a session.
+
+        When ``nonce`` is given it must match the session's nonce and is
+        consumed. On success the session becomes confirmed and its PIN is
+        released, all under the session's lock. Raises ``ConfirmRejected``
+        otherwise.
+        """
+        with self._stripes[hash(token) % len(self._stripes)]:
+            session = self._sessions.get(token)
+            if session is None:
+                raise ConfirmRejected(CONFIRM_NOT_FOUND)
+
+            now = time.time() if now is None else now
+            if now > session.expires_at:
+                session.status = PAIRING_EXPIRED
+                raise ConfirmRejected(CONFIRM_EXPIRED)
+
+            if session.status == PAIRING_CONFIRMED:
+                raise ConfirmRejected(CONFIRM_ALREADY_CONFIRMED)
+
+            if nonce is not None:
+                if session.nonce_used:
+                    raise ConfirmRejected(CONFIRM_NONCE_USED)
+                if session.nonce != nonce:
+                    raise ConfirmRejected(CONFIRM_INVALID_NONCE)
+                session.nonce_used = True
+
+            session.status = PAIRING_CONFIRMED
+            session.confirmed_at = now
+            session.device_id = device_id
+            session.device_name = device_name
+
+            with self._lock:
+                if self._pins.get(session.pin) is session:
+                    del self._pins[session.pin]
+            return session
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop expired sessions (and their PINs) and return how many were removed."""
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            while self._order:
+                session = self._sessions.get(self._order[0])
+                if session is not None and now <= session.expires_at:
+                    break
+                self._order.popleft()
+                if session is not None:
+                    self._discard(session)
+                    expired.append(session)
+        if self.on_expire is not None:
+            for session in expired:
+                if session.status != PAIRING_CONFIRMED:
+                    self.on_expire(session)
+        return len(expired)
+
+    def _insert(self, session: PairingSession) -> None:
+        self._sessions[session.token] = session
+        self._pins[session.pin] = session
+        self._order.append(session.token)
+
+    def _discard(self, session: PairingSession) -> None:
+        self._sessions.pop(session.token, None)
+        if self._pins.get(session.pin) is session:
+            del self._pins[session.pin]
+
+    def _generate_pin(self) -> str:
+        """Generuje unikalny 6-cyfrowy kod PIN"""
+        for _ in range(PIN_ATTEMPTS):
+            pin = f"{secrets.randbelow(PIN_SPACE):06d}"  # 000000-999999
+            if pin not in self._pins:
+                return pin
+        raise AdmissionRejected("pairing_pins")
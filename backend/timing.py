@@ -0,0 +1,111 @@
+"""Lightweight per-request phase timing exposed as ``Server-Timing`` headers.
+
+Handlers wrap interesting phases in ``span("name")``. ``ServerTimingMiddleware``
+collects the spans of the current request in a context variable and emits them
+as a ``Server-Timing`` response header. The stage timings describe the
+service's internals, so the middleware is off unless ``MVERIFY_SERVER_TIMING=1``,
+and ``Timing-Allow-Origin`` (which lets other origins read the timings through
+the Performance API) is only sent for the origins listed in
+``MVERIFY_TIMING_ALLOW_ORIGIN``. With ``MVERIFY_TIMING_LOG=1`` every request
+is also logged as one JSON line.
+
+Outside of a request (scripts, benchmarks) ``span`` only checks the context
+variable and does nothing else.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from backend.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER_TIMING_ENABLED = (os.getenv("MVERIFY_SERVER_TIMING", "0") or "0") != "0"
+# Wartość nagłówka Timing-Allow-Origin (np. "https://www.gov.pl"); puste = nagłówek nie jest wysyłany
+DEFAULT_TIMING_ALLOW_ORIGIN = os.getenv("MVERIFY_TIMING_ALLOW_ORIGIN", "").strip() or None
+DEFAULT_TIMING_LOG_ENABLED = (os.getenv("MVERIFY_TIMING_LOG", "0") or "0") != "0"
+
+# name -> łączny czas w sekundach dla bieżącego żądania
+_spans: ContextVar[Optional[Dict[str, float]]] = ContextVar("mverify_spans", default=None)
+
+
+class span:
+    """Context manager adding the duration of its block to the current request."""
+
+    __slots__ = ("name", "_spans", "_started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "span":
+        self._spans = _spans.get()
+        if self._spans is not None:
+            self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._spans is not None:
+            elapsed = time.perf_counter() - self._started
+            self._spans[self.name] = self._spans.get(self.name, 0.0) + elapsed
+
+
+def format_server_timing(spans: Dict[str, float], total: float) -> str:
+    parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in spans.items()]
+    parts.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware emitting the spans recorded during a request."""
+
+    def __init__(
+        self,
+        app,
+        *,
+        log_json: bool = DEFAULT_TIMING_LOG_ENABLED,
+        allow_origin: Optional[str] = DEFAULT_TIMING_ALLOW_ORIGIN,
+    ) -> None:
+        self.app = app
+        self.log_json = log_json
+        self._extra_headers = [(b"timing-allow-origin", allow_origin.encode("latin-1"))] if allow_origin else []
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: Dict[str, float] = {}
+        reset = _spans.set(spans)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                header = format_server_timing(spans, time.perf_counter() - started)
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1")),
+                    *self._extra_headers,
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _spans.reset(reset)
+            if self.log_json:
+                logger.info(json.dumps({
+                    "event": "request_timing",
+                    "method": scope["method"],
+                    "route": route_template(scope),
+                    "status": status[0],
+                    "total_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "spans_ms": {name: round(seconds * 1000, 3) for name, seconds in spans.items()},
+                }))
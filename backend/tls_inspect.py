@@ -0,0 +1,232 @@
+"""Asynchronous TLS certificate inspection with a shared result cache.
+
+Handshakes run on the event loop with a bounded number in flight. Results
+are cached until shortly before the certificate expires (capped by
+``MVERIFY_TLS_CACHE_TTL_SECONDS``), failures are cached briefly, and
+concurrent requests for the same host share one handshake, so widget
+traffic does not turn into a handshake per page load.
+
+Point ``MVERIFY_TLS_CA_FILE`` at a test CA and ``MVERIFY_TLS_PORT`` /
+``MVERIFY_TLS_EXTRA_HOSTS`` at a local server to inspect a self-signed
+certificate in tests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import ssl
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from backend.metrics import TLS_CHECKS
+
+DEFAULT_TLS_PORT = int(os.getenv("MVERIFY_TLS_PORT", "443") or "443")
+DEFAULT_TLS_CONCURRENCY = int(os.getenv("MVERIFY_TLS_CONCURRENCY", "16") or "16")
+DEFAULT_TLS_TIMEOUT_SECONDS = float(os.getenv("MVERIFY_TLS_TIMEOUT_SECONDS", "5") or "5")
+DEFAULT_TLS_CACHE_TTL_SECONDS = int(os.getenv("MVERIFY_TLS_CACHE_TTL_SECONDS", "3600") or "3600")
+DEFAULT_TLS_ERROR_TTL_SECONDS = int(os.getenv("MVERIFY_TLS_ERROR_TTL_SECONDS", "60") or "60")
+DEFAULT_TLS_CACHE_SIZE = int(os.getenv("MVERIFY_TLS_CACHE_SIZE", "10000") or "10000")
+DEFAULT_TLS_CA_FILE = os.getenv("MVERIFY_TLS_CA_FILE") or None
+# Hosty spoza oficjalnych stref, które wolno sprawdzać (np. "localhost" w testach)
+DEFAULT_TLS_EXTRA_HOSTS = frozenset(
+    host.strip().lower() for host in os.getenv("MVERIFY_TLS_EXTRA_HOSTS", "").split(",") if host.strip()
+)
+
+
+def hostname_matches(hostname: str, pattern: str) -> bool:
+    """RFC 6125 matching: a wildcard covers exactly one left-most label."""
+    hostname = hostname.lower().rstrip(".")
+    pattern = pattern.lower().rstrip(".")
+    if pattern.startswith("*."):
+        suffix = pattern[1:]
+        label = hostname[: -len(suffix)]
+        return hostname.endswith(suffix) and bool(label) and "." not in label
+    return hostname == pattern
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def _distinguished_name(rdns: Iterable) -> Optional[str]:
+    parts = [f"{key}={value}" for rdn in rdns for key, value in rdn]
+    return ", ".join(parts) or None
+
+
+class TLSInspector:
+    """Inspects the certificate served by ``hostname:port``."""
+
+    def __init__(
+        self,
+        *,
+        port: int = DEFAULT_TLS_PORT,
+        max_concurrency: int = DEFAULT_TLS_CONCURRENCY,
+        timeout: float = DEFAULT_TLS_TIMEOUT_SECONDS,
+        max_ttl: int = DEFAULT_TLS_CACHE_TTL_SECONDS,
+        error_ttl: int = DEFAULT_TLS_ERROR_TTL_SECONDS,
+        cache_size: int = DEFAULT_TLS_CACHE_SIZE,
+        cafile: Optional[str] = DEFAULT_TLS_CA_FILE,
+        extra_hosts: frozenset = DEFAULT_TLS_EXTRA_HOSTS,
+    ) -> None:
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_ttl = max_ttl
+        self.error_ttl = error_ttl
+        self.cache_size = cache_size
+        self.extra_hosts = extra_hosts
+
+        self._context = ssl.create_default_context(cafile=cafile)
+        # SAN coverage is reported in the result instead of failing the handshake.
+        self._context.check_hostname = False
+        self._unverified = ssl.create_default_context()
+        self._unverified.check_hostname = False
+        self._unverified.verify_mode = ssl.CERT_NONE
+
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached": len(self._cache), "in_flight": len(self._inflight)}
+
+    async def inspect(self, hostname: str) -> Dict[str, Any]:
+        key = (hostname, self.port)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            TLS_CHECKS.inc(("cache_hit",))
+            return {**cached[1], "cached": True}
+
+        self._bind_loop()
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = self._inflight[key] = asyncio.ensure_future(self._check(key))
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            TLS_CHECKS.inc(("shared",))
+        # shield: a caller that goes away must not cancel the handshake others wait for
+        result = await asyncio.shield(pending)
+        return {**result, "cached": False}
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # asyncio primitives belong to one loop; the result cache is plain data and survives.
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+
+    async def _check(self, key: Tuple[str, int]) -> Dict[str, Any]:
+        hostname, port = key
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                cert, der, protocol, cipher = await asyncio.wait_for(self._handshake(hostname, port, self._context), self.timeout)
+                result = self._describe(hostname, port, cert, der, protocol, cipher)
+                outcome = "valid" if result["valid"] else "invalid"
+            except ssl.SSLCertVerificationError as exc:
+                result = self._failure(hostname, port, f"Certyfikat niezaufany: {exc.verify_message or exc}")
+                try:
+                    # Fetch the certificate without verification so at least its fingerprint can be reported.
+                    _, der, protocol, cipher = await asyncio.wait_for(self._handshake(hostname, port, self._unverified), self.timeout)
+                    result.update(fingerprint_sha256=hashlib.sha256(der).hexdigest(), protocol=protocol, cipher=cipher)
+                except (OSError, asyncio.TimeoutError, ssl.SSLError):
+                    pass
+                outcome = "untrusted"
+            except asyncio.TimeoutError:
+                result = self._failure(hostname, port, f"Przekroczono czas połączenia ({self.timeout:g} s)")
+                outcome = "timeout"
+            except (OSError, ssl.SSLError) as exc:
+                result = self._failure(hostname, port, f"Błąd połączenia TLS: {exc}")
+                outcome = "error"
+            except (ValueError, UnicodeError) as exc:
+                # server_hostname goes through the idna codec, which rejects over-long or invalid labels.
+                result = self._failure(hostname, port, f"Nieprawidłowa nazwa hosta: {exc}")
+                outcome = "error"
+            result["handshake_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        TLS_CHECKS.inc((outcome,))
+        not_after = result.pop("not_after_ts", None)
+        if result["valid"]:
+            # A valid certificate is not re-checked after it expires.
+            ttl = min(self.max_ttl, max(not_after - time.time(), 1))
+        else:
+            ttl = self.error_ttl
+        self._store(key, result, ttl)
+        return result
+
+    def _store(self, key: Tuple[str, int], result: Dict[str, Any], ttl: float) -> None:
+        self._cache[key] = (time.monotonic() + ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _handshake(self, hostname: str, port: int, context: ssl.SSLContext):
+        _, writer = await asyncio.open_connection(hostname, port, ssl=context, server_hostname=hostname)
+        try:
+            ssl_object = writer.get_extra_info("ssl_object")
+            return (
+                ssl_object.getpeercert(),
+                ssl_object.getpeercert(binary_form=True),
+                ssl_object.version(),
+                (ssl_object.cipher() or (None,))[0],
+            )
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+    def _describe(self, hostname: str, port: int, cert: Dict, der: bytes, protocol: str, cipher: str) -> Dict[str, Any]:
+        now = time.time()
+        not_before = ssl.cert_time_to_seconds(cert["notBefore"])
+        not_after = ssl.cert_time_to_seconds(cert["notAfter"])
+        san = [value for kind, value in cert.get("subjectAltName", ()) if kind in ("DNS", "IP Address")]
+        hostname_match = any(hostname_matches(hostname, name) for name in san)
+        in_validity = not_before <= now < not_after
+        return {
+            "hostname": hostname,
+            "port": port,
+            "valid": hostname_match and in_validity,
+            "trusted": True,
+            "hostname_match": hostname_match,
+            "issuer": _distinguished_name(cert.get("issuer", ())),
+            "subject": _distinguished_name(cert.get("subject", ())),
+            "san": san,
+            "not_before": _iso(not_before),
+            "not_after": _iso(not_after),
+            "expires_in_days": int((not_after - now) // 86400),
+            "protocol": protocol,
+            "cipher": cipher,
+            "fingerprint_sha256": hashlib.sha256(der).hexdigest(),
+            "error": None if in_validity else "Certyfikat wygasł lub nie jest jeszcze ważny",
+            "checked_at": _iso(now),
+            "not_after_ts": not_after,
+        }
+
+    def _failure(self, hostname: str, port: int, error: str) -> Dict[str, Any]:
+        return {
+            "hostname": hostname,
+            "port": port,
+            "valid": False,
+            "trusted": False,
+            "hostname_match": False,
+            "issuer": None,
+            "subject": None,
+            "san": [],
+            "not_before": None,
+            "not_after": None,
+            "expires_in_days": None,
+            "protocol": None,
+            "cipher": None,
+            "fingerprint_sha256": None,
+            "error": error,
+            "checked_at": _iso(time.time()),
+        }
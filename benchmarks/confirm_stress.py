@@ -0,0 +1,96 @@
+"""
+Concurrency stress test for ``PairingSessionTable.confirm``.
+
+Fires thousands of simultaneous confirms (QR token+nonce and PIN) from a thread
+pool against a shared table and checks that every session was confirmed
+exactly once, every nonce consumed once and every PIN released.
+
+Usage:
+    python benchmarks/confirm_stress.py [--sessions 2000] [--attempts 4] [--threads 64]
+
+Exit code 1 means the invariants were violated.
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.sessions import PAIRING_CONFIRMED, ConfirmRejected, PairingSessionTable
+
+
+def run(sessions: int, attempts: int, threads: int) -> bool:
+    table = PairingSessionTable(timeout_seconds=300)
+    created = [table.create() for _ in range(sessions)]
+
+    # Każda sesja dostaje `attempts` równoległych prób: na przemian QR (token+nonce) i PIN
+    jobs = []
+    for session in created:
+        for attempt in range(attempts):
+            jobs.append((session, attempt % 2 == 0))
+
+    barrier = threading.Barrier(threads)
+    successes: Counter = Counter()
+    rejections: Counter = Counter()
+    lock = threading.Lock()
+
+    def worker(offset: int) -> None:
+        barrier.wait()
+        for session, use_nonce in jobs[offset::threads]:
+            token = session.token if use_nonce else table.token_for_pin(session.pin)
+            if token is None:
+                with lock:
+                    rejections["pin_released"] += 1
+                continue
+            try:
+                table.confirm(token, nonce=session.nonce if use_nonce else None, device_id=str(offset))
+            except ConfirmRejected as exc:
+                with lock:
+                    rejections[exc.reason] += 1
+            else:
+                with lock:
+                    successes[session.token] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(worker, offset) for offset in range(threads)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    duplicated = [token for token, count in successes.items() if count != 1]
+    missing = [s for s in created if successes[s.token] == 0]
+    not_confirmed = [s for s in created if s.status != PAIRING_CONFIRMED]
+
+    print(f"{len(jobs):,d} potwierdzeń w {elapsed:.2f}s ({len(jobs) / elapsed:,.0f}/s), {threads} wątków")
+    print(f"sukcesy: {sum(successes.values()):,d}, odrzucenia: {dict(rejections)}")
+    print(f"wolne PIN-y po teście: {table.pin_count()}")
+
+    ok = not duplicated and not missing and not not_confirmed and table.pin_count() == 0
+    if not ok:
+        print(
+            f"BŁĄD: podwójne potwierdzenia={len(duplicated)}, brak potwierdzenia={len(missing)}, "
+            f"zły status={len(not_confirmed)}"
+        )
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--attempts", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=64)
+    args = parser.parse_args()
+
+    sys.setswitchinterval(1e-6)  # Wymuś częste przełączanie wątków, żeby ujawnić wyścigi
+    if not run(args.sessions, args.attempts, args.threads):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Async end-to-end load generator for the backend.
+
+Simulates browsers (generate -> QR fetch -> status polling), mobile clients
+confirming pairings by token+nonce or by PIN, and readers calling
+/api/domain/verify and /api/domains/compendium. Runs against the ASGI app
+in-process (default) or a live server (--url). Every virtual client gets its
+own X-Forwarded-For address, so per-client rate limits apply as in production.
+
+Reports p50/p95/p99 latency, throughput and error rates per route. With
+--ramp the run is repeated at increasing concurrency to find where latency
+or errors break down.
+
+Usage:
+    python benchmarks/loadgen.py [--url http://localhost:8001] [--duration 20]
+                                 [--browsers 50 --mobiles 25 --readers 25]
+                                 [--ramp 10 50 100 200] [--no-rate-limit] [--output wynik.json]
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+STATUS_POLL_INTERVAL = 1.0
+MAX_STATUS_POLLS = 30
+SEARCH_TERMS = ["gov", "um", "mf", "podatki", "krakow", "zus", "szczepimy"]
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.failures: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, elapsed: float, status: Optional[int]) -> None:
+        self.latencies[route].append(elapsed)
+        if status is None:
+            self.failures[route] += 1
+        else:
+            self.statuses[route][status] += 1
+
+    def summary(self, duration: float) -> List[Dict]:
+        rows = []
+        for route in sorted(self.latencies):
+            samples = sorted(self.latencies[route])
+            statuses = self.statuses[route]
+            total = len(samples)
+            errors = self.failures[route] + sum(count for code, count in statuses.items() if code >= 500)
+            rows.append({
+                "route": route,
+                "requests": total,
+                "throughput_rps": total / duration,
+                "p50_ms": _percentile(samples, 50) * 1000,
+                "p95_ms": _percentile(samples, 95) * 1000,
+                "p99_ms": _percentile(samples, 99) * 1000,
+                "mean_ms": statistics.fmean(samples) * 1000,
+                "error_rate": errors / total,
+                "rate_limited": statuses.get(429, 0),
+                "statuses": dict(statuses),
+            })
+        return rows
+
+
+def _percentile(samples: List[float], percent: float) -> float:
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(percent / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, deadline: float) -> None:
+        self.client = client
+        self.deadline = deadline
+        self.stats = Stats()
+        self.pending: asyncio.Queue = asyncio.Queue(maxsize=10_000)
+
+    async def call(self, route: str, method: str, url: str, ip: str, **kwargs) -> Optional[httpx.Response]:
+        headers = {"X-Forwarded-For": ip}
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(route, time.perf_counter() - started, None)
+            return None
+        self.stats.record(route, time.perf_counter() - started, response.status_code)
+        return response
+
+    async def browser(self, ip: str) -> None:
+        while time.monotonic() < self.deadline:
+            response = await self.call("POST /api/pairing/generate", "POST", "/api/pairing/generate", ip)
+            if response is None or response.status_code != 200:
+                await asyncio.sleep(STATUS_POLL_INTERVAL)
+                continue
+            session = response.json()
+            token = session["token"]
+            if not self.pending.full():
+                self.pending.put_nowait(session)
+
+            await self.call("GET /api/pairing/qr/{token}", "GET", f"/api/pairing/qr/{token}", ip)
+
+            for _ in range(MAX_STATUS_POLLS):
+                if time.monotonic() >= self.deadline:
+                    return
+                await asyncio.sleep(STATUS_POLL_INTERVAL)
+                status = await self.call("GET /api/pairing/status/{token}", "GET", f"/api/pairing/status/{token}", ip)
+                if status is not None and status.status_code == 200 and status.json().get("status") != "pending":
+                    break
+
+    async def mobile(self, ip: str) -> None:
+        while time.monotonic() < self.deadline:
+            try:
+                session = await asyncio.wait_for(self.pending.get(), timeout=max(self.deadline - time.monotonic(), 0.01))
+            except asyncio.TimeoutError:
+                return
+            # Aplikacja skanuje QR (token + nonce) albo użytkownik wpisuje PIN
+            if random.random() < 0.5:
+                body = {"token": session["token"], "nonce": session["nonce"], "device_name": "loadgen"}
+            else:
+                body = {"pin": session["pin"], "device_name": "loadgen"}
+            await self.call("POST /api/pairing/confirm", "POST", "/api/pairing/confirm", ip, json=body)
+            await asyncio.sleep(random.uniform(0.2, 1.0))
+
+    async def reader(self, ip: str, domains: List[str]) -> None:
+        while time.monotonic() < self.deadline:
+            if random.random() < 0.7:
+                domain = random.choice(domains) if random.random() < 0.8 else f"phish{random.randint(0, 10**6)}.example.com"
+                await self.call("GET /api/domain/verify", "GET", "/api/domain/verify", ip, params={"domain": domain})
+            else:
+                params = {"limit": 100}
+                if random.random() < 0.6:
+                    params["search"] = random.choice(SEARCH_TERMS)
+                await self.call("GET /api/domains/compendium", "GET", "/api/domains/compendium", ip, params=params)
+            await asyncio.sleep(random.uniform(0.05, 0.5))
+
+
+def _client(url: Optional[str], rate_limit: bool) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=30, limits=limits)
+
+    from backend import main
+
+    main.limiter.enabled = rate_limit
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://loadgen", timeout=30)
+
+
+async def run_stage(args, browsers: int, mobiles: int, readers: int) -> Dict:
+    async with _client(args.url, not args.no_rate_limit) as client:
+        compendium = await client.get("/api/domains/compendium", params={"limit": 1000})
+        domains = compendium.json().get("domains") or ["gov.pl"]
+
+        test = LoadTest(client, time.monotonic() + args.duration)
+        clients = (
+            [test.browser(f"10.1.{i // 250}.{i % 250}") for i in range(browsers)]
+            + [test.mobile(f"10.2.{i // 250}.{i % 250}") for i in range(mobiles)]
+            + [test.reader(f"10.3.{i // 250}.{i % 250}", domains) for i in range(readers)]
+        )
+        started = time.perf_counter()
+        await asyncio.gather(*clients)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "browsers": browsers,
+        "mobiles": mobiles,
+        "readers": readers,
+        "duration_s": elapsed,
+        "routes": test.stats.summary(elapsed),
+    }
+
+
+def print_stage(stage: Dict) -> None:
+    print(
+        f"\n== {stage['browsers']} przeglądarek, {stage['mobiles']} telefonów, "
+        f"{stage['readers']} czytelników, {stage['duration_s']:.1f}s =="
+    )
+    print(f"{'trasa':36s} {'żądania':>8s} {'rps':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'błędy':>7s} {'429':>6s}")
+    for row in stage["routes"]:
+        print(
+            f"{row['route']:36s} {row['requests']:8d} {row['throughput_rps']:8.1f} {row['p50_ms']:8.1f} "
+            f"{row['p95_ms']:8.1f} {row['p99_ms']:8.1f} {row['error_rate']:7.2%} {row['rate_limited']:6d}"
+        )
+
+
+async def main_async(args) -> List[Dict]:
+    stages = []
+    if args.ramp:
+        total = args.browsers + args.mobiles + args.readers
+        for level in args.ramp:
+            scale = level / total
+            stages.append(await run_stage(
+                args,
+                max(1, round(args.browsers * scale)),
+                max(1, round(args.mobiles * scale)),
+                max(1, round(args.readers * scale)),
+            ))
+            print_stage(stages[-1])
+    else:
+        stages.append(await run_stage(args, args.browsers, args.mobiles, args.readers))
+        print_stage(stages[-1])
+    return stages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="adres działającego serwera; domyślnie aplikacja ASGI w tym procesie")
+    parser.add_argument("--duration", type=float, default=20.0, help="czas trwania jednego etapu w sekundach")
+    parser.add_argument("--browsers", type=int, default=50)
+    parser.add_argument("--mobiles", type=int, default=25)
+    parser.add_argument("--readers", type=int, default=25)
+    parser.add_argument("--ramp", type=int, nargs="+", help="łączna liczba klientów w kolejnych etapach")
+    parser.add_argument("--no-rate-limit", action="store_true", help="wyłącz rate limiting (tylko w trybie in-process)")
+    parser.add_argument("--output", type=Path, help="zapisz wyniki jako JSON")
+    args = parser.parse_args()
+
+    stages = asyncio.run(main_async(args))
+    if args.output:
+        args.output.write_text(json.dumps({"benchmark": "loadgen", "stages": stages}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Micro-benchmarks for the hot paths of the backend.
+
+Covers hostname normalization, DomainRegistry.verify/query, load_gov_domains,
+compendium search, the generate -> status -> confirm pairing cycle with 10k
+live sessions and QR PNG rendering, against synthetic registries of several
+sizes. Handlers are called directly (rate limiting disabled) on one event
+loop, so the numbers exclude HTTP/ASGI overhead.
+
+Usage:
+    python benchmarks/micro.py [--sizes 1000 100000 1000000] [--only verify]
+                               [--output wynik.json] [--compare poprzedni.json]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from starlette.requests import Request
+
+from backend import main
+from backend.domain_registry import DomainRegistry, normalize_hostname
+from synthetic import synthetic_domains, write_synthetic_gov_json
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+LIVE_PAIRING_SESSIONS = 10_000
+TARGET_SECONDS_PER_REPEAT = 0.2
+
+SAMPLE_INPUTS = [
+    "https://www.podatki.gov.pl/pit/",
+    "mObywatel.GOV.pl",
+    "http://um.krakow.gov.pl:8080/bip?x=1",
+    "  epuap.gov.pl  ",
+    "xn--ódź-qqa.gov.pl",
+    "phishing-gov.pl.example.com/login",
+    "gov.pl",
+    "bip.ug.zamosc.gov.pl#kontakt",
+]
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+
+
+class Runner:
+    def __init__(self, only: Optional[List[str]]) -> None:
+        self.only = only
+        self.loop = asyncio.new_event_loop()
+        self.results: List[Dict] = []
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def bench(self, name: str, fn: Callable[[], object], *, size: Optional[int] = None, setup: Optional[Callable[[], None]] = None) -> None:
+        if self.only and not any(token in name for token in self.only):
+            return
+
+        def timed(number: int) -> float:
+            total = 0.0
+            for _ in range(number):
+                if setup:
+                    setup()
+                started = time.perf_counter()
+                fn()
+                total += time.perf_counter() - started
+            return total
+
+        first = timed(1)
+        number = max(1, int(TARGET_SECONDS_PER_REPEAT / max(first, 1e-9)))
+        repeat = 5 if first < 1 else 2
+        per_op = [timed(number) / number for _ in range(repeat)]
+
+        result = {
+            "name": name,
+            "size": size,
+            "ops": number * repeat,
+            "min_s": min(per_op),
+            "median_s": statistics.median(per_op),
+            "mean_s": statistics.fmean(per_op),
+            "ops_per_s": 1 / statistics.median(per_op),
+        }
+        self.results.append(result)
+        label = f"{name} [{size:,d}]" if size else name
+        print(f"{label:45s} {result['median_s'] * 1e6:12.2f} µs/op  {result['ops_per_s']:12,.0f} op/s")
+
+
+def bench_normalization(runner: Runner) -> None:
+    runner.bench("normalize_hostname", lambda: [normalize_hostname(value) for value in SAMPLE_INPUTS])
+    runner.bench("normalize_domain", lambda: [main.normalize_domain(value) for value in SAMPLE_INPUTS])
+
+
+def bench_dataset(runner: Runner, size: int, workdir: Path) -> None:
+    directory = workdir / str(size)
+    gov_json = write_synthetic_gov_json(directory, size)
+    domains = synthetic_domains(size)
+    hits = [domains[index] for index in range(0, size, max(size // 50, 1))][:50]
+    misses = [f"nie-ma-{index}.gov.pl" for index in range(25)] + [f"phish{index}.example.com" for index in range(25)]
+
+    def reset_gov_domains() -> None:
+        main.ASSETS_DIR = directory
+        if main.get_domain_registry.cache_info().currsize:
+            main.get_domain_registry().close()
+        main.get_domain_registry.cache_clear()
+        main.GOV_DOMAINS_CACHE = None
+        main.GOV_DOMAINS_VERSION = None
+
+    runner.bench("load_gov_domains", main.load_gov_domains, size=size, setup=reset_gov_domains)
+    reset_gov_domains()
+    main.load_gov_domains()
+
+    request = _request()
+    runner.bench(
+        "verify_domain",
+        lambda: [runner.run_async(main.verify_domain(request, domain=domain, tls=False, dns=False)) for domain in hits + misses],
+        size=size,
+    )
+    runner.bench(
+        "compendium_default_page",
+        lambda: runner.run_async(main.get_domains_compendium(request, search=None, category=None, limit=100, offset=0)),
+        size=size,
+    )
+    runner.bench(
+        "compendium_search",
+        lambda: runner.run_async(main.get_domains_compendium(request, search="krakow", category=None, limit=100, offset=0)),
+        size=size,
+    )
+
+    registry = DomainRegistry(gov_json, remote_url=None)
+    runner.bench("registry_load", lambda: registry.ensure_fresh(force=True), size=size)
+    runner.bench("registry_verify", lambda: [registry.verify(domain) for domain in hits + misses], size=size)
+    runner.bench("registry_query", lambda: registry.query(q="krakow", limit=100), size=size)
+
+
+def bench_pairing(runner: Runner) -> None:
+    main.pairing_sessions = main.PairingSessionTable(timeout_seconds=main.PAIRING_TIMEOUT_SECONDS)
+    for _ in range(LIVE_PAIRING_SESSIONS):
+        main.pairing_sessions.create()
+
+    request = _request()
+
+    def cycle() -> None:
+        generated = runner.run_async(main.generate_pairing_qr(request))
+        runner.run_async(main.get_pairing_status(request, generated["token"]))
+        confirm = main.PairingConfirm(token=generated["token"], nonce=generated["nonce"], device_name="bench")
+        runner.run_async(main.confirm_pairing(request, confirm))
+
+    runner.bench("pairing_cycle", cycle, size=LIVE_PAIRING_SESSIONS)
+
+    token = runner.run_async(main.generate_pairing_qr(request))["token"]
+    runner.bench("qr_png", lambda: runner.run_async(main.get_qr_code_image(request, token)))
+
+
+def compare(results: List[Dict], previous_path: Path) -> None:
+    previous = {(item["name"], item["size"]): item for item in json.loads(previous_path.read_text())["results"]}
+    print(f"\nPorównanie z {previous_path}:")
+    for item in results:
+        before = previous.get((item["name"], item["size"]))
+        if before:
+            ratio = before["median_s"] / item["median_s"]
+            label = f"{item['name']} [{item['size']:,d}]" if item["size"] else item["name"]
+            print(f"{label:45s} {ratio:6.2f}x {'szybciej' if ratio >= 1 else 'wolniej'}")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--only", nargs="+", help="uruchom tylko benchmarki, których nazwa zawiera podany fragment")
+    parser.add_argument("--output", type=Path, help="zapisz wyniki jako JSON")
+    parser.add_argument("--compare", type=Path, help="porównaj z wcześniejszym plikiem JSON")
+    args = parser.parse_args()
+
+    main.limiter.enabled = False
+    runner = Runner(args.only)
+
+    bench_normalization(runner)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            bench_dataset(runner, size, Path(tmp))
+    bench_pairing(runner)
+
+    report = {
+        "benchmark": "micro",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": runner.results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.compare:
+        compare(runner.results, args.compare)
+
+
+if __name__ == "__main__":
+    main_cli()
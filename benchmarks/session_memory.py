@@ -0,0 +1,97 @@
+"""
+Memory benchmark for pairing sessions.
+
+Compares bytes per session of the former dict-based representation
+(``pairing_sessions`` + ``pin_to_token``) with ``PairingSessionTable``.
+
+Usage:
+    python benchmarks/session_memory.py [--sizes 100000 1000000] [--output wynik.json]
+"""
+import argparse
+import gc
+import json
+import secrets
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.sessions import PairingSession, PairingSessionTable
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+
+def _credentials(count: int):
+    # PIN-y są unikalne, więc 1M sesji wyczerpuje dokładnie całą przestrzeń 6 cyfr
+    for index in range(count):
+        yield secrets.token_urlsafe(32), f"{index % 1000000:06d}", secrets.token_urlsafe(16)
+
+
+def build_dict_sessions(count: int):
+    sessions = {}
+    pin_to_token = {}
+    now = time.time()
+    for token, pin, nonce in _credentials(count):
+        sessions[token] = {
+            "token": token,
+            "pin": pin,
+            "nonce": nonce,
+            "nonce_used": False,
+            "status": "pending",
+            "created_at": now,
+            "expires_at": now + 300,
+            "confirmed_at": None,
+            "device_id": None,
+            "device_name": None,
+        }
+        pin_to_token[pin] = token
+    return sessions, pin_to_token
+
+
+def build_table_sessions(count: int):
+    table = PairingSessionTable(timeout_seconds=300)
+    now = time.time()
+    for token, pin, nonce in _credentials(count):
+        table.add(PairingSession(token=token, pin=pin, nonce=nonce, expires_at=now + 300))
+    return table
+
+
+def measure(builder, count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    keep = builder(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del keep
+    gc.collect()
+    return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for name, builder in (("dict", build_dict_sessions), ("slots_table", build_table_sessions)):
+            total = measure(builder, size)
+            results.append({
+                "representation": name,
+                "sessions": size,
+                "total_bytes": total,
+                "bytes_per_session": round(total / size, 1),
+            })
+            print(f"{name:12s} {size:>9,d} sesji: {total / size:8.1f} B/sesję ({total / 2**20:8.1f} MiB)")
+
+    if args.output:
+        args.output.write_text(json.dumps({"benchmark": "session_memory", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
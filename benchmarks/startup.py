@@ -0,0 +1,113 @@
+"""
+Cold-start import profile and budget check for the serverless entry point.
+
+Imports the target module in fresh interpreters with ``-X importtime``,
+reports the modules and top-level packages with the highest import cost and
+fails (exit code 1) when the median cold import time exceeds the budget or
+when a dependency that should be loaded lazily (qrcode/PIL, uvicorn,
+cProfile) is imported at startup.
+
+Usage:
+    python benchmarks/startup.py [--module backend.main] [--runs 5] [--budget-ms 1500] [--top 20]
+
+Use ``--module api.index`` to include mangum when it is installed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_BUDGET_MS = float(os.getenv("MVERIFY_COLD_IMPORT_BUDGET_MS", "1500") or "1500")
+
+# Moduły, które powinny być ładowane dopiero przez endpointy, które ich używają
+DEFERRED_MODULES = ("qrcode", "PIL", "uvicorn", "cProfile")
+
+CHILD_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+import json
+print(json.dumps({{"elapsed": elapsed, "loaded": sorted(sys.modules)}}))
+"""
+
+
+def cold_import(module: str) -> Tuple[float, List[str], List[Tuple[str, int, int]]]:
+    """Import ``module`` in a fresh interpreter; return (seconds, loaded modules, importtime rows)."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT.format(root=str(PROJECT_ROOT), module=module)],
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_ROOT,
+        check=True,
+    )
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return report["elapsed"], report["loaded"], rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", type=Path, help="zapisz wyniki jako JSON")
+    args = parser.parse_args()
+
+    # Pierwsze uruchomienie rozgrzewa cache bajtkodu (__pycache__), nie liczymy go
+    cold_import(args.module)
+    runs = [cold_import(args.module) for _ in range(max(args.runs, 1))]
+    timings = [elapsed for elapsed, _, _ in runs]
+    median_ms = statistics.median(timings) * 1000
+    # Raport modułów z uruchomienia najbliższego medianie
+    _, loaded, rows = min(runs, key=lambda run: abs(run[0] * 1000 - median_ms))
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"Zimny import {args.module}: mediana {median_ms:.1f} ms z {len(runs)} uruchomień (budżet {args.budget_ms:.0f} ms)")
+    print("\nNajdroższe pakiety (suma czasu własnego):")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {package:40s} {self_us / 1000:8.1f} ms")
+    print("\nNajdroższe moduły (czas łączny):")
+    for name, _, cumulative_us in sorted(rows, key=lambda row: -row[2])[: args.top]:
+        print(f"  {name:40s} {cumulative_us / 1000:8.1f} ms")
+
+    eager = [name for name in DEFERRED_MODULES if name in loaded]
+    if eager:
+        print(f"\nUWAGA: moduły, które powinny być ładowane leniwie, zostały zaimportowane: {', '.join(eager)}")
+
+    if args.output:
+        args.output.write_text(json.dumps({
+            "benchmark": "startup",
+            "module": args.module,
+            "runs_ms": [elapsed * 1000 for elapsed in timings],
+            "median_ms": median_ms,
+            "budget_ms": args.budget_ms,
+            "packages_ms": {package: self_us / 1000 for package, self_us in by_package.items()},
+            "eagerly_loaded": eager,
+        }, indent=2))
+
+    if median_ms > args.budget_ms or eager:
+        print("\nBŁĄD: przekroczony budżet zimnego startu" if median_ms > args.budget_ms else "\nBŁĄD: ciężkie zależności ładowane przy starcie")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
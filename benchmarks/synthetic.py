@@ -0,0 +1,58 @@
+"""
+Synthetic gov.json-shaped datasets for benchmarks and load tests.
+
+The rows mimic the dane.gov.pl API payload (``data[].attributes.col1.val``)
+and mix the shapes seen in the real list: single-label central services,
+municipal subdomains and campaign sites.
+"""
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+_CENTRAL = ["mf", "mz", "mswia", "zus", "podatki", "obywatel", "ceidg", "kprm", "nfz", "mon"]
+_LOCAL = ["um", "ug", "gmina", "powiat", "starostwo", "urzad"]
+_PLACES = ["krakow", "gdansk", "lodz", "opole", "torun", "kielce", "radom", "plock", "sopot", "zamosc"]
+_CAMPAIGN = ["akcja", "kampania", "program", "projekt", "szczepimy", "edukacja", "wybory"]
+
+
+def synthetic_domains(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    domains = []
+    for index in range(count):
+        kind = index % 4
+        if kind == 0:
+            domains.append(f"{rng.choice(_CENTRAL)}{index}.gov.pl")
+        elif kind == 1:
+            domains.append(f"{rng.choice(_LOCAL)}.{rng.choice(_PLACES)}{index}.gov.pl")
+        elif kind == 2:
+            domains.append(f"{rng.choice(_CAMPAIGN)}-{index}.gov.pl")
+        else:
+            domains.append(f"bip.{rng.choice(_LOCAL)}{index}.{rng.choice(_PLACES)}.gov.pl")
+    return domains
+
+
+def synthetic_payload(count: int, seed: int = 1) -> Dict:
+    rows = [
+        {
+            "attributes": {"col1": {"repr": domain, "val": domain}},
+            "meta": {"updated_at": "2025-01-14T18:48:03Z", "row_no": index + 1},
+            "links": {"self": f"https://api.dane.gov.pl/1.4/resources/0/data/{index}"},
+            "type": "row",
+        }
+        for index, domain in enumerate(synthetic_domains(count, seed))
+    ]
+    return {
+        "links": {"self": "https://api.dane.gov.pl/1.4/resources/0/data?page=1"},
+        "meta": {"count": count, "headers_map": {"col1": "2025-01-13 17:19:08 CET"}, "server_time": "2025-12-07T02:43:27Z"},
+        "data": rows,
+    }
+
+
+def write_synthetic_gov_json(directory: Path, count: int, seed: int = 1) -> Path:
+    """Write ``gov.json`` with ``count`` synthetic domains into ``directory``."""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / "gov.json"
+    with path.open("w", encoding="utf-8") as handle:
+        json.dump(synthetic_payload(count, seed), handle)
+    return path
@@ -0,0 +1,13 @@
+"""pytest entry point for confirm_stress.py: the same invariants at a size that runs in CI."""
+import sys
+
+import confirm_stress
+
+
+def test_concurrent_confirms_keep_invariants():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Częste przełączanie wątków, jak w skrypcie
+    try:
+        assert confirm_stress.run(sessions=200, attempts=4, threads=16)
+    finally:
+        sys.setswitchinterval(interval)
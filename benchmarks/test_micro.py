@@ -0,0 +1,67 @@
+"""pytest entry point for micro.py: every suite at a small registry size, with sanity checks on the results."""
+import json
+
+import pytest
+
+import micro
+from backend import main
+from synthetic import synthetic_domains
+
+SIZE = 1_000
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    # Krótkie powtórzenia: test sprawdza, że benchmarki działają, a nie mierzy czasu
+    monkeypatch.setattr(micro, "TARGET_SECONDS_PER_REPEAT", 0.005)
+    monkeypatch.setattr(main.limiter, "enabled", False)
+    monkeypatch.setattr(main, "ASSETS_DIR", main.ASSETS_DIR)
+    monkeypatch.setattr(main, "pairing_sessions", main.pairing_sessions)
+    runner = micro.Runner(None)
+    yield runner
+    runner.loop.close()
+    if main.get_domain_registry.cache_info().currsize:
+        main.get_domain_registry().close()
+    main.get_domain_registry.cache_clear()
+    main.GOV_DOMAINS_CACHE = None
+    main.GOV_DOMAINS_VERSION = None
+
+
+def _results(runner):
+    return {result["name"]: result for result in runner.results}
+
+
+def test_normalization(runner):
+    micro.bench_normalization(runner)
+
+    assert set(_results(runner)) == {"normalize_hostname", "normalize_domain"}
+
+
+def test_dataset(runner, tmp_path):
+    micro.bench_dataset(runner, SIZE, tmp_path)
+
+    results = _results(runner)
+    assert set(results) == {
+        "load_gov_domains", "verify_domain", "compendium_default_page", "compendium_search",
+        "registry_load", "registry_verify", "registry_query",
+    }
+    for result in results.values():
+        assert result["size"] == SIZE
+        assert result["ops"] >= 1 and result["median_s"] > 0
+
+    # Benchmarki mierzą prawdziwą ścieżkę: zbiór syntetyczny jest załadowany i weryfikowany
+    assert set(synthetic_domains(SIZE)) <= set(main.load_gov_domains()["domains"])
+    request = micro._request()
+    listed = json.loads(runner.run_async(main.verify_domain(request, domain=synthetic_domains(SIZE)[0], tls=False, dns=False)).body)
+    missing = json.loads(runner.run_async(main.verify_domain(request, domain="nie-ma-0.gov.pl", tls=False, dns=False)).body)
+    assert listed["is_official"] and not missing["is_official"]
+
+
+def test_pairing(runner):
+    micro.bench_pairing(runner)
+
+    results = _results(runner)
+    assert set(results) == {"pairing_cycle", "qr_png"}
+    assert results["pairing_cycle"]["size"] == micro.LIVE_PAIRING_SESSIONS
+    # Każdy cykl kończy się potwierdzeniem, więc żyją tylko sesje założone na starcie (plus token dla QR)
+    assert main.pairing_sessions.pin_count() <= micro.LIVE_PAIRING_SESSIONS + 1
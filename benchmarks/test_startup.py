@@ -0,0 +1,16 @@
+"""pytest entry point for startup.py: cold import budget and lazily loaded dependencies."""
+import statistics
+
+import startup
+
+
+def test_cold_import_within_budget_and_lazy():
+    # Pierwsze uruchomienie rozgrzewa cache bajtkodu, jak w skrypcie
+    startup.cold_import("backend.main")
+    runs = [startup.cold_import("backend.main") for _ in range(3)]
+
+    median_ms = statistics.median(elapsed for elapsed, _, _ in runs) * 1000
+    assert median_ms <= startup.DEFAULT_BUDGET_MS
+
+    for _, loaded, _ in runs:
+        assert [name for name in startup.DEFERRED_MODULES if name in loaded] == []
@@ -1,7 +1,8 @@
 import './styles.css';
 
 const DEFAULT_LIMIT = 200;
-const SEARCH_DEBOUNCE_MS = 250;
+const SUGGEST_DEBOUNCE_MS = 60;
+const SUGGEST_LIMIT = 8;
 
 const API_BASE_URL = (() => {
   const base = import.meta?.env?.VITE_API_BASE_URL ?? '';
@@ -37,17 +38,26 @@ let searchInputEl;
 let categorySelectEl;
 let refreshBtnEl;
 let appEl;
-let searchTimeout;
+let suggestTimeout;
+let suggestionsEl;
+let suggestController;
 
 document.addEventListener('DOMContentLoaded', () => {
   listEl = document.getElementById('compendiumList');
   summaryEl = document.getElementById('compendiumSummary');
   searchInputEl = document.getElementById('compendiumSearch');
+  suggestionsEl = document.getElementById('compendiumSuggestions');
   categorySelectEl = document.getElementById('compendiumCategory');
   refreshBtnEl = document.getElementById('compendiumRefresh');
   appEl = document.getElementById('compendiumApp');
 
   searchInputEl?.addEventListener('input', handleSearchInput);
+  searchInputEl?.addEventListener('keydown', (event) => {
+    if (event.key === 'Enter') {
+      event.preventDefault();
+      submitSearch();
+    }
+  });
   categorySelectEl?.addEventListener('change', () => {
     state.category = categorySelectEl.value;
     state.offset = 0;
@@ -60,17 +70,71 @@ document.addEventListener('DOMContentLoaded', () => {
   void loadCompendium();
 });
 
+// Pisanie odświeża tylko podpowiedzi; pełne wyszukiwanie po Enterze lub wyborze podpowiedzi
 function handleSearchInput(event) {
-  state.q = event.target.value.trim();
+  const query = event.target.value.trim();
+
+  if (isSuggestion(query)) {
+    submitSearch();
+    return;
+  }
+  if (!query) {
+    // Wyczyszczone pole: powrót do pełnej listy
+    submitSearch();
+  }
+
+  if (suggestTimeout) {
+    clearTimeout(suggestTimeout);
+  }
+
+  suggestTimeout = setTimeout(() => {
+    void loadSuggestions(query);
+  }, SUGGEST_DEBOUNCE_MS);
+}
+
+function isSuggestion(value) {
+  if (!value || !suggestionsEl) return false;
+  return Array.from(suggestionsEl.options).some((option) => option.value === value);
+}
+
+function submitSearch() {
+  const query = searchInputEl?.value.trim() ?? '';
+  if (query === state.q) return;
+  state.q = query;
   state.offset = 0;
+  void loadCompendium();
+}
+
+// Podpowiedzi z lekkiego endpointu prefiksowego - bez pełnego wyszukiwania przy każdym znaku
+async function loadSuggestions(query) {
+  if (!suggestionsEl) return;
 
-  if (searchTimeout) {
-    clearTimeout(searchTimeout);
+  suggestController?.abort();
+  if (!query) {
+    suggestionsEl.innerHTML = '';
+    return;
   }
 
-  searchTimeout = setTimeout(() => {
-    void loadCompendium();
-  }, SEARCH_DEBOUNCE_MS);
+  suggestController = new AbortController();
+  const params = new URLSearchParams({ q: query, limit: String(SUGGEST_LIMIT) });
+
+  try {
+    const response = await fetch(`${buildApiUrl('/api/domains/autocomplete')}?${params.toString()}`, {
+      signal: suggestController.signal,
+    });
+    if (!response.ok) return;
+    const data = await response.json();
+    suggestionsEl.innerHTML = '';
+    for (const domain of data?.suggestions ?? []) {
+      const option = document.createElement('option');
+      option.value = domain;
+      suggestionsEl.appendChild(option);
+    }
+  } catch (error) {
+    if (error?.name !== 'AbortError') {
+      console.warn('Failed to fetch suggestions', error);
+    }
+  }
 }
 
 async function loadCompendium(forceRefresh = false) {
@@ -0,0 +1,21 @@
+"""Shared fixtures for the backend tests; run with ``python -m pytest tests`` from the repository root."""
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """TestClient for the app with rate limiting disabled."""
+    from fastapi.testclient import TestClient
+
+    from backend import main
+
+    monkeypatch.setattr(main.limiter, "enabled", False)
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,46 @@
+import pytest
+
+from backend import main
+from backend.blocklist import Blocklist, normalize_entry
+
+
+@pytest.mark.parametrize(
+    ("line", "expected"),
+    [
+        ("evil.pl", "evil.pl"),
+        ("*.Evil.PL.", "evil.pl"),
+        ("0.0.0.0 evil.pl  # hosts", "evil.pl"),
+        ("żółw.pl", "xn--w-uga1v8h.pl"),
+        ("# komentarz", None),
+        ("127.0.0.1", None),
+    ],
+)
+def test_normalize_entry(line, expected):
+    assert normalize_entry(line) == expected
+
+
+@pytest.fixture
+def blocklist(tmp_path, monkeypatch):
+    source = tmp_path / "blocklist.txt"
+    source.write_text("żółw.pl\nxn--phishing-gov-pl.com\n", encoding="utf-8")
+    blocklist = Blocklist(str(source), watch=False)
+    blocklist.refresh()
+    monkeypatch.setattr(main, "get_blocklist", lambda: blocklist)
+    return blocklist
+
+
+@pytest.mark.parametrize("domain", ["żółw.pl", "ŻÓŁW.pl", "xn--w-uga1v8h.pl", "https://sklep.żółw.pl/koszyk"])
+def test_verify_matches_unicode_and_punycode_spellings(client, blocklist, domain):
+    body = client.get("/api/domain/verify", params={"domain": domain}).json()
+
+    assert body["blocklisted"] is True
+    assert body["blocklist_match"] == "xn--w-uga1v8h.pl"
+
+
+def test_verify_batch_matches_unicode_and_punycode_spellings(client, blocklist):
+    response = client.post("/api/domain/verify-batch", json={"hosts": ["żółw.pl", "xn--w-uga1v8h.pl", "mf.gov.pl"]})
+    results = response.json()["results"]
+
+    assert results["żółw.pl"]["blocklisted"] is True
+    assert results["xn--w-uga1v8h.pl"]["blocklisted"] is True
+    assert results["mf.gov.pl"]["blocklisted"] is False
@@ -0,0 +1,87 @@
+import sys
+from pathlib import Path
+
+from backend.compendium import (
+    ALL_DOMAINS,
+    COMPENDIUM_CATEGORIES,
+    DOMAIN_CATEGORIES,
+    DomainCategories,
+    DomainView,
+    compendium_category,
+    compendium_views,
+    stored_labels,
+)
+from backend.dataset_export import build_export, encode_export
+from backend.domain_registry import DomainRegistry
+from backend.registry_history import diff
+from backend.registry_snapshot import MappedSnapshot
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from synthetic import synthetic_domains, write_synthetic_gov_json  # noqa: E402
+
+
+def _registries(tmp_path, count=500):
+    write_synthetic_gov_json(tmp_path, count)
+    local = DomainRegistry(tmp_path / "gov.json", remote_url=None, snapshot_path=None, watch=False, views=compendium_views)
+    shared = DomainRegistry(
+        tmp_path / "gov.json", remote_url=None, snapshot_path=tmp_path / "registry.snapshot", watch=False, views=compendium_views
+    )
+    return local.snapshot, shared.snapshot
+
+
+def _domains(state, view=ALL_DOMAINS):
+    return DomainView(state.domain_at, state.views[view])
+
+
+def test_views_are_sorted_listed_domains_split_by_category(tmp_path):
+    local, _ = _registries(tmp_path)
+    domains = _domains(local)
+
+    assert list(domains) == sorted(set(synthetic_domains(500)) | {"gov.pl"})
+    for name in COMPENDIUM_CATEGORIES:
+        assert list(_domains(local, name)) == [domain for domain in domains if compendium_category(domain) == name]
+
+
+def test_shared_snapshot_maps_the_same_views(tmp_path):
+    local, shared = _registries(tmp_path)
+
+    assert isinstance(shared.lookup, MappedSnapshot)
+    for name in (ALL_DOMAINS, *COMPENDIUM_CATEGORIES):
+        assert list(_domains(shared, name)) == list(_domains(local, name))
+    assert list(shared.views[DOMAIN_CATEGORIES]) == list(local.views[DOMAIN_CATEGORIES])
+    # The autocomplete index is carried by the snapshot file only
+    assert stored_labels(local.views) is None
+    assert [list(labels) for labels in stored_labels(shared.views)]
+
+
+def test_domain_categories_mapping(tmp_path):
+    local, _ = _registries(tmp_path)
+    categories = DomainCategories(_domains(local), local.views[DOMAIN_CATEGORIES])
+
+    assert categories["gov.pl"] == compendium_category("gov.pl")
+    assert categories.get("nie-ma.gov.pl") is None
+    assert dict(categories.items()) == {domain: compendium_category(domain) for domain in _domains(local)}
+
+
+def test_sorted_diff_matches_dict_diff():
+    old = ["a.gov.pl", "b.gov.pl", "mz.gov.pl", "z.gov.pl"]
+    new = ["b.gov.pl", "c.gov.pl", "z.gov.pl"]
+    old_categories = DomainCategories(old, [3, 3, 0, 3])
+    new_categories = DomainCategories(new, [1, 3, 3])
+
+    assert diff(old_categories, new_categories) == diff(dict(old_categories.items()), dict(new_categories.items()))
+
+
+def test_shared_export_is_written_once_and_mapped(tmp_path):
+    domains = ["a.gov.pl", "b.gov.pl", "c.gov.pl"]
+    categories = ["inne", "urzedy", "inne"]
+    expected = encode_export(domains, categories, "ndjson", "etag")
+
+    mapped = build_export(domains, categories, "ndjson", "v1", directory=tmp_path)
+    assert bytes(mapped.body) == expected.body
+    assert list(mapped.offsets) == list(expected.offsets)
+    assert mapped.offset_after("a.gov.pl") == expected.offset_after("a.gov.pl")
+
+    # A later snapshot replaces the previous one's files
+    build_export(domains, categories, "ndjson", "v2", directory=tmp_path)
+    assert sorted(path.name for path in tmp_path.glob("*.export")) == ["v2-ndjson-all.export"]
@@ -0,0 +1,275 @@
+import asyncio
+import importlib
+import socket
+import struct
+import threading
+from typing import NamedTuple
+
+import pytest
+
+from backend import dns_check
+from backend.dns_check import TYPE_A, TYPE_AAAA, TYPE_CNAME, TYPE_SOA, DNSError, DNSResolver, decode_response
+
+HOST = "www.test.gov.pl"
+
+
+class Query(NamedTuple):
+    id: int
+    name: str
+    type: int
+    question: bytes
+
+
+def name(value):
+    return b"".join(bytes((len(label),)) + label.encode("ascii") for label in value.split(".")) + b"\0"
+
+
+# The question name always starts right after the 12-byte header
+QNAME_POINTER = b"\xc0\x0c"
+
+
+def rr(owner, kind, ttl, rdata):
+    return owner + struct.pack("!HHIH", kind, 1, ttl, len(rdata)) + rdata
+
+
+def soa(ttl, minimum):
+    return rr(name("gov.pl"), TYPE_SOA, ttl, name("ns.gov.pl") + name("admin.gov.pl") + struct.pack("!IIIII", 1, 2, 3, 4, minimum))
+
+
+def reply(query, answers=(), authority=(), *, rcode=0, truncated=False, query_id=None, question=None):
+    flags = 0x8180 | rcode | (0x0200 if truncated else 0)
+    header = struct.pack("!HHHHHH", query.id if query_id is None else query_id, flags, 1, len(answers), len(authority), 0)
+    return header + (query.question if question is None else question) + b"".join(answers) + b"".join(authority)
+
+
+def parse_query(data):
+    offset, labels = 12, []
+    while data[offset]:
+        labels.append(data[offset + 1:offset + 1 + data[offset]].decode("ascii"))
+        offset += 1 + data[offset]
+    (qtype,) = struct.unpack_from("!H", data, offset + 1)
+    return Query(struct.unpack_from("!H", data)[0], ".".join(labels), qtype, data[12:offset + 5])
+
+
+class StubDNSServer:
+    """UDP and TCP stub on one 127.0.0.1 port; ``handler(query, tcp)`` returns the replies to send."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.queries = []
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind(("127.0.0.1", 0))
+        self.port = self.udp.getsockname()[1]
+        self.tcp = socket.create_server(("127.0.0.1", self.port))
+        threading.Thread(target=self._serve_udp, daemon=True).start()
+        threading.Thread(target=self._serve_tcp, daemon=True).start()
+
+    def _answer(self, data, tcp):
+        query = parse_query(data)
+        self.queries.append((query.name, query.type, tcp))
+        return self.handler(query, tcp)
+
+    def _serve_udp(self):
+        while True:
+            try:
+                data, addr = self.udp.recvfrom(512)
+            except OSError:
+                return
+            for message in self._answer(data, False):
+                self.udp.sendto(message, addr)
+
+    def _serve_tcp(self):
+        while True:
+            try:
+                conn, _ = self.tcp.accept()
+            except OSError:
+                return
+            with conn:
+                (length,) = struct.unpack("!H", conn.recv(2))
+                for message in self._answer(conn.recv(length), True)[:1]:
+                    conn.sendall(struct.pack("!H", len(message)) + message)
+
+    def close(self):
+        for sock in (self.udp, self.tcp):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+def answer_cdn(query, tcp):
+    """www CNAME cdn (compressed against the question name), A only, SOA for the missing AAAA."""
+    # "cdn" + pointer to "test.gov.pl" inside the question name
+    target = b"\x03cdn\xc0\x10"
+    if query.type == TYPE_A:
+        return [reply(query, [rr(QNAME_POINTER, TYPE_CNAME, 600, target), rr(name("cdn.test.gov.pl"), TYPE_A, 120, bytes((192, 0, 2, 1)))])]
+    return [reply(query, [rr(QNAME_POINTER, TYPE_CNAME, 600, target)], [soa(900, 60)])]
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(handler):
+        server = StubDNSServer(handler)
+        servers.append(server)
+        return server, DNSResolver(("gov.pl",), server=f"127.0.0.1:{server.port}", timeout=0.5, min_ttl=5)
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def resolve(resolver, host=HOST):
+    return asyncio.run(resolver.resolve(host))
+
+
+def test_compressed_cname_chain_and_negative_ttl(stub):
+    _, resolver = stub(answer_cdn)
+    result = resolve(resolver)
+
+    assert result["status"] == "resolved"
+    assert result["a"] == ["192.0.2.1"] and result["aaaa"] == []
+    assert result["cname_chain"] == ["cdn.test.gov.pl"]
+    assert result["canonical_name"] == "cdn.test.gov.pl"
+    assert not result["cname_leaves_official_zones"]
+    assert result["private_addresses"] == ["192.0.2.1"]
+    # The missing AAAA is cached for the SOA minimum
+    assert result["ttl"] == 60
+
+
+def test_cname_leaving_official_zones_is_flagged(stub):
+    def handler(query, tcp):
+        return [reply(query, [rr(QNAME_POINTER, TYPE_CNAME, 300, name("evil.example.com")), rr(name("evil.example.com"), TYPE_A, 300, bytes((203, 0, 113, 7)))])]
+
+    _, resolver = stub(handler)
+    result = resolve(resolver)
+    assert result["cname_leaves_official_zones"]
+    assert result["offzone_targets"] == ["evil.example.com"]
+
+
+def test_nxdomain_uses_soa_ttl(stub):
+    _, resolver = stub(lambda query, tcp: [reply(query, authority=[soa(30, 600)], rcode=3)])
+    result = resolve(resolver)
+    assert result["status"] == "nxdomain"
+    assert result["ttl"] == 30
+
+
+def test_truncated_reply_is_retried_over_tcp(stub):
+    def handler(query, tcp):
+        if not tcp:
+            return [reply(query, truncated=True)]
+        return answer_cdn(query, tcp)
+
+    server, resolver = stub(handler)
+    result = resolve(resolver)
+
+    assert result["status"] == "resolved" and result["a"] == ["192.0.2.1"]
+    assert sorted(server.queries) == sorted(
+        [(HOST, TYPE_A, False), (HOST, TYPE_AAAA, False), (HOST, TYPE_A, True), (HOST, TYPE_AAAA, True)]
+    )
+
+
+def test_reply_with_another_id_is_ignored(stub):
+    def handler(query, tcp):
+        spoofed = reply(query, [rr(QNAME_POINTER, TYPE_A, 300, bytes((203, 0, 113, 66)))], query_id=query.id ^ 0xFFFF)
+        return [spoofed, *answer_cdn(query, tcp)]
+
+    _, resolver = stub(handler)
+    result = resolve(resolver)
+    assert result["a"] == ["192.0.2.1"]
+
+
+def test_only_replies_with_another_id_time_out(stub):
+    _, resolver = stub(lambda query, tcp: [reply(query, query_id=query.id ^ 0xFFFF)])
+    result = resolve(resolver)
+    assert result["status"] == "error"
+    assert result["error"] == "Przekroczono czas zapytania DNS (0.5 s)"
+
+
+def test_reply_to_another_question_is_rejected(stub):
+    def handler(query, tcp):
+        return [reply(query, question=name("other.gov.pl") + struct.pack("!HH", query.type, 1))]
+
+    _, resolver = stub(handler)
+    result = resolve(resolver)
+    assert result["status"] == "error"
+    assert result["error"] == "Błąd zapytania DNS: Odpowiedź DNS dotyczy innego pytania"
+
+
+def test_silent_server_times_out_and_error_is_cached(stub):
+    server, resolver = stub(lambda query, tcp: [])
+    first = resolve(resolver)
+    second = resolve(resolver)
+
+    assert first["error"] == "Przekroczono czas zapytania DNS (0.5 s)"
+    assert second["cached"]
+    assert len(server.queries) == 2
+
+
+@pytest.mark.parametrize(
+    "mangle, error",
+    [
+        (lambda message: message[:8], "za krótki nagłówek"),
+        (lambda message: message[:-6], "rekord poza wiadomością"),
+        (lambda message: message[:20], "nazwa poza wiadomością"),
+    ],
+)
+def test_malformed_reply_is_an_error(stub, mangle, error):
+    _, resolver = stub(lambda query, tcp: [mangle(answer_cdn(query, tcp)[0])])
+    result = resolve(resolver)
+    assert result["status"] == "error"
+    assert error in result["error"]
+
+
+def test_servfail_is_an_error(stub):
+    _, resolver = stub(lambda query, tcp: [reply(query, rcode=2)])
+    assert resolve(resolver)["error"] == "Błąd zapytania DNS: serwer DNS zwrócił kod 2"
+
+
+def test_concurrent_lookups_share_one_query_per_type(stub):
+    server, resolver = stub(answer_cdn)
+
+    async def run():
+        results = await asyncio.gather(*(resolver.resolve(HOST) for _ in range(5)))
+        return results, await resolver.resolve(HOST)
+
+    results, cached = asyncio.run(run())
+    assert {tuple(result["a"]) for result in results} == {("192.0.2.1",)}
+    assert sorted(server.queries) == [(HOST, TYPE_A, False), (HOST, TYPE_AAAA, False)]
+    assert cached["cached"]
+
+
+def test_compression_loop_is_rejected():
+    query_id = 7
+    header = struct.pack("!HHHHHH", query_id, 0x8180, 0, 1, 0, 0)
+    # The answer owner points at itself
+    looped = header + b"\xc0\x0c" + struct.pack("!HHIH", TYPE_A, 1, 60, 4) + bytes(4)
+    with pytest.raises(DNSError, match="pętla kompresji"):
+        decode_response(looped, query_id, HOST, TYPE_A)
+
+
+@pytest.fixture
+def dns_endpoint(stub, monkeypatch):
+    """Point the app's resolver at the stub through its environment settings."""
+    from backend import main
+
+    server, _ = stub(answer_cdn)
+    monkeypatch.setenv("MVERIFY_DNS_SERVER", f"127.0.0.1:{server.port}")
+    monkeypatch.setenv("MVERIFY_DNS_EXTRA_HOSTS", HOST)
+    importlib.reload(dns_check)
+    main.get_dns_resolver.cache_clear()
+    yield server
+    monkeypatch.undo()
+    importlib.reload(dns_check)
+    main.get_dns_resolver.cache_clear()
+
+
+def test_dns_endpoint_resolves_extra_host(client, dns_endpoint):
+    response = client.get("/api/domain/dns", params={"domain": HOST})
+
+    assert response.status_code == 200
+    assert response.json()["cname_chain"] == ["cdn.test.gov.pl"]
+    assert client.get("/api/domain/dns", params={"domain": HOST}).json()["cached"]
+    assert len(dns_endpoint.queries) == 2
@@ -0,0 +1,56 @@
+import sys
+import threading
+from pathlib import Path
+
+from backend.domain_registry import ROOT_DOMAIN, DomainRegistry
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from synthetic import write_synthetic_gov_json  # noqa: E402
+
+
+def test_health_reports_registry_zones(client):
+    zones = client.get("/health").json()["zones"]
+
+    assert ROOT_DOMAIN in zones
+    assert {"entries", "version", "origin", "last_refreshed", "expires_at", "ttl_seconds", "last_error"} <= set(zones[ROOT_DOMAIN])
+
+
+def test_expired_zones_reload_in_background(tmp_path, monkeypatch):
+    source = write_synthetic_gov_json(tmp_path, 50)
+    registry = DomainRegistry(source, cache_ttl=0, remote_url=None, snapshot_path=None, watch=False)
+    loaded = registry.snapshot
+
+    # Stand-in for a slow remote fetch: the reload waits until released
+    release, reloading = threading.Event(), threading.Event()
+    load_zone = registry._load_zone
+
+    def slow_load_zone(zone, **kwargs):
+        reloading.set()
+        assert release.wait(5)
+        load_zone(zone, **kwargs)
+
+    monkeypatch.setattr(registry, "_load_zone", slow_load_zone)
+
+    # The caller gets the last good snapshot while the reload runs
+    assert registry.ensure_fresh() is loaded
+    assert reloading.wait(5)
+    assert registry.ensure_fresh() is loaded
+    assert registry.verify("gov.pl")["is_listed"]
+
+    release.set()
+    registry._refresh_thread.join(5)
+    assert registry.snapshot.version != loaded.version
+    assert registry.snapshot.lookup.keys() == loaded.lookup.keys()
+
+
+def test_failed_background_reload_keeps_last_snapshot(tmp_path):
+    source = write_synthetic_gov_json(tmp_path, 50)
+    registry = DomainRegistry(source, cache_ttl=0, remote_url=None, snapshot_path=None, watch=False)
+    loaded = registry.snapshot
+
+    source.write_text("{", encoding="utf-8")
+    assert registry.ensure_fresh() is loaded
+    registry._refresh_thread.join(5)
+
+    assert registry.snapshot.lookup.keys() == loaded.lookup.keys()
+    assert registry.zone_info()[ROOT_DOMAIN]["last_error"]
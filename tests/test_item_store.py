@@ -0,0 +1,130 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from backend.item_store import COMPACT_MIN_TOMBSTONES, DEFAULT_ITEMS_PAGE_SIZE, MemoryItemStore, SQLiteItemStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    item_store = MemoryItemStore() if request.param == "memory" else SQLiteItemStore(tmp_path / "items.db")
+    yield item_store
+    item_store.close()
+
+
+def fill(store, count):
+    return [item["id"] for item in store.create_many([(f"item {index}", None) for index in range(count)])]
+
+
+def walk(store, limit, after_id=0):
+    """Ids of every page from ``after_id`` on, and the number of pages."""
+    ids, pages = [], 0
+    while True:
+        page, after_id = store.page(after_id, limit)
+        ids.extend(item["id"] for item in page)
+        pages += 1
+        if after_id is None:
+            return ids, pages
+
+
+def test_pages_cover_every_item_once(store):
+    ids = fill(store, 250)
+
+    assert walk(store, 100) == (ids, 3)
+    # An exact multiple of the page size does not end with an empty page
+    assert walk(store, 125) == (ids, 2)
+
+
+def test_pages_skip_tombstones(store):
+    ids = fill(store, 300)
+    deleted = set(ids[90:160]) | {ids[0], ids[199], ids[-1]}
+    store.delete_many(deleted)
+
+    live = [item_id for item_id in ids if item_id not in deleted]
+    assert walk(store, 100)[0] == live
+    # A cursor pointing at an item deleted since it was handed out still continues after it
+    page, _ = store.page(ids[199], 10)
+    assert [item["id"] for item in page] == live[live.index(ids[200]):][:10]
+
+
+def test_ids_of_deleted_items_are_not_reused(store):
+    ids = fill(store, 3)
+    store.delete(ids[-1])
+
+    assert fill(store, 1) == [ids[-1] + 1]
+
+
+def test_cursor_survives_compaction_on_delete():
+    store = MemoryItemStore()
+    ids = fill(store, 3 * COMPACT_MIN_TOMBSTONES)
+    first, cursor = store.page(0, 10)
+
+    # More tombstones than live items: the id array is compacted
+    store.delete_many(ids[10:-COMPACT_MIN_TOMBSTONES])
+    assert len(store._ids) == len(store) == 10 + COMPACT_MIN_TOMBSTONES
+
+    assert [item["id"] for item in first] == ids[:10]
+    assert walk(store, 100, cursor)[0] == ids[-COMPACT_MIN_TOMBSTONES:]
+
+
+def test_page_over_a_long_run_of_tombstones_compacts():
+    store = MemoryItemStore()
+    ids = fill(store, 4 * COMPACT_MIN_TOMBSTONES)
+    gap = ids[100:100 + COMPACT_MIN_TOMBSTONES + 1]
+    store.delete_many(gap)
+    # Fewer tombstones than live items: deleting alone does not compact
+    assert len(store._ids) == len(ids)
+
+    page, cursor = store.page(ids[99], 10)
+    assert [item["id"] for item in page] == ids[101 + COMPACT_MIN_TOMBSTONES:][:10]
+    assert len(store._ids) == len(store)
+    assert walk(store, 500)[0] == [item_id for item_id in ids if item_id not in set(gap)]
+
+
+@pytest.fixture
+def items_client(client, monkeypatch):
+    from backend import main
+
+    monkeypatch.setattr(main, "_item_store", MemoryItemStore())
+    return client
+
+
+def test_listing_without_limit_returns_every_item(items_client):
+    items_client.post("/api/items/bulk", json=[{"name": f"item {index}"} for index in range(2 * DEFAULT_ITEMS_PAGE_SIZE + 5)])
+
+    response = items_client.get("/api/items")
+    assert len(response.json()) == 2 * DEFAULT_ITEMS_PAGE_SIZE + 5
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_listing_with_limit_follows_link(items_client):
+    created = items_client.post("/api/items/bulk", json=[{"name": f"item {index}"} for index in range(25)]).json()
+
+    ids, response = [], items_client.get("/api/items", params={"limit": 10})
+    while True:
+        ids.extend(item["id"] for item in response.json())
+        if "Link" not in response.headers:
+            break
+        next_url = response.headers["Link"].split(">")[0].lstrip("<")
+        assert parse_qs(urlsplit(next_url).query)["cursor"] == [response.headers["X-Next-Cursor"]]
+        response = items_client.get(next_url)
+    assert ids == [item["id"] for item in created]
+
+
+def test_cursor_without_limit_uses_default_page_size(items_client):
+    items_client.post("/api/items/bulk", json=[{"name": f"item {index}"} for index in range(DEFAULT_ITEMS_PAGE_SIZE + 5)])
+
+    assert len(items_client.get("/api/items", params={"cursor": "0"}).json()) == DEFAULT_ITEMS_PAGE_SIZE
+
+
+def test_unpaged_listing_is_capped(items_client, monkeypatch):
+    from backend import main
+
+    monkeypatch.setattr(main, "DEFAULT_ITEMS_UNPAGED_MAX", 20)
+    created = items_client.post("/api/items/bulk", json=[{"name": f"item {index}"} for index in range(25)]).json()
+
+    response = items_client.get("/api/items")
+    assert len(response.json()) == 20
+    assert response.headers["X-Next-Cursor"] == str(created[19]["id"])
+    rest = items_client.get("/api/items", params={"cursor": response.headers["X-Next-Cursor"]}).json()
+    assert [item["id"] for item in rest] == [item["id"] for item in created[20:]]
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.sessions import (
+    ADMISSION_TRUST_FULL,
+    ADMISSION_TRUST_PER_CLIENT,
+    AdmissionRejected,
+    TrustSessionTable,
+    admission_client,
+    parse_networks,
+)
+
+PROXIES = parse_networks("10.0.0.0/8, 192.0.2.1")
+
+
+@pytest.mark.parametrize(
+    "peer, forwarded_for, expected",
+    [
+        # Untrusted peer: the header is the client's own claim
+        ("203.0.113.5", "198.51.100.7", "203.0.113.5"),
+        ("203.0.113.5", None, "203.0.113.5"),
+        (None, "198.51.100.7", "unknown"),
+        # Trusted proxy: the hop it saw, not what the client prepended
+        ("10.1.2.3", "198.51.100.7", "198.51.100.7"),
+        ("10.1.2.3", "1.1.1.1, 198.51.100.7", "198.51.100.7"),
+        ("10.1.2.3", "1.1.1.1, 198.51.100.7, 192.0.2.1", "198.51.100.7"),
+        ("10.1.2.3", "garbage, 10.0.0.9", "garbage"),
+        ("10.1.2.3", "10.0.0.8, 10.0.0.9", "10.0.0.8"),
+        ("10.1.2.3", None, "10.1.2.3"),
+    ],
+)
+def test_admission_client(peer, forwarded_for, expected):
+    assert admission_client(peer, forwarded_for, PROXIES) == expected
+
+
+def test_no_trusted_proxies_means_peer_address():
+    assert admission_client("10.1.2.3", "198.51.100.7", parse_networks("")) == "10.1.2.3"
+
+
+def _session():
+    return {"created_at": datetime.utcnow()}
+
+
+def test_full_table_rejects_instead_of_evicting():
+    table = TrustSessionTable(ttl_seconds=600, max_sessions=3, max_per_client=5)
+    for index in range(3):
+        table.add(f"s{index}", _session(), client=f"client-{index}")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        table.add("s3", _session(), client="client-3")
+    assert rejected.value.reason == ADMISSION_TRUST_FULL
+    assert all(f"s{index}" in table for index in range(3))
+    assert table.stats()["rejected_full"] == 1
+
+
+def test_expired_sessions_make_room():
+    table = TrustSessionTable(ttl_seconds=600, max_sessions=2, max_per_client=5)
+    table.add("old", {"created_at": datetime.utcnow() - timedelta(seconds=601)}, client="a")
+    table.add("live", _session(), client="b")
+
+    table.add("new", _session(), client="c")
+    assert "old" not in table and "new" in table
+
+
+def test_per_client_limit():
+    table = TrustSessionTable(ttl_seconds=600, max_sessions=10, max_per_client=2)
+    table.add("s0", _session(), client="a")
+    table.add("s1", _session(), client="a")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        table.add("s2", _session(), client="a")
+    assert rejected.value.reason == ADMISSION_TRUST_PER_CLIENT
+    table.add("s3", _session(), client="b")
+
+
+@pytest.fixture
+def trust_table(monkeypatch):
+    from backend import main
+
+    table = TrustSessionTable(ttl_seconds=main.TRUST_SESSION_TTL_SECONDS, max_sessions=4, max_per_client=2)
+    monkeypatch.setattr(main, "trust_sessions", table)
+    return table
+
+
+def start(client, forwarded_for):
+    return client.post("/api/trust/start-verification", json={"hostname": "www.gov.pl"}, headers={"X-Forwarded-For": forwarded_for})
+
+
+def test_spoofed_forwarded_for_does_not_reset_the_client_limit(client, trust_table):
+    assert start(client, "198.51.100.1").status_code == 200
+    assert start(client, "198.51.100.2").status_code == 200
+
+    response = start(client, "198.51.100.3")
+    assert response.status_code == 429
+    assert trust_table.stats()["clients"] == 1
+
+
+def test_start_verification_is_refused_when_the_table_is_full(client, trust_table):
+    for index in range(4):
+        trust_table.add(f"s{index}", _session(), client=f"other-{index}")
+
+    response = start(client, "198.51.100.1")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+    assert len(trust_table) == 4
@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import importlib
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+
+import pytest
+
+from backend import tls_inspect
+from backend.tls_inspect import TLSInspector
+
+pytestmark = pytest.mark.skipif(shutil.which("openssl") is None, reason="openssl CLI is needed to generate the test certificate")
+
+
+class LocalTLSServer:
+    """Serves a certificate on 127.0.0.1; without ``certfile`` it accepts and never answers."""
+
+    def __init__(self, certfile=None, keyfile=None, *, delay=0.0):
+        self.context = None
+        if certfile:
+            self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.context.load_cert_chain(certfile, keyfile)
+        self.delay = delay
+        self.connections = 0
+        self._sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        conn.settimeout(5)
+        with conn:
+            time.sleep(self.delay)
+            try:
+                if self.context is None:
+                    # Swallow the ClientHello and stay silent until the client gives up
+                    while conn.recv(4096):
+                        pass
+                    return
+                with self.context.wrap_socket(conn, server_side=True) as tls:
+                    tls.recv(1)
+            except (OSError, ssl.SSLError):
+                pass
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory):
+    """Self-signed certificate for localhost valid for two days: (certfile, keyfile, sha256 of the DER)."""
+    directory = tmp_path_factory.mktemp("tls")
+    certfile, keyfile = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1", "-nodes",
+            "-keyout", str(keyfile), "-out", str(certfile), "-days", "2", "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    der = ssl.PEM_cert_to_DER_cert(certfile.read_text())
+    return str(certfile), str(keyfile), hashlib.sha256(der).hexdigest()
+
+
+@pytest.fixture
+def server(certificate):
+    certfile, keyfile, _ = certificate
+    tls_server = LocalTLSServer(certfile, keyfile)
+    yield tls_server
+    tls_server.close()
+
+
+def _inspector(port, **kwargs):
+    return TLSInspector(port=port, extra_hosts=frozenset({"localhost"}), **kwargs)
+
+
+def test_trusted_certificate_is_described_and_cached(certificate, server):
+    certfile, _, fingerprint = certificate
+    inspector = _inspector(server.port, cafile=certfile)
+
+    async def run():
+        return await inspector.inspect("localhost"), await inspector.inspect("localhost")
+
+    first, second = asyncio.run(run())
+    assert first["valid"] and first["trusted"] and first["hostname_match"]
+    assert first["san"] == ["localhost", "127.0.0.1"]
+    assert first["fingerprint_sha256"] == fingerprint
+    assert first["expires_in_days"] in (1, 2)
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert server.connections == 1
+
+
+def test_cache_ttl_is_capped_by_certificate_expiry(certificate, server):
+    inspector = _inspector(server.port, cafile=certificate[0], max_ttl=10 * 86400)
+    asyncio.run(inspector.inspect("localhost"))
+
+    deadline, _ = inspector._cache[("localhost", server.port)]
+    assert deadline - time.monotonic() <= 2 * 86400
+
+
+def test_expired_cache_entry_is_checked_again(certificate, server):
+    inspector = _inspector(server.port, cafile=certificate[0], max_ttl=0)
+
+    async def run():
+        return await inspector.inspect("localhost"), await inspector.inspect("localhost")
+
+    first, second = asyncio.run(run())
+    assert not first["cached"] and not second["cached"]
+    assert server.connections == 2
+
+
+def test_concurrent_requests_share_one_handshake(certificate):
+    certfile, keyfile, fingerprint = certificate
+    slow_server = LocalTLSServer(certfile, keyfile, delay=0.3)
+    inspector = _inspector(slow_server.port, cafile=certfile)
+
+    async def run():
+        return await asyncio.gather(*(inspector.inspect("localhost") for _ in range(5)))
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        slow_server.close()
+    assert slow_server.connections == 1
+    assert {result["fingerprint_sha256"] for result in results} == {fingerprint}
+    assert inspector.stats() == {"cached": 1, "in_flight": 0}
+
+
+def test_untrusted_certificate_still_reports_its_fingerprint(certificate, server):
+    _, _, fingerprint = certificate
+    # Default CA store: the self-signed certificate does not verify
+    inspector = _inspector(server.port, cafile=None)
+
+    async def run():
+        return await inspector.inspect("localhost"), await inspector.inspect("localhost")
+
+    first, second = asyncio.run(run())
+    assert not first["valid"] and not first["trusted"]
+    assert first["error"].startswith("Certyfikat niezaufany")
+    assert first["fingerprint_sha256"] == fingerprint
+    assert first["protocol"].startswith("TLS")
+    # Verification attempt and the unverified fetch; failures are cached for error_ttl
+    assert server.connections == 2
+    assert second["cached"]
+
+
+def test_handshake_timeout():
+    silent = LocalTLSServer()
+    inspector = _inspector(silent.port, timeout=0.2)
+    try:
+        started = time.perf_counter()
+        result = asyncio.run(inspector.inspect("localhost"))
+        elapsed = time.perf_counter() - started
+    finally:
+        silent.close()
+    assert not result["valid"]
+    assert result["error"] == "Przekroczono czas połączenia (0.2 s)"
+    assert elapsed < 2
+
+
+def test_connection_refused_is_an_error():
+    with socket.create_server(("127.0.0.1", 0)) as sock:
+        port = sock.getsockname()[1]
+    result = asyncio.run(_inspector(port).inspect("localhost"))
+    assert not result["valid"]
+    assert result["error"].startswith("Błąd połączenia TLS")
+
+
+@pytest.fixture
+def tls_endpoint(certificate, server, monkeypatch):
+    """Point the app's inspector at the local server through its environment settings."""
+    from backend import main
+
+    monkeypatch.setenv("MVERIFY_TLS_CA_FILE", certificate[0])
+    monkeypatch.setenv("MVERIFY_TLS_EXTRA_HOSTS", "localhost")
+    monkeypatch.setenv("MVERIFY_TLS_PORT", str(server.port))
+    importlib.reload(tls_inspect)
+    main.get_tls_inspector.cache_clear()
+    yield server
+    monkeypatch.undo()
+    importlib.reload(tls_inspect)
+    main.get_tls_inspector.cache_clear()
+
+
+def test_tls_endpoint_inspects_extra_host(client, tls_endpoint, certificate):
+    first = client.get("/api/domain/tls", params={"domain": "localhost"})
+    second = client.get("/api/domain/tls", params={"domain": "localhost"})
+
+    assert first.status_code == 200
+    assert first.json()["valid"] and first.json()["fingerprint_sha256"] == certificate[2]
+    assert second.json()["cached"]
+    assert tls_endpoint.connections == 1
+    assert client.get("/api/domain/tls", params={"domain": "evil.com"}).status_code == 400